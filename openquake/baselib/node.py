@@ -844,7 +844,8 @@ def context(fname, node):
 class ValidatingXmlParser(object):
     """
     Validating XML Parser based on Expat. It has two methods `.parse_file`
-    and `.parse_bytes` returning a validated :class:`Node` object.
+    and `.parse_bytes` returning a validated :class:`Node` object and
+    a method `.iterparse` yielding validated nodes while parsing.
 
     :param validators: a dictionary of validation functions
     :param stop: the tag where to stop the parsing (if any)
@@ -852,6 +853,9 @@ class ValidatingXmlParser(object):
     class Exit(Exception):
         """Raised when the parsing is stopped before the end on purpose"""
 
+    _detach = None  # set by .iterparse
+    _skip = None  # set by .iterparse
+
     def __init__(self, validators, stop=None):
         self.validators = validators
         self.stop = stop
@@ -908,6 +912,42 @@ class ValidatingXmlParser(object):
                     self.p.ParseFile(f)
         return self._root
 
+    def iterparse(self, fname, detach, bufsize=65536, skip=None):
+        """
+        Parse a file incrementally. The nodes with a (stripped) tag
+        satisfying the `detach` predicate are yielded as soon as they are
+        closed and they are NOT attached to their parent, so that the full
+        tree is never kept in memory. The nodes containing detached nodes
+        are yielded when they are closed, after their children; the root
+        node is always the last node yielded.
+
+        :param fname: the path to an XML file
+        :param detach: a function tag -> boolean
+        :param bufsize: the size of the chunks read from the file
+        :param skip: if given, a function node -> boolean called when a
+                     node is opened; the skipped nodes and their children
+                     are neither yielded nor attached to their parent
+        """
+        self._detach = detach
+        self._skip = skip
+        self._skipping = 0  # depth of the node being skipped, if any
+        self._detached = {}  # tag -> boolean, to call detach once per tag
+        self._closed = []  # nodes to yield
+        self._nmarked = 0  # number of ancestors containing detached nodes
+        try:
+            with self._context(), open(fname, 'rb') as f:
+                self.filename = fname
+                while True:
+                    chunk = f.read(bufsize)
+                    self.p.Parse(chunk, not chunk)
+                    closed, self._closed = self._closed, []
+                    yield from closed
+                    if not chunk:
+                        break
+        finally:
+            self._detach = None
+            self._skip = None
+
     def _start_element(self, longname, attrs):
         try:
             _xmlns, name = longname.split('}')
@@ -915,8 +955,10 @@ class ValidatingXmlParser(object):
             name = tag = longname
         else:  # fix the tag with an opening brace
             tag = '{' + longname
-        self._ancestors.append(
-            Node(tag, attrs, lineno=self.p.CurrentLineNumber))
+        node = Node(tag, attrs, lineno=self.p.CurrentLineNumber)
+        self._ancestors.append(node)
+        if self._skip is not None and not self._skipping and self._skip(node):
+            self._skipping = len(self._ancestors)
         if self.stop and name == self.stop:
             for anc in reversed(self._ancestors):
                 self._end_element(anc.tag)
@@ -929,6 +971,25 @@ class ValidatingXmlParser(object):
         with context(self.filename, node):
             self._root = self._literalnode(node)
         del self._ancestors[-1]
+        if self._detach is not None:  # called by .iterparse
+            depth = len(self._ancestors)
+            if self._skipping:
+                if depth < self._skipping:  # closing the skipped node
+                    self._skipping = 0
+                    self._nmarked = depth
+                return
+            try:
+                detached = self._detached[node.tag]
+            except KeyError:
+                detached = self._detached[node.tag] = self._detach(
+                    striptag(node.tag))
+            if detached:
+                self._closed.append(node)
+                self._nmarked = depth
+                return
+            elif depth < self._nmarked or not depth:
+                self._closed.append(node)
+                self._nmarked = depth
         if self._ancestors:
             self._ancestors[-1].append(self._root)
 
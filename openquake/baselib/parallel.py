@@ -182,7 +182,6 @@ fast sources.
 """
 import os
 import re
-import ast
 import sys
 import time
 import socket
@@ -203,10 +202,9 @@ import psutil
 import numpy
 
 from openquake.baselib import config, hdf5
-from openquake.baselib.python3compat import decode
 from openquake.baselib.zeromq import zmq, Socket
 from openquake.baselib.performance import (
-    Monitor, memory_gb, init_performance)
+    Monitor, memory_gb, private_memory_gb, init_performance, save_task_sent)
 from openquake.baselib.general import (
     split_in_blocks, block_splitter, AccumDict, humansize, CallableDict,
     gettemp, engine_version, shortlist, compress, decompress, mp as mp_context)
@@ -216,6 +214,7 @@ sys.setrecursionlimit(2000)  # raised to make pickle happier
 submit = CallableDict()
 MB = 1024 ** 2
 GB = 1024 ** 3
+SENT_FLUSH_SECS = 10  # save the task_sent information every 10 seconds
 host_cores = config.zworkers.host_cores.split(',')
 
 
@@ -522,6 +521,9 @@ def safely_call(func, args, task_no=0, mon=dummy_mon):
     else:
         name = func.__name__
     mon = mon.new(operation='total ' + name, measuremem=True)
+    # close the shared memory attached by the tasks of previous Starmaps
+    SharedArray.detach([shr.name for shr in getattr(
+        mon, 'shared', {}).values()])
     mon.weight = getattr(args[0], 'weight', 1.)  # used in task_info
     mon.task_no = task_no
     if mon.inject:
@@ -593,6 +595,9 @@ class IterResult(object):
         try:
             yield from self._iter()
         finally:
+            if hasattr(self.iresults, 'close'):
+                # run the cleanup of the Starmap loop even on errors
+                self.iresults.close()
             items = sorted(self.nbytes.items(), key=operator.itemgetter(1))
             nb = {k: humansize(v) for k, v in list(reversed(items))[:3]}
             recv = sum(self.nbytes.values())
@@ -650,24 +655,57 @@ def get_return_ip(receiver_host):
 class SharedArray(object):
     """
     Wrapper over a SharedMemory array to be used as a context manager.
+    The array can also be accessed in the workers with the method `.view()`,
+    which attaches the SharedMemory only once per process and returns a
+    zero-copy view; NB: the view is writeable (numba functions do not
+    accept readonly arrays) but it is meant to be read-only.
     """
+    _attached = {}  # name -> SharedMemory attached in the current process
+
     @classmethod
     def new(cls, array):
         return cls(array.shape, array.dtype, array)
 
+    @classmethod
+    def detach(cls, keep=()):
+        """
+        Close the SharedMemory objects attached in the current process,
+        except the ones with name in `keep`
+        """
+        for name in list(cls._attached):
+            if name not in keep:
+                cls._attached.pop(name).close()
+
     def __init__(self, shape, dtype, value):
         nbytes = numpy.zeros(1, dtype).nbytes * numpy.prod(shape)
         # NOTE: on Windows size wants an int an not a numpy.int
-        self.sm = shmem.SharedMemory(create=True, size=int(nbytes))
+        self.sm = shmem.SharedMemory(create=True, size=int(nbytes or 1))
+        self.name = self.sm.name
+        self.nbytes = int(nbytes)
         self.shape = shape
         self.dtype = dtype
         # fill the SharedMemory buffer with the value
         arr = numpy.ndarray(shape, dtype, buffer=self.sm.buf)
         arr[:] = value
 
+    def __getstate__(self):
+        # the SharedMemory object is not sent to the workers, otherwise
+        # unpickling it would attach the memory at each task
+        return {k: v for k, v in vars(self).items() if k not in ('sm', '_sm')}
+
+    def view(self):
+        """
+        :returns: an array attached to the SharedMemory
+        """
+        try:
+            sm = self._attached[self.name]
+        except KeyError:
+            sm = self._attached[self.name] = shmem.SharedMemory(self.name)
+        return numpy.ndarray(self.shape, self.dtype, buffer=sm.buf)
+
     def __enter__(self):
         # this is called in the workers
-        self._sm = shmem.SharedMemory(name=self.sm.name)
+        self._sm = shmem.SharedMemory(name=self.name)
         return numpy.ndarray(self.shape, self.dtype, buffer=self._sm.buf)
 
     def __exit__(self, etype, exc, tb):
@@ -675,6 +713,9 @@ class SharedArray(object):
         self._sm.close()
 
     def unlink(self):
+        sm = self._attached.pop(self.name, None)
+        if sm is not None:  # attached in the master, i.e. distribute=no
+            sm.close()
         self.sm.close()
         self.sm.unlink()
 
@@ -807,6 +848,8 @@ class Starmap(object):
             self.num_tasks = None
         self.argnames = getargnames(task_func)
         self.sent = AccumDict(accum=AccumDict())  # fname -> argname -> nbytes
+        self.unflushed = AccumDict(accum=AccumDict())  # not saved yet
+        self.sent_time = time.time()  # last time task_sent was saved
         self.monitor.inject = (self.argnames[-1].startswith('mon') or
                                self.argnames[-1].endswith('mon'))
         self.receiver = 'tcp://0.0.0.0:%s' % config.dbserver.receiver_ports
@@ -878,7 +921,9 @@ class Starmap(object):
             else:
                 fname = func.__name__
                 argnames = getargnames(func)[:-1]
-            self.sent[fname] += {a: len(p) for a, p in zip(argnames, args)}
+            nbytes = {a: len(p) for a, p in zip(argnames, args)}
+            self.sent[fname] += nbytes
+            self.unflushed[fname] += nbytes
         submit[dist](self, func, args, self.monitor)
         self.tasks.append(self.task_no)
         self.task_no += 1
@@ -939,9 +984,11 @@ class Starmap(object):
     # the event_based calculator
     def share(self, **dictarray):
         """
-        Apply SharedArray.new to a dictionary of arrays
+        Apply SharedArray.new to a dictionary of arrays; SharedArray
+        instances (i.e. already filled by the caller) are kept as they are
         """
-        self._shared = {k: SharedArray.new(a) for k, a in dictarray.items()}
+        self._shared = {k: a if isinstance(a, SharedArray)
+                        else SharedArray.new(a) for k, a in dictarray.items()}
 
     def unlink(self):
         """
@@ -951,6 +998,15 @@ class Starmap(object):
             logging.debug('Unlinking %s', name)
             shr.unlink()
 
+    def flush_sent(self):
+        """
+        Append the data transfer information accumulated since the
+        previous flush to the task_sent dataset
+        """
+        save_task_sent(self.h5, self.unflushed)
+        self.unflushed.clear()
+        self.sent_time = time.time()
+
     def _loop(self):
         self.busytime = AccumDict(accum=[])  # pid -> time
         dist = 'no' if self.num_tasks == 1 else self.distribute
@@ -973,50 +1029,58 @@ class Starmap(object):
 
         isocket = iter(self.socket)  # read from the PULL socket
         finished = set()
-        while self.tasks:
-            res = next(isocket)
-            self.log_percent()
-            if self.calc_id != res.mon.calc_id:
-                logging.warning('Discarding a result from job %s, since this '
-                                'is job %s', res.mon.calc_id, self.calc_id)
-            elif res.msg == 'TASK_ENDED':
-                finished.add(res.mon.task_no)
-                self.busytime += {res.workerid: res.mon.duration}
-                self.tasks.remove(res.mon.task_no)
-                self._submit_many(1)
-                todo = set(range(self.task_no)) - finished
-                logging.debug('%d tasks todo %s', len(todo),
-                              shortlist(sorted(todo)))
-                task_sent = ast.literal_eval(decode(self.h5['task_sent'][()]))
-                task_sent.update(self.sent)
-                del self.h5['task_sent']
-                self.h5['task_sent'] = str(task_sent)
-                name = res.mon.operation[6:]  # strip 'total '
-                n = self.name + ':' + name if name == 'split_task' else name
-                if self.distribute in ('zmq', 'slurm'):
-                    mem_gb = 0
-                    if res.mon.task_no % 10 == 0:
-                        # measure the memory only for 1 task out of 10, to be fast
-                        # with 8 nodes the time to get the memory is 0.01 secs
-                        for line in host_cores:
-                            host, _cores = line.split()
-                            addr = 'tcp://%s:%s' % (host, config.zworkers.ctrl_port)
-                            with Socket(addr, zmq.REQ, 'connect') as sock:
-                                mem_gb += sock.send('memory_gb')
-                elif self._shared:
-                    # do not measure the memory on the workers, only in the master
-                    # otherwise memory_rss would double count the shared memory
-                    mem_gb = memory_gb()
+        shared_gb = sum(shr.nbytes for shr in self._shared.values()) / 1024**3
+        try:
+            while self.tasks:
+                res = next(isocket)
+                self.log_percent()
+                if self.calc_id != res.mon.calc_id:
+                    logging.warning('Discarding a result from job %s, since '
+                                    'this is job %s', res.mon.calc_id,
+                                    self.calc_id)
+                elif res.msg == 'TASK_ENDED':
+                    finished.add(res.mon.task_no)
+                    self.busytime += {res.workerid: res.mon.duration}
+                    self.tasks.remove(res.mon.task_no)
+                    self._submit_many(1)
+                    todo = set(range(self.task_no)) - finished
+                    logging.debug('%d tasks todo %s', len(todo),
+                                  shortlist(sorted(todo)))
+                    if time.time() - self.sent_time > SENT_FLUSH_SECS:
+                        self.flush_sent()
+                    name = res.mon.operation[6:]  # strip 'total '
+                    n = (self.name + ':' + name if name == 'split_task'
+                         else name)
+                    if self.distribute in ('zmq', 'slurm'):
+                        mem_gb = 0
+                        if res.mon.task_no % 10 == 0:
+                            # measure the memory only for 1 task out of 10,
+                            # to be fast; with 8 nodes the time to get the
+                            # memory is 0.01 secs
+                            for line in host_cores:
+                                host, _cores = line.split()
+                                addr = 'tcp://%s:%s' % (
+                                    host, config.zworkers.ctrl_port)
+                                with Socket(addr, zmq.REQ, 'connect') as sock:
+                                    mem_gb += sock.send('memory_gb')
+                    elif self._shared:
+                        # count only the private memory of the workers
+                        # otherwise the shared memory would be counted
+                        # many times
+                        mem_gb = private_memory_gb(Starmap.pids)
+                    else:
+                        mem_gb = memory_gb(Starmap.pids)
+                    res.mon.save_task_info(self.h5, res, n, mem_gb, shared_gb)
+                    res.mon.flush(self.h5)
+                elif res.func:  # add subtask
+                    self.task_queue.append((res.func, res.pik))
+                    self._submit_many(1)
                 else:
-                    mem_gb = memory_gb(Starmap.pids)
-                res.mon.save_task_info(self.h5, res, n, mem_gb)
-                res.mon.flush(self.h5)
-            elif res.func:  # add subtask
-                self.task_queue.append((res.func, res.pik))
-                self._submit_many(1)
-            else:
-                self.n_out += 1
-                yield res
+                    self.n_out += 1
+                    yield res
+        finally:
+            # save the pending information even in case of errors
+            self.flush_sent()
         self.log_percent()
         self.socket.__exit__(None, None, None)
         self.tasks.clear()
@@ -17,6 +17,7 @@
 # along with OpenQuake.  If not, see <http://www.gnu.org/licenses/>.
 
 import os
+import ast
 import time
 import pstats
 import pickle
@@ -49,7 +50,10 @@ perf_dt = numpy.dtype([('operation', '<S50'), ('time_sec', float),
 task_info_dt = numpy.dtype(
     [('taskname', '<S50'), ('task_no', numpy.uint32),
      ('weight', numpy.float32), ('duration', numpy.float32),
-     ('received', numpy.int64), ('mem_gb', numpy.float32)])
+     ('received', numpy.int64), ('mem_gb', numpy.float32),
+     ('shared_gb', numpy.float32)])
+task_sent_dt = numpy.dtype(
+    [('taskname', '<S50'), ('argname', '<S50'), ('sent', numpy.int64)])
 
 F16= numpy.float16
 F64= numpy.float64
@@ -116,7 +120,7 @@ def init_performance(hdf5file, swmr=False):
     if 'task_info' not in h5:
         hdf5.create(h5, 'task_info', task_info_dt)
     if 'task_sent' not in h5:
-        h5['task_sent'] = '{}'
+        hdf5.create(h5, 'task_sent', task_sent_dt)
     if swmr:
         try:
             h5.swmr_mode = True
@@ -126,6 +130,37 @@ def init_performance(hdf5file, swmr=False):
         h5.close()
 
 
+def save_task_sent(h5, sent):
+    """
+    Append the data transfer information to the task_sent dataset
+
+    :param h5: where to save the info
+    :param sent: a nested dictionary taskname -> {argname: nbytes}
+    """
+    data = numpy.array([(taskname, argname, nbytes)
+                        for taskname, dic in sent.items()
+                        for argname, nbytes in dic.items()], task_sent_dt)
+    if len(data):
+        hdf5.extend(h5['task_sent'], data)
+        h5['task_sent'].flush()  # notify the reader
+
+
+def get_task_sent(h5):
+    """
+    :param h5: a file with a task_sent dataset
+    :returns: a nested dictionary taskname -> {argname: nbytes}
+    """
+    dset = h5['task_sent']
+    if dset.shape == ():  # old format, a string with a literal dictionary
+        return ast.literal_eval(dset[()].decode('utf8'))
+    sent = {}
+    for taskname, argname, nbytes in dset[()]:
+        dic = sent.setdefault(taskname.decode('utf8'), {})
+        argname = argname.decode('utf8')
+        dic[argname] = dic.get(argname, 0) + int(nbytes)
+    return sent
+
+
 def performance_view(dstore):
     """
     Returns the performance view as a numpy array.
@@ -184,6 +219,22 @@ def memory_gb(pids=()):
     return sum(map(memory_rss, [os.getpid()] + list(pids))) / 1024**3
 
 
+def private_memory_gb(pids=()):
+    """
+    :params pids: a list or PIDs running on the same machine
+    :returns: the total memory allocated by the current process and all the
+              PIDs, excluding the shared memory
+    """
+    tot = 0
+    for pid in [os.getpid()] + list(pids):
+        try:
+            info = psutil.Process(pid).memory_info()
+        except psutil.NoSuchProcess:
+            continue
+        tot += info.rss - getattr(info, 'shared', 0)  # no shared on macOS
+    return tot / 1024**3
+
+
 # this is not thread-safe
 class Monitor(object):
     """
@@ -311,7 +362,7 @@ class Monitor(object):
         if self.h5:
             self.flush(self.h5)
 
-    def save_task_info(self, h5, res, name, mem_gb=0):
+    def save_task_info(self, h5, res, name, mem_gb=0, shared_gb=0):
         """
         Called by parallel.IterResult.
 
@@ -319,9 +370,10 @@ class Monitor(object):
         :param res: a :class:`Result` object
         :param name: name of the task function
         :param mem_gb: memory consumption at the saving time (optional)
+        :param shared_gb: shared memory published by the Starmap (optional)
         """
         t = (name, self.task_no, self.weight, self.duration, len(res.pik),
-             mem_gb)
+             mem_gb, shared_gb)
         data = numpy.array([t], task_info_dt)
         hdf5.extend(h5['task_info'], data)
         h5['task_info'].flush()  # notify the reader
@@ -19,6 +19,7 @@
 import io
 import copy
 import pickle
+import tempfile
 import unittest
 
 from openquake.baselib import node as n
@@ -190,3 +191,36 @@ param=yyy
     def test_can_pickle(self):
         node = n.Node('tag')
         self.assertEqual(pickle.loads(pickle.dumps(node)), node)
+
+
+class IterparseTestCase(unittest.TestCase):
+    xml = b"""<root><group name="a"><src id="1"><x>1</x></src><src id="2"/>
+</group><group name="b"/><src id="3"/></root>"""
+
+    def test(self):
+        with tempfile.NamedTemporaryFile(suffix='.xml') as f:
+            f.write(self.xml)
+            f.flush()
+            parser = n.ValidatingXmlParser({'x': int, 'src.id': int})
+            nodes = list(parser.iterparse(f.name, lambda tag: tag == 'src',
+                                          bufsize=10))
+        self.assertEqual([nd.tag for nd in nodes],
+                         ['src', 'src', 'group', 'src', 'root'])
+        self.assertEqual(nodes[0].x.text, 1)  # validated
+        self.assertEqual([nodes[i]['id'] for i in (0, 1, 3)], [1, 2, 3])
+        # the detached nodes are not attached to their parent
+        self.assertEqual(len(nodes[2]), 0)
+        self.assertEqual([nd.tag for nd in nodes[-1]], ['group', 'group'])
+
+    def test_skip(self):
+        with tempfile.NamedTemporaryFile(suffix='.xml') as f:
+            f.write(self.xml)
+            f.flush()
+            parser = n.ValidatingXmlParser({'x': int, 'src.id': int})
+            nodes = list(parser.iterparse(
+                f.name, lambda tag: tag == 'src', bufsize=10,
+                skip=lambda node: node.get('name') == 'a'))
+        # the group "a" and its sources are skipped
+        self.assertEqual([nd.tag for nd in nodes], ['src', 'root'])
+        self.assertEqual(nodes[0]['id'], 3)
+        self.assertEqual([nd['name'] for nd in nodes[-1]], ['b'])
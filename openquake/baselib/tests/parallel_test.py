@@ -65,6 +65,12 @@ def supertask(text, monitor):
             yield get_length, k * v
 
 
+def failing_length(data, monitor):
+    if len(data) > 2:
+        raise ValueError('too long: %s' % data)
+    return {'n': len(data)}
+
+
 def countletters(text1, text2, monitor):
     for block in general.block_splitter(text1 + text2, 5):
         yield get_length, ''.join(block)
@@ -144,6 +150,25 @@ class StarmapTestCase(unittest.TestCase):
             dic = dict(general.fast_agg3(info, 'taskname', ['received']))
             self.assertGreater(dic[b'get_length'], 0)
             self.assertGreater(dic[b'supertask'], 0)
+            if parallel.oq_distribute() != 'no':
+                # the 4 supertasks sent 61 characters plus pickle overhead
+                sent = performance.get_task_sent(h5)
+                self.assertGreater(sent['supertask']['text'], numchars)
+        shutil.rmtree(tmpdir)
+
+    def test_task_sent_on_error(self):
+        # the data transfer information is saved even if a task fails
+        tmpdir = tempfile.mkdtemp()
+        tmp = os.path.join(tmpdir, 'calc_1.hdf5')
+        performance.init_performance(tmp)
+        smap = parallel.Starmap(failing_length, [('ab',), ('abc',)],
+                                h5=hdf5.File(tmp, 'a'))
+        with self.assertRaises(ValueError):
+            smap.reduce()
+        if parallel.oq_distribute() != 'no':
+            sent = performance.get_task_sent(smap.h5)
+            self.assertGreater(sent['failing_length']['data'], 0)
+        smap.h5.close()
         shutil.rmtree(tmpdir)
 
     def test_countletters(self):
@@ -277,3 +302,21 @@ class SharedArrayTestCase(unittest.TestCase):
         ).reduce()
         with self.s_array as arr:
             numpy.testing.assert_allclose(arr, [[.1, .1], [.2, .2]])
+
+
+def sum_rows(rows, monitor):
+    """
+    Sum the given rows of the shared array
+    """
+    arr = monitor.shared['arr'].view()
+    return {row: arr[row].sum() for row in rows}
+
+
+class ShareTestCase(unittest.TestCase):
+    def test(self):
+        arr = numpy.arange(12.).reshape(4, 3)
+        smap = parallel.Starmap(sum_rows, [([0, 1],), ([2, 3],)])
+        smap.share(arr=arr)
+        self.assertEqual(smap._shared['arr'].nbytes, arr.nbytes)
+        res = smap.reduce()
+        self.assertEqual(res, {0: 3., 1: 12., 2: 21., 3: 30.})
@@ -27,11 +27,12 @@ import operator
 import numpy
 import pandas
 from PIL import Image
-from openquake.baselib import parallel, hdf5, config, python3compat
+from openquake.baselib import parallel, hdf5, config, python3compat, general
 from openquake.baselib.general import (
     AccumDict, DictArray, groupby, humansize, block_splitter)
 from openquake.hazardlib import valid, InvalidFile
 from openquake.hazardlib.contexts import read_cmakers
+from openquake.hazardlib.site import SiteCollection
 from openquake.hazardlib.calc.hazard_curve import classical as hazclassical
 from openquake.hazardlib.calc import disagg
 from openquake.hazardlib.map_array import RateMap, MapArray, rates_dt, check_hmaps
@@ -44,10 +45,12 @@ U32 = numpy.uint32
 F32 = numpy.float32
 F64 = numpy.float64
 I64 = numpy.int64
+TWO20 = 2 ** 20
 TWO24 = 2 ** 24
 TWO30 = 2 ** 30
 TWO32 = 2 ** 32
 GZIP = 'gzip'
+MAX_BLOCK_MB = 100  # max size of the hcurves processed together in postclassical
 BUFFER = 1.5  # enlarge the pointsource_distance sphere to fix the weight;
 # with BUFFER = 1 we would have lots of apparently light sources
 # collected together in an extra-slow task, as it happens in SHARE
@@ -146,17 +149,67 @@ def save_rates(g, N, jid, num_chunks, mon):
             _store(rats, num_chunks, None, mon)
 
 
+def read_shared(sources, grp_id, dstore, monitor):
+    """
+    :returns: the sources and the complete site collection, read from the
+              shared memory if published by the Starmap, else from the
+              datastore
+    """
+    shared = getattr(monitor, 'shared', {})
+    if 'sitecol' not in shared:
+        with dstore:
+            if sources is None:  # read the full group from the datastore
+                arr = dstore.getitem('_csm')[grp_id]
+                sources = pickle.loads(zlib.decompress(arr.tobytes()))
+            sitecol = dstore['sitecol'].complete  # super-fast
+        return sources, sitecol
+    if sources is None:  # unpickle the full group from the shared bytes
+        start, stop = shared['csm_slices'].view()[grp_id]
+        sources = pickle.loads(shared['csm'].view()[start:stop])
+    sitecol = SiteCollection.__new__(SiteCollection)
+    sitecol.array = shared['sitecol'].view()
+    sitecol.complete = sitecol
+    return sources, sitecol
+
+
+def share_csm(smap, dstore, grp_ids):
+    """
+    Publish the complete site collection and the decompressed source groups
+    with the given IDs in shared memory, when the workers are on the
+    same machine as the master
+    """
+    if smap.distribute != 'processpool':
+        return
+    piks = {}
+    start = 0
+    with dstore:
+        dset = dstore.getitem('_csm')  # the last element is the source_info
+        slices = numpy.zeros((len(dset) - 1, 2), I64)
+        for grp_id in sorted(grp_ids):
+            piks[grp_id] = zlib.decompress(dset[grp_id].tobytes())
+            slices[grp_id] = start, start + len(piks[grp_id])
+            start += len(piks[grp_id])
+        sites = dstore['sitecol'].complete.array
+    # copy the pickled groups in shared memory one at the time, releasing
+    # them immediately, to avoid keeping in memory a joined copy of the bytes
+    csm = parallel.SharedArray((start,), numpy.uint8, 0)
+    arr = numpy.ndarray((start,), numpy.uint8, buffer=csm.sm.buf)
+    for grp_id in sorted(grp_ids):
+        s0, s1 = slices[grp_id]
+        arr[s0:s1] = numpy.frombuffer(piks.pop(grp_id), numpy.uint8)
+    del arr
+    smap.share(sitecol=sites, csm=csm, csm_slices=slices)
+    logging.info('Sharing %s of sources and sites',
+                 humansize(csm.nbytes + sites.nbytes))
+
+
 def classical(sources, tilegetters, cmaker, dstore, monitor):
     """
     Call the classical calculator in hazardlib
     """
     # NB: removing the yield would cause terrible slow tasks
     cmaker.init_monitoring(monitor)
-    with dstore:
-        if sources is None:  # read the full group from the datastore
-            arr = dstore.getitem('_csm')[cmaker.grp_id]
-            sources = pickle.loads(zlib.decompress(arr.tobytes()))
-        sitecol = dstore['sitecol'].complete  # super-fast
+    sources, sitecol = read_shared(sources, cmaker.grp_id, dstore, monitor)
 
     if cmaker.disagg_by_src and not cmaker.atomic:
         # in case_27 (Japan) we do NOT enter here;
@@ -202,10 +255,7 @@ def tiling(tilegetter, cmaker, dstore, monitor):
     Tiling calculator
     """
     cmaker.init_monitoring(monitor)
-    with dstore:
-        arr = dstore.getitem('_csm')[cmaker.grp_id]
-        sources = pickle.loads(zlib.decompress(arr.tobytes()))
-        sitecol = dstore['sitecol'].complete  # super-fast
+    sources, sitecol = read_shared(None, cmaker.grp_id, dstore, monitor)
     result = hazclassical(sources, tilegetter(sitecol), cmaker)
     rmap = result.pop('rmap').remove_zeros()
     if config.directory.custom_tmp:
@@ -226,7 +276,7 @@ def fast_mean(pgetter, monitor):
     """
     with monitor('reading rates', measuremem=True):
         pgetter.init()
-    if not pgetter.sids:  # can happen with tiling
+    if len(pgetter.sids) == 0:  # can happen with tiling
         return {}
 
     with monitor('compute stats', measuremem=True):
@@ -240,6 +290,13 @@ def fast_mean(pgetter, monitor):
     return pmap_by_kind
 
 
+def max_block_size(L, R):
+    """
+    :returns: the number of sites in a block of hcurves of shape (n, L, R)
+    """
+    return max(1, int(MAX_BLOCK_MB * TWO20 / (L * R * 8)))
+
+
 def postclassical(pgetter, wget, hstats, individual_rlzs,
                   max_sites_disagg, amplifier, monitor):
     """
@@ -257,7 +314,7 @@ def postclassical(pgetter, wget, hstats, individual_rlzs,
     """
     with monitor('reading rates', measuremem=True):
         pgetter.init()
-    if not pgetter.sids:  # can happen with tiling
+    if len(pgetter.sids) == 0:  # can happen with tiling
         return {}
 
     if amplifier:
@@ -284,28 +341,32 @@ def postclassical(pgetter, wget, hstats, individual_rlzs,
     combine_mon = monitor('combine pmaps', measuremem=False)
     compute_mon = monitor('compute stats', measuremem=False)
     hmaps_mon = monitor('make_hmaps', measuremem=False)
-    sidx = MapArray(sids, 1, 1).fill(0).sidx
-    for sid in sids:
-        idx = sidx[sid]
+    # process blocks of sites with hcurves of shape (n, L, R) of at most
+    # MAX_BLOCK_MB, to vectorize the statistics while keeping memory bounded
+    for slc in general.gen_slices(0, len(sids), max_block_size(L, R)):
         with combine_mon:
-            pc = pgetter.get_hcurve(sid)  # shape (L, R)
+            pcs = pgetter.get_hcurves(slc)  # shape (n, L, R)
             if amplifier:
-                pc = amplifier.amplify(ampcode[sid], pc)
-                # NB: the hcurve have soil levels != IMT levels
-        if pc.sum() == 0:  # no data
+                # NB: the hcurves have soil levels != IMT levels
+                pcs = numpy.array([amplifier.amplify(ampcode[sid], pc)
+                                   for sid, pc in zip(sids[slc], pcs)])
+        ok = pcs.sum(axis=(1, 2)) > 0  # sites with data
+        idxs = numpy.arange(slc.start, slc.stop)[ok]
+        if len(idxs) == 0:
             continue
+        pcs = pcs[ok]
         with compute_mon:
             if R == 1 or individual_rlzs:
                 for r in range(R):
-                    pmap_by_kind['hcurves-rlzs'][r].array[idx] = (
-                        pc[:, r].reshape(M, L1))
+                    pmap_by_kind['hcurves-rlzs'][r].array[idxs] = (
+                        pcs[:, :, r].reshape(-1, M, L1))
             if hstats:
                 for s, (statname, stat) in enumerate(hstats.items()):
-                    sc = getters.build_stat_curve(
-                        pc, imtls, stat, pgetter.weights, wget,
+                    scs = getters.build_stat_curves(
+                        pcs, imtls, stat, pgetter.weights, wget,
                         pgetter.use_rates)
-                    arr = sc.reshape(M, L1)
-                    pmap_by_kind['hcurves-stats'][s].array[idx] = arr
+                    arr = scs.reshape(-1, M, L1)
+                    pmap_by_kind['hcurves-stats'][s].array[idxs] = arr
 
     if poes and (R == 1 or individual_rlzs):
         with hmaps_mon:
@@ -602,6 +663,8 @@ class ClassicalCalculator(base.HazardCalculator):
 
         self.datastore.swmr_on()  # must come before the Starmap
         smap = parallel.Starmap(classical, allargs, h5=self.datastore.hdf5)
+        share_csm(smap, ds, {args[2].grp_id for args in allargs
+                             if args[0] is None})
         if not self.oqparam.disagg_by_src:
             smap.expected_outputs = sum(n_out)
         acc = smap.reduce(self.agg_dicts, AccumDict(accum=0.))
@@ -623,6 +686,7 @@ class ClassicalCalculator(base.HazardCalculator):
         t0 = time.time()
         self.datastore.swmr_on()  # must come before the Starmap
         smap = parallel.Starmap(tiling, allargs, h5=self.datastore.hdf5)
+        share_csm(smap, ds, {args[1].grp_id for args in allargs})
         smap.reduce(self.agg_dicts, AccumDict(accum=0.))
 
         fraction = os.environ.get('OQ_SAMPLE_SOURCES')
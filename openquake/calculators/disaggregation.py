@@ -44,6 +44,26 @@ U8 = numpy.uint8
 U16 = numpy.uint16
 U32 = numpy.uint32
 F32 = numpy.float32
+BLOCKSIZE = 200 * 1024 ** 2  # size in bytes of the hazard curves per block
+
+
+def gen_hcurves(mgetters, maxbytes=BLOCKSIZE):
+    """
+    Read the rates chunk by chunk and yield pairs (sids, hcurves) for blocks
+    of sites, with hcurves of shape (n, L, R) and size around maxbytes
+    """
+    sids, hcurves, nbytes = [], [], 0
+    for mgetter in mgetters:
+        if mgetter.N == 0:
+            continue
+        sids.append(mgetter.sids)
+        hcurves.append(mgetter.get_hcurves(slice(None)))
+        nbytes += hcurves[-1].nbytes
+        if nbytes >= maxbytes:
+            yield numpy.concatenate(sids), numpy.concatenate(hcurves)
+            sids, hcurves, nbytes = [], [], 0
+    if sids:
+        yield numpy.concatenate(sids), numpy.concatenate(hcurves)
 
 
 def compute_disagg(dstore, ctxt, sitecol, cmaker, bin_edges, src_mutex, rwdic,
@@ -199,13 +219,14 @@ class DisaggregationCalculator(base.HazardCalculator):
             Z = oq.num_rlzs_disagg
             rlzs = numpy.zeros((self.N, Z), int)
             if self.R > 1:
-                for sid in range(self.N):
-                    hcurve = self.mgetters[sid].get_hcurve(sid)
-                    mean = getters.build_stat_curve(
-                        hcurve, oq.imtls, stats.mean_curve, full_lt.weights,
+                rlzs[:] = numpy.arange(Z)  # for the sites without hazard
+                for sids, hcurves in gen_hcurves(self.mgetters):
+                    means = getters.build_stat_curves(
+                        hcurves, oq.imtls, stats.mean_curve, full_lt.weights,
                         full_lt.wget)
-                    # get the closest realization to the mean
-                    rlzs[sid] = util.closest_to_ref(hcurve.T, mean)[:Z]
+                    # get the closest realizations to the mean
+                    rlzs[sids] = util.closest_to_refs(
+                        hcurves.transpose(0, 2, 1), means)[:, :Z]
             self.datastore['best_rlzs'] = rlzs
         else:
             Z = len(oq.rlz_index)
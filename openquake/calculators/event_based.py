@@ -21,6 +21,8 @@ import math
 import time
 import os.path
 import logging
+import operator
+import itertools
 import numpy
 import pandas
 from shapely import geometry
@@ -36,7 +38,7 @@ from openquake.hazardlib.calc.stochastic import sample_ruptures
 from openquake.hazardlib.contexts import ContextMaker, FarAwayRupture
 from openquake.hazardlib.calc.filters import (
     close_ruptures, magstr, nofilter, getdefault, get_distances, SourceFilter)
-from openquake.hazardlib.calc.gmf import GmfComputer
+from openquake.hazardlib.calc.gmf import GmfComputer, get_mean_stds_batch
 from openquake.hazardlib.calc.conditioned_gmfs import ConditionedGmfComputer
 from openquake.hazardlib.calc.stochastic import get_rup_array, rupture_dt
 from openquake.hazardlib.source.rupture import (
@@ -62,6 +64,7 @@ F32 = numpy.float32
 F64 = numpy.float64
 TWO24 = 2 ** 24
 TWO32 = numpy.float64(2 ** 32)
+MAX_BATCH_SITES = 100_000  # affected sites in a batch of ruptures
 rup_dt = numpy.dtype(
     [('rup_id', I64), ('rrup', F32), ('time', F32), ('task_no', U16)])
 
@@ -201,15 +204,11 @@ def get_computer(cmaker, proxy, srcfilter, station_data, station_sitecol):
         oq._amplifier, oq._sec_perils)
 
 
-def _event_based(proxies, cmaker, stations, srcfilter, shr,
-                 fmon, cmon, umon, mmon):
-    oq = cmaker.oq
-    alldata = []
-    sig_eps = []
-    times = []
-    max_iml = oq.get_max_iml()
-    se_dt = sig_eps_dt(oq.imtls)
-    mea_tau_phi = []
+def _gen_batches(proxies, cmaker, srcfilter, stations, fmon, maxsites):
+    # yield lists of triples (proxy, computer, dt) affecting up to
+    # maxsites sites; dt is the time spent to instantiate the computer
+    batch = []
+    nsites = 0
     for proxy in proxies:
         t0 = time.time()
         with fmon:
@@ -220,27 +219,61 @@ def _event_based(proxies, cmaker, stations, srcfilter, shr,
             except FarAwayRupture:
                 # skip this rupture
                 continue
-        if stations and stations[0] is not None:  # conditioned GMFs
-            assert cmaker.scenario
-            with shr['mea'] as mea, shr['tau'] as tau, shr['phi'] as phi:
-                df = computer.compute_all(
-                    [mea, tau, phi], max_iml, mmon, cmon, umon)
-        else:  # regular GMFs
-            df = computer.compute_all(None, max_iml, mmon, cmon, umon)
-            if oq.mea_tau_phi:
-                mtp = numpy.array(computer.mea_tau_phi, GmfComputer.mtp_dt)
-                mea_tau_phi.append(mtp)
-        sig_eps.append(computer.build_sig_eps(se_dt))
-        dt = time.time() - t0
-        times.append((proxy['id'], computer.ctx.rrup.min(), dt))
-        alldata.append(df)
+        batch.append((proxy, computer, time.time() - t0))
+        nsites += computer.N
+        if nsites >= maxsites:
+            yield batch
+            batch = []
+            nsites = 0
+    if batch:
+        yield batch
+
+
+def _event_based(proxies, cmaker, stations, srcfilter, shr,
+                 fmon, cmon, umon, mmon):
+    oq = cmaker.oq
+    buf = None
+    sig_eps = []
+    times = []
+    max_iml = oq.get_max_iml()
+    se_dt = sig_eps_dt(oq.imtls)
+    mea_tau_phi = []
+    conditioned = stations and stations[0] is not None
+    # conditioned GMFs are computed one rupture at the time
+    maxsites = 0 if conditioned else MAX_BATCH_SITES
+    for batch in _gen_batches(
+            proxies, cmaker, srcfilter, stations, fmon, maxsites):
+        computers = [computer for _, computer, _ in batch]
+        if buf is None:  # the same buffer is reused for all ruptures
+            buf = computers[0].new_buffer()
+        if conditioned:
+            all_mean_stds = [None] * len(batch)
+        else:  # one get_mean_stds call for the whole batch
+            all_mean_stds = get_mean_stds_batch(computers, mmon)
+        for (proxy, computer, dt), mean_stds in zip(batch, all_mean_stds):
+            t0 = time.time()
+            if conditioned:
+                assert cmaker.scenario
+                with shr['mea'] as mea, shr['tau'] as tau, \
+                        shr['phi'] as phi:
+                    computer.compute_into(
+                        buf, [mea, tau, phi], max_iml, mmon, cmon, umon)
+            else:  # regular GMFs
+                computer.compute_into(
+                    buf, mean_stds, max_iml, mmon, cmon, umon)
+                if oq.mea_tau_phi:
+                    mtp = numpy.array(computer.mea_tau_phi,
+                                      GmfComputer.mtp_dt)
+                    mea_tau_phi.append(mtp)
+            sig_eps.append(computer.build_sig_eps(se_dt))
+            dt += time.time() - t0
+            times.append((proxy['id'], computer.ctx.rrup.min(), dt))
     times = numpy.array([tup + (fmon.task_no,) for tup in times], rup_dt)
     times.sort(order='rup_id')
-    if sum(len(df) for df in alldata) == 0:
+    if buf is None or len(buf) == 0:
         return dict(gmfdata={}, times=times, sig_eps=())
 
-    gmfdata = pandas.concat(alldata)  # ~40 MB
-    dic = dict(gmfdata={k: gmfdata[k].to_numpy() for k in gmfdata.columns},
+    dic = dict(gmfdata=buf.to_dict(),
                times=times, sig_eps=numpy.concatenate(sig_eps, dtype=se_dt))
     if oq.mea_tau_phi:
         mtpdata = numpy.concatenate(mea_tau_phi, dtype=GmfComputer.mtp_dt)
@@ -248,9 +281,55 @@ def _event_based(proxies, cmaker, stations, srcfilter, shr,
     return dic
 
 
-def event_based(proxies, cmaker, sitecol, stations, dstore, monitor):
+def store_gmfs(gmfdata, scratch, monitor):
+    """
+    Store the GMFs of a task in the gzipped file scratch/gmf_<task_no>.hdf5
+
+    :returns: a dictionary with keys fname, start, stop, slice_by_event
+    """
+    fname = os.path.join(scratch, 'gmf_%d.hdf5' % monitor.task_no)
+    with hdf5.File(fname, 'a') as h5:
+        if 'gmf_data' not in h5:
+            h5.create_df('gmf_data', [(col, arr.dtype)
+                                      for col, arr in gmfdata.items()],
+                         'gzip')
+        start = len(h5['gmf_data/sid'])
+        for col, arr in gmfdata.items():
+            hdf5.extend(h5[f'gmf_data/{col}'], arr)
+    return dict(fname=fname, start=start, stop=start + len(gmfdata['sid']),
+                slice_by_event=build_slice_by_event(gmfdata['eid']))
+
+
+def copy_gmfs(dstore, gmf_slices):
+    """
+    Copy the GMFs stored by the tasks in the scratch directory into the
+    gmf_data datasets, in order of arrival, and remove the scratch files
+
+    :param dstore: the DataStore containing the empty gmf_data datasets
+    :param gmf_slices: a list of triples (fname, start, stop)
+    """
+    cols = dstore.get_attr('gmf_data', '__pdcolumns__').split()
+    fnames = set()
+    # the slices coming from the same task are usually consecutive
+    for fname, slices in itertools.groupby(
+            gmf_slices, operator.itemgetter(0)):
+        with hdf5.File(fname, 'r') as h5:
+            for _, start, stop in slices:
+                for col in cols:
+                    key = 'gmf_data/' + col
+                    hdf5.extend(dstore[key], h5[key][start:stop])
+        fnames.add(fname)
+    for fname in fnames:
+        os.remove(fname)
+    logging.info('Copied gmf_data from %d files in %s', len(fnames),
+                 os.path.dirname(fname))
+
+
+def event_based(proxies, cmaker, sitecol, stations, dstore, scratch, monitor):
     """
-    Compute GMFs and optionally hazard curves
+    Compute GMFs and optionally hazard curves.
+    If `scratch` is a directory, the GMFs are stored there and only
+    their location is returned
     """
     if isinstance(dstore, str):
         # when passing ruptures.hdf5
@@ -269,8 +348,12 @@ def event_based(proxies, cmaker, sitecol, stations, dstore, monitor):
         for proxy in proxies:
             proxy.geom = dset[proxy['geom_id']]
     for block in block_splitter(proxies, 20_000, rup_weight):
-        yield _event_based(block, cmaker, stations, srcfilter,
+        dic = _event_based(block, cmaker, stations, srcfilter,
                            monitor.shared, fmon, cmon, umon, mmon)
+        if scratch and len(dic['gmfdata']['sid']):
+            with monitor('storing gmfs', measuremem=False):
+                dic['gmfdata'] = store_gmfs(dic['gmfdata'], scratch, monitor)
+        yield dic
 
 
 def filter_stations(station_df, complete, rup, maxdist):
@@ -301,7 +384,7 @@ def filter_stations(station_df, complete, rup, maxdist):
     return station_data, station_sites
 
 
-def starmap_from_rups_hdf5(oq, sitecol, dstore):
+def starmap_from_rups_hdf5(oq, sitecol, dstore, scratch=''):
     """
     :returns: a Starmap instance sending event_based tasks
     """
@@ -339,15 +422,19 @@ def starmap_from_rups_hdf5(oq, sitecol, dstore):
                               oq, extraparams=extra)
         cmaker.min_mag = getdefault(oq.minimum_magnitude, trt)
         for block in block_splitter(proxies, maxw * 1.02, rup_weight):
-            args = block, cmaker, sitecol, (None, None), ruptures_hdf5
+            args = (block, cmaker, sitecol, (None, None), ruptures_hdf5,
+                    scratch)
             smap.submit(args)
     return smap
 
 
 # NB: save_tmp is passed in event_based_risk
-def starmap_from_rups(func, oq, full_lt, sitecol, dstore, save_tmp=None):
+def starmap_from_rups(func, oq, full_lt, sitecol, dstore, save_tmp=None,
+                      scratch=None):
     """
-    Submit the ruptures and apply `func` (event_based or ebrisk)
+    Submit the ruptures and apply `func` (event_based or ebrisk);
+    `scratch` is passed to event_based and is the directory where to store
+    the GMFs, or the empty string to keep them in memory
     """
     try:
         vs30 = sitecol.vs30
@@ -391,13 +478,20 @@ def starmap_from_rups(func, oq, full_lt, sitecol, dstore, save_tmp=None):
         G = len(cmaker.gsims)
         M = len(cmaker.imts)
         N = len(computer.sitecol)
-        size = 2 * G * M * N * N * 8  # tau, phi
-        msg = f'{G=} * {M=} * {humansize(N*N*8)} * 2'
+        rank = oq.conditioned_gmf_rank
+        if rank:  # U and d, see conditioned_gmfs.get_low_rank_cov
+            R = rank + 4  # U has rank + 3 columns, d has 1
+            size = G * M * N * R * 8
+            msg = f'{G=} * {M=} * {humansize(N*R*8)}'
+        else:
+            size = 2 * G * M * N * N * 8  # tau, phi
+            msg = f'{G=} * {M=} * {humansize(N*N*8)} * 2'
         logging.info('Requiring %s for tau, phi [%s]', humansize(size), msg)
         if size > float(config.memory.conditioned_gmf_gb) * 1024**3:
             raise ValueError(
                 f'The calculation is too large: {G=}, {M=}, {N=}. '
-                'You must reduce the number of sites i.e. maximum_distance')
+                'You must reduce the number of sites i.e. maximum_distance '
+                'or set conditioned_gmf_rank')
         mea, tau, phi = computer.get_mea_tau_phi(dstore.hdf5)
         del proxy.geom  # to reduce data transfer
 
@@ -424,7 +518,10 @@ def starmap_from_rups(func, oq, full_lt, sitecol, dstore, save_tmp=None):
             smap.share(mea=mea, tau=tau, phi=phi)
         # producing slightly less than concurrent_tasks thanks to the 1.02
         for block in block_splitter(proxies, maxw * 1.02, rup_weight):
-            args = block, cmaker, sitecol, (station_data, station_sites), dstore
+            args = (block, cmaker, sitecol, (station_data, station_sites),
+                    dstore)
+            if scratch is not None:
+                args += (scratch,)
             smap.submit(args)
     dstore['gsims'] = numpy.array(toml_gsims)
     return smap
@@ -643,7 +740,20 @@ class EventBasedCalculator(base.HazardCalculator):
         sec_imts = self.oqparam.sec_imts
         with sav_mon:
             gmfdata = result.pop('gmfdata')
-            if len(gmfdata):
+            if 'fname' in gmfdata:  # already stored in the scratch dir
+                times = result.pop('times')
+                hdf5.extend(self.datastore['gmf_data/rup_info'], times)
+                if self.N >= SLICE_BY_EVENT_NSITES:
+                    sbe = gmfdata['slice_by_event']
+                    sbe['start'] += self.offset
+                    sbe['stop'] += self.offset
+                    hdf5.extend(self.datastore['gmf_data/slice_by_event'], sbe)
+                self.gmf_slices.append(
+                    (gmfdata['fname'], gmfdata['start'], gmfdata['stop']))
+                sig_eps = result.pop('sig_eps')
+                hdf5.extend(self.datastore['gmf_data/sigma_epsilon'], sig_eps)
+                self.offset += gmfdata['stop'] - gmfdata['start']
+            elif len(gmfdata):
                 df = pandas.DataFrame(gmfdata)
                 dset = self.datastore['gmf_data/sid']
                 times = result.pop('times')
@@ -750,6 +860,8 @@ class EventBasedCalculator(base.HazardCalculator):
         else:
             logging.info('min_iml=%s', oq.min_iml)
         self.offset = 0
+        self.gmf_slices = []  # used when the GMFs are stored in scratch
+        scratch = ''  # directory where the tasks store the GMFs, if any
         if oq.hazard_calculation_id:  # from ruptures
             dstore.parent = datastore.read(oq.hazard_calculation_id)
             self.full_lt = dstore.parent['full_lt'].init()
@@ -785,16 +897,23 @@ class EventBasedCalculator(base.HazardCalculator):
             dstore.create_dset('gmf_data/rup_info', rup_dt)
             if self.N >= SLICE_BY_EVENT_NSITES:
                 dstore.create_dset('gmf_data/slice_by_event', slice_dt)
+            if config.performance.get('gmf_in_scratch') == 'true':
+                # the tasks store the GMFs in the scratch directory
+                scratch = parallel.scratch_dir(dstore.calc_id)
+                logging.info('Storing the GMFs in %s', scratch)
 
         # event_based in parallel
         if oq.ruptures_hdf5:
-            smap = starmap_from_rups_hdf5(oq, self.sitecol, dstore)
+            smap = starmap_from_rups_hdf5(oq, self.sitecol, dstore, scratch)
         else:
-            smap = starmap_from_rups(
-                event_based, oq, self.full_lt, self.sitecol, dstore)
+            smap = starmap_from_rups(event_based, oq, self.full_lt,
+                                     self.sitecol, dstore, scratch=scratch)
         acc = smap.reduce(self.agg_dicts)
         if 'gmf_data' not in dstore:
             return acc
+        if self.gmf_slices:
+            with self.monitor('copying gmfs', measuremem=False):
+                copy_gmfs(dstore, self.gmf_slices)
         if oq.ground_motion_fields:
             with self.monitor('saving avg_gmf', measuremem=True):
                 self.save_avg_gmf()
@@ -216,6 +216,27 @@ def event_based_risk(df, oqparam, monitor):
     return dict(avg=avg, alt=alt, gmf_bytes=df.memory_usage().sum())
 
 
+def get_rows(usids, start, counts, sids):
+    """
+    :param usids: unique site IDs of a GMF DataFrame sorted by site ID
+    :param start: index of the first row for each unique site ID
+    :param counts: number of rows for each unique site ID
+    :param sids: site IDs to extract
+    :returns: the indices of the rows on the given sites, in order
+
+    >>> get_rows(numpy.array([1, 3, 4]), numpy.array([0, 2, 5]),
+    ...          numpy.array([2, 3, 1]), numpy.array([4, 2, 1]))
+    array([0, 1, 5])
+    """
+    idx = numpy.searchsorted(usids, sids)
+    ok = idx < len(usids)
+    idx = idx[ok]
+    idx = numpy.sort(idx[usids[idx] == sids[ok]])
+    cnt = counts[idx]
+    offsets = numpy.repeat(cnt.cumsum() - cnt - start[idx], cnt)
+    return numpy.arange(cnt.sum()) - offsets
+
+
 def gen_outputs(df, crmodel, rng, monitor):
     """
     :param df: GMF dataframe (a slice of events)
@@ -227,7 +248,12 @@ def gen_outputs(df, crmodel, rng, monitor):
     mon_risk = monitor('computing risk', measuremem=False)
     fil_mon = monitor('filtering GMFs', measuremem=False)
     ass_mon = monitor('reading assets', measuremem=False)
-    sids = df.sid.to_numpy()
+    with fil_mon:
+        # sort the GMFs by site ID once, so that the GMFs on the sites
+        # of a group of assets can be extracted by slicing
+        df = df.iloc[numpy.argsort(df.sid.to_numpy(), kind='stable')]
+        usids, start, counts = numpy.unique(
+            df.sid.to_numpy(), return_index=True, return_counts=True)
     for s0, s1 in monitor.read('start-stop'):
         with ass_mon:
             assets = monitor.read('assets', slice(s0, s1)).set_index('ordinal')
@@ -238,7 +264,8 @@ def gen_outputs(df, crmodel, rng, monitor):
             country = crmodel.countries[id0]
             with fil_mon:
                 # *crucial* for the performance of the next step
-                gmf_df = df[numpy.isin(sids, adf.site_id.unique())]
+                gmf_df = df.iloc[get_rows(
+                    usids, start, counts, adf.site_id.unique())]
             if len(gmf_df) == 0:  # common enough
                 continue
             with mon_risk:
@@ -311,7 +338,7 @@ def ebrisk(proxies, cmaker, sitecol, stations, dstore, monitor):
     for block in general.block_splitter(
             proxies, 20_000, event_based.rup_weight):
         for dic in event_based.event_based(
-                block, cmaker, sitecol, stations, dstore, monitor):
+                block, cmaker, sitecol, stations, dstore, '', monitor):
             if len(dic['gmfdata']):
                 gmf_df = pandas.DataFrame(dic['gmfdata'])
                 yield event_based_risk(gmf_df, cmaker.oq, monitor)
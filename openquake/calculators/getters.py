@@ -45,11 +45,22 @@ def build_stat_curve(hcurve, imtls, stat, weights, wget, use_rates=False):
     """
     Build statistics by taking into account IMT-dependent weights
     """
-    poes = hcurve.T  # shape R, L
+    return build_stat_curves(
+        hcurve[None], imtls, stat, weights, wget, use_rates)[0]
+
+
+def build_stat_curves(hcurves, imtls, stat, weights, wget, use_rates=False):
+    """
+    Build statistics for a block of sites by taking into account
+    IMT-dependent weights
+
+    :param hcurves: an array of shape (N, L, R)
+    :returns: an array of shape (N, L, 1)
+    """
+    poes = hcurves.transpose(2, 0, 1)  # shape R, N, L
     assert len(poes) == len(weights), (len(poes), len(weights))
-    L = imtls.size
-    array = numpy.zeros((L, 1))
-    
+    N, L, _R = hcurves.shape
+    array = numpy.zeros((N, L, 1))
     if weights.shape[1] > 1:  # IMT-dependent weights
         # this is slower since the arrays are shorter
         for imt in imtls:
@@ -58,14 +69,14 @@ def build_stat_curve(hcurve, imtls, stat, weights, wget, use_rates=False):
             if not ws.sum():  # expect no data for this IMT
                 continue
             if use_rates:
-                array[slc, 0] = to_probs(stat(to_rates(poes[:, slc]), ws))
+                array[:, slc, 0] = to_probs(stat(to_rates(poes[:, :, slc]), ws))
             else:
-                array[slc, 0] = stat(poes[:, slc], ws)
+                array[:, slc, 0] = stat(poes[:, :, slc], ws)
     else:
         if use_rates:
-            array[:, 0] = to_probs(stat(to_rates(poes), weights[:, -1]))
+            array[:, :, 0] = to_probs(stat(to_rates(poes), weights[:, -1]))
         else:
-            array[:, 0] = stat(poes, weights[:, -1])
+            array[:, :, 0] = stat(poes, weights[:, -1])
     return array
 
 
@@ -228,9 +239,9 @@ class CurveGetter(object):
         """
         rates = {}
         for mgetter in map_getters(dstore):
-            pmap = mgetter.init()
-            for sid in pmap:
-                rates[sid] = pmap[sid]  # shape (L, G)
+            array = mgetter.init()  # shape (N, L, G)
+            for idx, sid in enumerate(mgetter.sids):
+                rates[sid] = array[idx]  # shape (L, G)
         dic = collections.defaultdict(lambda: ZeroGetter(mgetter.L, mgetter.R))
         for sid in rates:
             dic[sid] = cls(sid, rates[sid], mgetter.trt_rlzs, mgetter.R)
@@ -266,12 +277,13 @@ class MapGetter(object):
         self.poes = oq.poes
         self.use_rates = oq.use_rates
         self.eids = None
-        self._map = {}
+        self._sids = None
+        self._rates = None
 
     @property
     def sids(self):
         self.init()
-        return list(self._map)
+        return self._sids
 
     @property
     def imts(self):
@@ -288,49 +300,69 @@ class MapGetter(object):
     @property
     def N(self):
         self.init()
-        return len(self._map)
+        return len(self._sids)
 
     @property
     def M(self):
         return len(self.imtls)
 
-    def init(self):
-        """
-        Build the _map from the underlying dataframes
-        """
-        if self._map:
-            return self._map
+    def _slices(self):
+        # yield (dstore, start, stop) for the slices of the chunk
         for fname in self.filenames:
             with hdf5.File(fname) as dstore:
                 slices = dstore['_rates/slice_by_idx'][:]
                 slices = slices[slices['idx'] == self.idx]
                 for start, stop in zip(slices['start'], slices['stop']):
-                    rates_df = dstore.read_df('_rates', slc=slice(start, stop))
-                    # not using groupby to save memory
-                    for sid in rates_df.sid.unique():
-                        df = rates_df[rates_df.sid == sid]
-                        try:
-                            array = self._map[sid]
-                        except KeyError:
-                            array = numpy.zeros((self.L, self.G))
-                            self._map[sid] = array
-                        array[df.lid, df.gid] = df.rate
-        return self._map
+                    yield dstore, start, stop
+
+    def init(self):
+        """
+        Read the rates of the chunk and build a dense array of shape
+        (N, L, G), with the site IDs sorted in `.sids`
+
+        :returns: the array of rates
+        """
+        if self._rates is not None:
+            return self._rates
+        # first pass: read only the site IDs, to determine the block shape
+        sids = [dstore['_rates/sid'][start:stop]
+                for dstore, start, stop in self._slices()]
+        self._sids = U32(numpy.unique(numpy.concatenate(sids))
+                         if sids else [])
+        self._rates = numpy.zeros((len(self._sids), self.L, self.G))
+        # second pass: fill the block with a vectorized assignment per slice
+        for sid, (dstore, start, stop) in zip(sids, self._slices()):
+            idxs = numpy.searchsorted(self._sids, sid)
+            lid = dstore['_rates/lid'][start:stop]
+            gid = dstore['_rates/gid'][start:stop]
+            self._rates[idxs, lid, gid] = dstore['_rates/rate'][start:stop]
+        return self._rates
 
     def get_hcurve(self, sid):  # used in classical
         """
         :param sid: a site ID
         :returns: an array of shape (L, R) for the given site ID
         """
-        pmap = self.init()
+        rates = self.init()
         r0 = numpy.zeros((self.L, self.R))
-        if sid not in pmap:  # no hazard for sid
-            return r0
+        idx = numpy.searchsorted(self._sids, sid)
+        if idx == len(self._sids) or self._sids[idx] != sid:
+            return r0  # no hazard for sid
         for g, t_rlzs in enumerate(self.trt_rlzs):
             rlzs = t_rlzs % TWO24
-            rates = pmap[sid][:, g]
             for rlz in rlzs:
-                r0[:, rlz] += rates
+                r0[:, rlz] += rates[idx, :, g]
+        return to_probs(r0)
+
+    def get_hcurves(self, slc):  # used in postclassical
+        """
+        :param slc: a slice over the site indices of the block
+        :returns: an array of shape (n, L, R) for the sites in the slice
+        """
+        rates = self.init()[slc]
+        r0 = numpy.zeros((len(rates), self.L, self.R))
+        for g, t_rlzs in enumerate(self.trt_rlzs):
+            r0[:, :, t_rlzs % TWO24] += rates[:, :, g, None]
         return to_probs(r0)
 
     def get_fast_mean(self, gweights):
@@ -339,11 +371,8 @@ class MapGetter(object):
         """
         M = self.M
         L1 = self.L // M
-        means = MapArray(U32(self.sids), M, L1).fill(0)
-        for sid in self.sids:
-            idx = means.sidx[sid]
-            rates = self._map[sid]  # shape (L, G)
-            means.array[idx] = (rates @ gweights).reshape((M, L1))
+        means = MapArray(self.sids, M, L1)
+        means.array = F32(self.init() @ gweights).reshape((self.N, M, L1))
         means.array[:] = to_probs(means.array)
         return means
 
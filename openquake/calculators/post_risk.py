@@ -241,30 +241,36 @@ def fix_dtypes(dic):
     fix_dtype(dic, F32, floatcolumns)
 
 
-def build_aggcurves(items, builder, num_events, aggregate_loss_curves_types, monitor):
+def build_aggcurves(items, builder, num_events, aggregate_loss_curves_types,
+                    monitor):
     """
     :param items: a list of pairs ((agg_id, rlz_id, loss_id), losses)
     :param builder: a :class:`LossCurvesMapsBuilder` instance
     """
+    keys = numpy.array([key for key, data in items])
+    cols = [col for col in items[0][1] if col != 'year']
+    counts = [len(data[cols[0]]) for key, data in items]
+    offsets = numpy.concatenate([[0], numpy.cumsum(counts)])
+    if 'year' in items[0][1]:
+        years = numpy.concatenate([data['year'] for key, data in items])
+    else:
+        years = ()
+    periods = builder.return_periods
+    P = len(periods)
     dic = general.AccumDict(accum=[])
-    for (agg_id, rlz_id, loss_id), data in items:
-        year = data.pop('year', ())
-        curve = {
-            col: builder.build_curve(
-                # col is 'losses' in the case of consequences
-                year, 'loss' if col == 'losses' else col,
-                data[col], aggregate_loss_curves_types,
-                scientific.LOSSTYPE[loss_id], num_events[rlz_id])
-            for col in data}
-        for p, period in enumerate(builder.return_periods):
-            dic['agg_id'].append(agg_id)
-            dic['rlz_id'].append(rlz_id)
-            dic['loss_id'].append(loss_id)
-            dic['return_period'].append(period)
-            for col in data:
-                # NB: 'fatalities' in EventBasedDamageTestCase.test_case_15
-                for k, c in curve[col].items():
-                    dic[k].append(c[p])
+    dic['agg_id'] = numpy.repeat(keys[:, 0], P).tolist()
+    dic['rlz_id'] = numpy.repeat(keys[:, 1], P).tolist()
+    dic['loss_id'] = numpy.repeat(keys[:, 2], P).tolist()
+    dic['return_period'] = numpy.tile(periods, len(keys)).tolist()
+    for col in cols:
+        losses = numpy.concatenate([data[col] for key, data in items])
+        curves = builder.build_curves(
+            # col is 'losses' in the case of consequences
+            years, 'loss' if col == 'losses' else col, losses, offsets,
+            aggregate_loss_curves_types, num_events[keys[:, 1]])
+        # NB: 'fatalities' in EventBasedDamageTestCase.test_case_15
+        for k, curve in curves.items():
+            dic[k] = curve.flatten().tolist()
     return dic
 
 
@@ -274,6 +280,43 @@ def get_loss_id(ext_loss_types):
     return scientific.LOSSID[ext_loss_types[0]]
 
 
+def gen_groups(rbe_df, agg_ids):
+    """
+    Sort the risk_by_event table once by (agg_id, rlz_id, loss_id) and
+    yield the keys (agg_id, rlz_id, loss_id) with the indices of the
+    corresponding rows, in the order of the agg_ids and then of the
+    (rlz_id, loss_id) pairs. The indices in each group are in the
+    original order of the rows.
+
+    >>> df = pandas.DataFrame(dict(agg_id=[1, 0, 1, 1, 0],
+    ...                            rlz_id=[0, 0, 1, 0, 0],
+    ...                            loss_id=[2, 2, 2, 2, 3]))
+    >>> for key, idxs in gen_groups(df, [1, 0]):
+    ...     print(key, idxs)
+    (1, 0, 2) [0 3]
+    (1, 1, 2) [2]
+    (0, 0, 2) [1]
+    (0, 0, 3) [4]
+    """
+    aggs = rbe_df.agg_id.to_numpy()
+    rlzs = rbe_df.rlz_id.to_numpy()
+    lids = rbe_df.loss_id.to_numpy()
+    order = numpy.lexsort((lids, rlzs, aggs))  # stable sort
+    aggs, rlzs, lids = aggs[order], rlzs[order], lids[order]
+    change = (aggs[1:] != aggs[:-1]) | (rlzs[1:] != rlzs[:-1]) | (
+        lids[1:] != lids[:-1])
+    starts = numpy.concatenate([[0], change.nonzero()[0] + 1])
+    stops = numpy.append(starts[1:], len(order))
+    # the groups of agg_id are in the range [start, stop) in the starts
+    groups = aggs[starts]
+    gstarts = numpy.searchsorted(groups, agg_ids, 'left')
+    gstops = numpy.searchsorted(groups, agg_ids, 'right')
+    for agg_id, gstart, gstop in zip(agg_ids, gstarts, gstops):
+        for start, stop in zip(starts[gstart:gstop], stops[gstart:gstop]):
+            yield ((int(agg_id), int(rlzs[start]), int(lids[start])),
+                   order[start:stop])
+
+
 # launch Starmap building the aggcurves and store them
 def store_aggcurves(oq, agg_ids, rbe_df, builder, loss_cols,
                     events, num_events, dstore):
@@ -287,13 +330,13 @@ def store_aggcurves(oq, agg_ids, rbe_df, builder, loss_cols,
     except ValueError:  # missing in case of GMFs from CSV
         year = ()
     items = []
-    for agg_id in agg_ids:
-        gb = rbe_df[rbe_df.agg_id == agg_id].groupby(['rlz_id', 'loss_id'])
-        for (rlz_id, loss_id), df in gb:
-            data = {col: df[col].to_numpy() for col in loss_cols}
-            if len(year):
-                data['year'] = year[df.event_id.to_numpy()]
-            items.append([(agg_id, rlz_id, loss_id), data])
+    eids = rbe_df.event_id.to_numpy()
+    arrays = {col: rbe_df[col].to_numpy() for col in loss_cols}
+    for key, idxs in gen_groups(rbe_df, agg_ids):
+        data = {col: arrays[col][idxs] for col in loss_cols}
+        if len(year):
+            data['year'] = year[eids[idxs]]
+        items.append([key, data])
     dstore.swmr_on()
     dic = parallel.Starmap.apply(
         build_aggcurves, (items, builder, num_events, aggtypes),
@@ -329,34 +372,33 @@ def compute_aggrisk(dstore, oq, rbe_df, num_events, agg_ids):
         aggnumber = dstore['agg_values']['number']
     acc = general.AccumDict(accum=[])
     quantiles = general.AccumDict(accum=([], []))
-    for agg_id in agg_ids:
-        gb = rbe_df[rbe_df.agg_id == agg_id].groupby(['rlz_id', 'loss_id'])
-        for (rlz_id, loss_id), df in gb:
-            ne = num_events[rlz_id]
-            acc['agg_id'].append(agg_id)
-            acc['rlz_id'].append(rlz_id)
-            acc['loss_id'].append(loss_id)
-            if dmgs:
-                # infer the number of buildings in nodamage state
-                ndamaged = sum(df[col].sum() for col in dmgs)
-                dmg0 = aggnumber[agg_id] - ndamaged / (ne * L)
-                assert dmg0 >= 0, dmg0
-                acc['dmg_0'].append(dmg0)
-            for col in columns:
-                losses = df[col].sort_values().to_numpy()
-                sorted_losses, _, eperiods = scientific.fix_losses(
-                    losses, ne, builder.eff_time)
-                if oq.quantiles and not col.startswith('dmg_'):
-                    ls, ws = quantiles[agg_id, loss_id, col]
-                    ls.extend(sorted_losses)
-                    ws.extend([weights[rlz_id]]* len(sorted_losses))
-                agg = sorted_losses.sum()
-                acc[col].append(
+    arrays = {col: rbe_df[col].to_numpy() for col in columns}
+    for (agg_id, rlz_id, loss_id), idxs in gen_groups(rbe_df, agg_ids):
+        ne = num_events[rlz_id]
+        acc['agg_id'].append(agg_id)
+        acc['rlz_id'].append(rlz_id)
+        acc['loss_id'].append(loss_id)
+        if dmgs:
+            # infer the number of buildings in nodamage state
+            ndamaged = sum(arrays[col][idxs].sum() for col in dmgs)
+            dmg0 = aggnumber[agg_id] - ndamaged / (ne * L)
+            assert dmg0 >= 0, dmg0
+            acc['dmg_0'].append(dmg0)
+        for col in columns:
+            losses = numpy.sort(arrays[col][idxs])
+            sorted_losses, _, eperiods = scientific.fix_losses(
+                losses, ne, builder.eff_time)
+            if oq.quantiles and not col.startswith('dmg_'):
+                ls, ws = quantiles[agg_id, loss_id, col]
+                ls.extend(sorted_losses)
+                ws.extend([weights[rlz_id]]* len(sorted_losses))
+            agg = sorted_losses.sum()
+            acc[col].append(
+                agg * tr if oq.investigation_time else agg/ne)
+            if builder.pla_factor:
+                agg = sorted_losses @ builder.pla_factor(eperiods)
+                acc['pla_' + col].append(
                     agg * tr if oq.investigation_time else agg/ne)
-                if builder.pla_factor:
-                    agg = sorted_losses @ builder.pla_factor(eperiods)
-                    acc['pla_' + col].append(
-                        agg * tr if oq.investigation_time else agg/ne)
     fix_dtypes(acc)
     aggrisk = pandas.DataFrame(acc)
     out = general.AccumDict(accum=[])
@@ -401,20 +443,19 @@ def build_store_agg(dstore, oq, rbe_df, num_events):
     if len(aggrisk_quantiles):
         dstore.create_df('aggrisk_quantiles', aggrisk_quantiles)
     loss_cols = [col for col in columns if not col.startswith('dmg_')]
-    for agg_id in agg_ids:
-        # build loss_by_event and loss_by_rupture
-        if agg_id == K and ('loss' in columns or 'losses' in columns) and rups:
-            df = rbe_df[(rbe_df.agg_id == K) & (rbe_df.loss_id == T)].copy()
-            if len(df):
-                df['rup_id'] = rup_id[df.event_id.to_numpy()]
-                if 'losses' in columns:  # for consequences
-                    df['loss'] = df['losses']
-                lbe_df = df[['event_id', 'loss']].sort_values(
-                    'loss',  ascending=False)
-                gb = df[['rup_id', 'loss']].groupby('rup_id')
-                rbr_df = gb.sum().sort_values('loss', ascending=False)
-                dstore.create_df('loss_by_rupture', rbr_df.reset_index())
-                dstore.create_df('loss_by_event', lbe_df)
+    # build loss_by_event and loss_by_rupture
+    if ('loss' in columns or 'losses' in columns) and rups:
+        df = rbe_df[(rbe_df.agg_id == K) & (rbe_df.loss_id == T)].copy()
+        if len(df):
+            df['rup_id'] = rup_id[df.event_id.to_numpy()]
+            if 'losses' in columns:  # for consequences
+                df['loss'] = df['losses']
+            lbe_df = df[['event_id', 'loss']].sort_values(
+                'loss',  ascending=False)
+            gb = df[['rup_id', 'loss']].groupby('rup_id')
+            rbr_df = gb.sum().sort_values('loss', ascending=False)
+            dstore.create_df('loss_by_rupture', rbr_df.reset_index())
+            dstore.create_df('loss_by_event', lbe_df)
     if oq.investigation_time and loss_cols:
         store_aggcurves(oq, agg_ids, rbe_df, builder, loss_cols, events,
                         num_events, dstore)
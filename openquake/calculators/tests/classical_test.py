@@ -19,17 +19,23 @@
 import os
 import sys
 import gzip
+import shutil
 import tempfile
+import unittest
+import functools
 import numpy
 from unittest import mock
-from openquake.baselib import parallel, general, config
+from openquake.baselib import parallel, general, config, hdf5
+from openquake.baselib.performance import Monitor
 from openquake.baselib.python3compat import decode
-from openquake.hazardlib import InvalidFile, nrml, calc
+from openquake.hazardlib import InvalidFile, nrml, calc, stats
+from openquake.hazardlib.map_array import rates_dt
 from openquake.hazardlib.source.rupture import get_ruptures
 from openquake.hazardlib.sourcewriter import write_source_model
 from openquake.calculators.views import view, text_table
 from openquake.calculators.export import export
 from openquake.calculators.extract import extract
+from openquake.calculators import classical, getters
 from openquake.calculators.tests import CalculatorTestCase
 from openquake.qa_tests_data.classical import (
     case_01, case_02, case_03, case_04, case_12, case_18, case_22, case_23,
@@ -829,3 +835,84 @@ class ClassicalTestCase(CalculatorTestCase):
             'hazard_curve-mean-SA(1.0).csv',
             'hazard_curve-mean-SA(2.0).csv'],
             case_87.__file__)
+
+
+class FakeOq:
+    imtls = general.DictArray({'PGA': [.01, .1, .2, .4],
+                               'SA(1.0)': [.01, .1, .2, .4]})
+    poes = [.1, .02]
+    use_rates = False
+
+
+def wget(weights, imt):
+    return weights[:, 0] if imt == 'PGA' else weights[:, 1]
+
+
+class PostClassicalTestCase(unittest.TestCase):
+    # check that the postclassical statistics computed on blocks of sites
+    # are identical to the ones computed site by site
+
+    def setUp(self):
+        rng = numpy.random.default_rng(42)
+        N, L, G = 50, FakeOq.imtls.size, 5
+        # two TRTs, the first with 2 gsims and the second with 3 gsims
+        self.trt_rlzs = [numpy.uint32([0, 1, 2]), numpy.uint32([3, 4, 5]),
+                         numpy.uint32([0, 3]), numpy.uint32([1, 4]),
+                         numpy.uint32([2, 5])]
+        self.R = 6
+        rates = numpy.zeros(N * L * G, rates_dt)
+        rates['sid'] = numpy.repeat(numpy.arange(N), L * G)
+        rates['lid'] = numpy.tile(numpy.repeat(numpy.arange(L), G), N)
+        rates['gid'] = numpy.tile(numpy.arange(G), N * L)
+        rates['rate'] = numpy.round(rng.random(N * L * G) * 1E-2, 4)
+        rates = rates[rates['sid'] % 7 != 3]  # some sites without hazard
+        self.tmp = tempfile.mkdtemp()
+        self.fname = os.path.join(self.tmp, 'rates.hdf5')
+        with hdf5.File(self.fname, 'w') as h5:
+            classical._store(rates, 1, h5)
+        self.hstats = {'mean': stats.mean_curve, 'std': stats.std_curve,
+                       'quantile-0.15': functools.partial(
+                           stats.quantile_curve, .15),
+                       'quantile-0.85': functools.partial(
+                           stats.quantile_curve, .85),
+                       'max': stats.max_curve}
+        weights = rng.random((self.R, 3))
+        self.weights = weights / weights.sum(axis=0)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def postclassical(self, weights):
+        oq = FakeOq()
+        pgetter = getters.MapGetter(
+            [self.fname], 0, self.trt_rlzs, self.R, oq)
+        pgetter.weights = weights
+        return classical.postclassical(
+            pgetter, wget, self.hstats, True, 0, None, Monitor())
+
+    def check(self, weights):
+        blocks = self.postclassical(weights)
+        with mock.patch.object(classical, 'MAX_BLOCK_MB', 1E-9):
+            sites = self.postclassical(weights)  # blocks of 1 site
+        self.assertEqual(sorted(blocks), sorted(sites))
+        for kind in blocks:
+            for pmap1, pmap2 in zip(blocks[kind], sites[kind]):
+                ae(pmap1.sids, pmap2.sids)
+                ae(pmap1.array, pmap2.array)
+
+        # compare with the statistics computed by build_stat_curve
+        pgetter = getters.MapGetter(
+            [self.fname], 0, self.trt_rlzs, self.R, FakeOq())
+        for idx, sid in enumerate(pgetter.sids):
+            hcurve = pgetter.get_hcurve(sid)
+            for s, stat in enumerate(self.hstats.values()):
+                curve = getters.build_stat_curve(
+                    hcurve, FakeOq.imtls, stat, weights, wget)
+                ae(blocks['hcurves-stats'][s].array[idx],
+                   numpy.float32(curve.reshape(2, 4)))
+
+    def test_constant_weights(self):
+        self.check(self.weights[:, 2:])
+
+    def test_imt_dependent_weights(self):
+        self.check(self.weights)
@@ -20,6 +20,7 @@ import sys
 from unittest import mock, SkipTest
 import numpy
 
+from openquake.baselib import config, parallel
 from openquake.baselib.general import gettemp
 from openquake.baselib.hdf5 import read_csv
 from openquake.baselib.writers import CsvWriter, FIVEDIGITS
@@ -128,7 +129,7 @@ agg_id
 
         aw = extract(self.calc.datastore, 'agg_losses/structural')
         self.assertEqual(aw.stats, ['mean'])
-        numpy.testing.assert_allclose(aw.array, [813.30096], atol=.001)
+        numpy.testing.assert_allclose(aw.array, [813.31274], atol=.001)
 
         fnames = export(('aggrisk', 'csv'), self.calc.datastore)
         for fname in fnames:
@@ -560,9 +561,28 @@ agg_id
         text = extract(self.calc.datastore, 'ruptures?threshold=.8').array
         nrups = text.count('\n') - 2
         losses = self.calc.datastore['loss_by_rupture/loss'][:]
-        aac(losses, [1356.609, 324.64624, 203.6374, 129.69826], rtol=6e-5)
+        aac(losses, [1213.2975, 292.37854, 231.58786, 130.7805], rtol=6e-5)
         self.assertEqual(nrups, 2)  # two ruptures >= 80% of the losses
 
+    def test_case_7a_gmf_in_scratch(self):
+        # GMFs stored by the tasks in the scratch directory
+        self.run_calc(case_7a.__file__,  'job_h.ini')
+        expected = self.calc.datastore.read_df('gmf_data')
+        with mock.patch.dict(config.performance, gmf_in_scratch='true'):
+            self.run_calc(case_7a.__file__,  'job_h.ini')
+        # the scratch files are copied in the datastore and removed
+        self.assertFalse(self.calc.datastore['gmf_data/sid'].is_virtual)
+        scratch = parallel.scratch_dir(self.calc.datastore.calc_id)
+        self.assertEqual([f for f in os.listdir(scratch)
+                          if f.startswith('gmf_')], [])
+        gmf_df = self.calc.datastore.read_df('gmf_data')
+        self.assertEqual(sorted(map(tuple, gmf_df.to_numpy())),
+                         sorted(map(tuple, expected.to_numpy())))
+        self.run_calc(case_7a.__file__,  'job_r.ini',
+                      hazard_calculation_id=str(self.calc.datastore.calc_id))
+        [fname] = export(('risk_by_event', 'csv'), self.calc.datastore)
+        self.assertEqualFiles('expected/agg_losses.csv', fname, delta=2E-3)
+
     def test_case_8(self):
         # loss_type-dependent taxonomy mapping
         out = self.run_calc(case_8.__file__,  'job.ini', exports='csv',
@@ -596,7 +616,8 @@ agg_id
             case_6c.__file__, 'job_eb.ini', exports='csv',
             hazard_calculation_id=str(self.calc.datastore.calc_id))
         _tot, fname = out['aggcurves', 'csv']
-        self.assertEqualFiles('expected/aggcurves_eb.csv', fname, delta=.02)
+        self.assertEqualFiles('expected/aggcurves_eb_hc.csv', fname,
+                              delta=.02)
 
     def test_recompute(self):
         # test recomputing aggregate loss curves with post_risk
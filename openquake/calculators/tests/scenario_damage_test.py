@@ -59,7 +59,7 @@ class ScenarioDamageTestCase(CalculatorTestCase):
         # for compatibility with the past
         dmg = extract(self.calc.datastore,
                       'agg_damages/structural?taxonomy=RC&CRESTA=01.1')
-        aac([[1482., 489., 29.]], dmg, atol=1E-4)
+        aac([[1477., 502., 21.]], dmg, atol=1E-4)
 
         # test no intersection
         dmg = extract(self.calc.datastore, 'agg_damages/structural?taxonomy=RM&CRESTA=01.1')
@@ -157,7 +157,7 @@ class ScenarioDamageTestCase(CalculatorTestCase):
             'risk_by_event', ['event_id', 'loss_id', 'agg_id'],
             dict(agg_id=K))
         self.assertEqual(len(df), 300)
-        self.assertEqual(len(df[df.dmg_1 > 0]), 72)  # only 72/300 are nonzero
+        self.assertEqual(len(df[df.dmg_1 > 0]), 76)  # only 76/300 are nonzero
 
     def test_case_8(self):
         # case with a shakemap
@@ -179,10 +179,10 @@ class ScenarioDamageTestCase(CalculatorTestCase):
         df = self.calc.datastore.read_df('risk_by_event', 'event_id',
                                          {'agg_id': K})
         dmg = df.loc[1937]  # damage caused by the event 1937
-        self.assertEqual(dmg.dmg_1.sum(), 133)
-        self.assertEqual(dmg.dmg_2.sum(), 84)
-        self.assertEqual(dmg.dmg_3.sum(), 21)
-        self.assertEqual(dmg.dmg_4.sum(), 22)
+        self.assertEqual(dmg.dmg_1.sum(), 128)
+        self.assertEqual(dmg.dmg_2.sum(), 80)
+        self.assertEqual(dmg.dmg_3.sum(), 26)
+        self.assertEqual(dmg.dmg_4.sum(), 14)
 
         [fname] = export(('aggrisk', 'csv'), self.calc.datastore)
         self.assertEqualFiles('expected/aggrisk.csv', fname, delta=1E-4)
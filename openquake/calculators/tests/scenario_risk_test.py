@@ -71,7 +71,7 @@ class ScenarioRiskTestCase(CalculatorTestCase):
 
         # test agglosses
         tot = extract(self.calc.datastore, 'agg_losses/occupants')
-        aac(tot.array, [0.033761], atol=2E-5)
+        aac(tot.array, [0.035889], atol=2E-5)
 
         # test agglosses with *
         tbl = extract(self.calc.datastore, 'agg_losses/occupants?taxonomy=*')
@@ -178,7 +178,7 @@ class ScenarioRiskTestCase(CalculatorTestCase):
         self.assertEqual(obj.selected, [b'state=*', b'cresta=0.11'])
         self.assertEqual(obj.tags, [b'state=01'])
         # from avg_losses-stats with two quantiles
-        aac(obj.array, [[2368.6128, 2280.863 , 2561.6628]], atol=.02)
+        aac(obj.array, [[2278.1416, 2224.831, 2395.4246]], atol=.02)
 
         # check portfolio_loss
         fname = gettemp(view('portfolio_loss', self.calc.datastore))
@@ -34,7 +34,8 @@ from openquake.baselib.general import (
     humansize, countby, AccumDict, CallableDict,
     get_array, group_array, fast_agg, sum_records)
 from openquake.baselib.hdf5 import FLOAT, INT, vstr
-from openquake.baselib.performance import performance_view, Monitor
+from openquake.baselib.performance import (
+    performance_view, get_task_sent, Monitor)
 from openquake.baselib.python3compat import encode, decode
 from openquake.hazardlib import logictree, calc, source, geo
 from openquake.hazardlib.valid import basename
@@ -401,7 +402,7 @@ def view_job_info(token, dstore):
     """
     data = []
     task_info = dstore['task_info'][()]
-    task_sent = ast.literal_eval(decode(dstore['task_sent'][()]))
+    task_sent = get_task_sent(dstore)
     for task, dic in task_sent.items():
         sent = sorted(dic.items(), key=operator.itemgetter(1), reverse=True)
         sent = ['%s=%s' % (k, humansize(v)) for k, v in sent[:3]]
@@ -1779,15 +1780,13 @@ def view_fastmean(token, dstore):
     oq = dstore['oqparam']
     ws = dstore['weights'][:]
     gweights =  dstore['gweights'][:]
-    slicedic = AccumDict(accum=[])
-    for idx, start, stop in dstore['_rates/slice_by_idx'][:]:
-        slicedic[idx].append((start, stop))
+    chunks = numpy.unique(dstore['_rates/slice_by_idx']['idx'])
     M = len(oq.imtls)
     L1 = oq.imtls.size // M
     array = numpy.zeros(L1, oq.imt_dt(F32))
-    for slices in slicedic.values():
-        pgetter = MapGetter(dstore.filename, gweights, len(ws), slices, oq)
-        pgetter.init()
+    for chunk in chunks:
+        pgetter = MapGetter([dstore.filename], chunk, numpy.zeros(len(gweights)),
+                            len(ws), oq)
         pmap = pgetter.get_fast_mean(gweights)
         for idx, sid in enumerate(pmap.sids):
             if sid == site_id:
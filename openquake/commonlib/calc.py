@@ -26,7 +26,7 @@ from openquake.baselib import performance, parallel, hdf5, general
 from openquake.hazardlib.source import rupture
 from openquake.hazardlib import map_array, geo
 from openquake.hazardlib.source.rupture import get_events
-from openquake.commonlib import util, readinput, datastore
+from openquake.commonlib import readinput, datastore
 
 TWO16 = 2 ** 16
 TWO24 = 2 ** 24
@@ -249,10 +249,16 @@ class RuptureImporter(object):
     def _save_events(self, rup_array, idx_start_stop):
         oq = self.oqparam
         # this is very fast compared to saving the ruptures
-        E = rup_array['n_occ'].sum()
-        events = numpy.zeros(E, rupture.events_dt)
-        # DRAMATIC! the event IDs will be overridden a few lines below,
-        # see the line events['id'] = numpy.arange(len(events))
+        n_occ = rup_array['n_occ']
+        E = n_occ.sum()
+        if E >= TWO32:
+            raise ValueError('There are more than %d events!' % E)
+        # the events of the ruptures in the slice start:stop are stored in
+        # events[offsets[start]:offsets[stop]]
+        offsets = numpy.zeros(len(n_occ) + 1, I64)
+        offsets[1:] = n_occ.cumsum()
+        events = numpy.zeros(E, rupture.events_dt.descr + [
+            ('year', U32), ('ses_id', U32)])
 
         # when computing the events all ruptures must be considered,
         # including the ones far away that will be discarded later on
@@ -265,41 +271,37 @@ class RuptureImporter(object):
             slc = slice(start, stop)
             proxies = get_proxies(filename, rup_array[slc])
             iterargs.append((proxies, slc, rlzs_by_gsim[trt_smr], i))
-        acc = general.AccumDict()  # ordinal -> eid_rlz
         if len(events) < 1E5:
-            for args in iterargs:
-                acc += self.get_eid_rlz(*args)
+            results = (self.get_eid_rlz(*args) for args in iterargs)
         else:
             self.datastore.swmr_on()  # before the Starmap
-            for res in parallel.Starmap(
-                    self.get_eid_rlz, iterargs,
-                    h5=self.datastore,
-                    progress=logging.debug):
-                acc += res
-        i = 0
-        for ordinal, eid_rlz in sorted(acc.items()):
-            for er in eid_rlz:
-                events[i] = er
-                i += 1
-                if i >= TWO32:
-                    raise ValueError('There are more than %d events!' % i)
+            results = parallel.Starmap(
+                self.get_eid_rlz, iterargs, h5=self.datastore,
+                progress=logging.debug)
+        for res in results:
+            # fill the events in place, in whatever order they arrive
+            for ordinal, eid_rlz in res.items():
+                _, start, stop = idx_start_stop[ordinal]
+                evs = events[offsets[start]:offsets[stop]]
+                for name in rupture.events_dt.names:
+                    evs[name] = eid_rlz[name]
 
         # sanity check
         numpy.testing.assert_equal(events['id'], numpy.arange(E))
 
-        # set event year and event ses starting from 1
+        # set event year and event ses starting from 1; the years are
+        # sampled in a single pass in the order of the realizations,
+        # consuming the random numbers exactly as a loop on them would do
         nses = oq.ses_per_logic_tree_path
-        extra = numpy.zeros(len(events), [('year', U32), ('ses_id', U32)])
-
         rng = numpy.random.default_rng(oq.ses_seed)
         if oq.investigation_time:
-            R = len(self.datastore['weights'])
             etime = int(oq.investigation_time * oq.ses_per_logic_tree_path)
-            for r in range(R):
-                ok, = numpy.where(events['rlz_id'] == r)
-                extra['year'][ok] = rng.choice(etime, len(ok)) + r * etime + 1
-        extra['ses_id'] = rng.choice(nses, len(events)) + 1
-        self.datastore['events'] = util.compose_arrays(events, extra)
+            rlz_id = events['rlz_id']
+            order = numpy.argsort(rlz_id, kind='stable')
+            events['year'][order] = (rng.choice(etime, E) +
+                                     rlz_id[order] * etime + 1)
+        events['ses_id'] = rng.choice(nses, E) + 1
+        self.datastore['events'] = events
 
     def check_overflow(self, E):
         """
@@ -126,6 +126,15 @@ gmf_max_gb:
   Example: *gmf_max_gb = 1.*
   Default: 0.1
 
+gmf_tile_size:
+  Used in event based calculations with large site collections. If positive,
+  the GMFs of each rupture are computed on tiles of at most the given number
+  of sites, to bound the memory. The intra-event epsilons are then generated
+  per (rupture, site, event), so that the GMFs do not depend on the tile size.
+  It is ignored for correlated, conditioned and amplified GMFs.
+  Example: *gmf_tile_size = 100_000*
+  Default: 0
+
 avg_losses:
   Used in risk calculations to compute average losses.
   Example: *avg_losses=false*.
@@ -172,6 +181,13 @@ compare_with_classical:
   Example: *compare_with_classical = true*.
   Default: False
 
+conditioned_gmf_rank:
+  Used in conditioned GMF calculations with many sites; if positive, the
+  covariance matrices for the target sites are approximated with a low-rank
+  plus diagonal decomposition of the given rank, to save memory.
+  Example: *conditioned_gmf_rank = 500*
+  Default: 0
+
 complex_fault_mesh_spacing:
   In km, used to discretize complex faults.
   Example: *complex_fault_mesh_spacing = 15*.
@@ -330,7 +346,10 @@ ground_motion_correlation_model:
   Default: None
 
 ground_motion_correlation_params:
-  To be used together with ground_motion_correlation_model.
+  To be used together with ground_motion_correlation_model. For JB2009
+  and HM2018 a "cutoff_distance" in km can be given, to use a
+  neighbour-limited approximation scaling to large numbers of sites,
+  together with a "max_neighbours" parameter (default 30).
   Example: *ground_motion_correlation_params = {"vs30_clustering": False}*.
   Default: empty dictionary
 
@@ -1010,6 +1029,7 @@ class OqParam(valid.ParamSet):
     coordinate_bin_width = valid.Param(valid.positivefloat, 100.)
     compare_with_classical = valid.Param(valid.boolean, False)
     concurrent_tasks = valid.Param(valid.positiveint, Starmap.CT)
+    conditioned_gmf_rank = valid.Param(valid.positiveint, 0)
     conditional_loss_poes = valid.Param(valid.probabilities, [])
     continuous_fragility_discretization = valid.Param(valid.positiveint, 20)
     countries = valid.Param(valid.namelist, ())
@@ -1036,6 +1056,7 @@ class OqParam(valid.ParamSet):
     exports = valid.Param(valid.export_formats, ())
     extreme_gmv = valid.Param(valid.floatdict, {'default': numpy.inf})
     gmf_max_gb = valid.Param(valid.positivefloat, .1)
+    gmf_tile_size = valid.Param(valid.positiveint, 0)
     ground_motion_correlation_model = valid.Param(
         valid.NoneOr(valid.Choice(*GROUND_MOTION_CORRELATION_MODELS)), None)
     ground_motion_correlation_params = valid.Param(valid.dictionary, {})
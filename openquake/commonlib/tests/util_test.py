@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright (C) 2025 GEM Foundation
+#
+# OpenQuake is free software: you can redistribute it and/or modify it
+# under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# OpenQuake is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with OpenQuake. If not, see <http://www.gnu.org/licenses/>.
+import unittest
+from unittest import mock
+import numpy
+from openquake.commonlib import util
+
+
+class ClosestToRefsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        rng = numpy.random.default_rng(42)
+        self.arrays = rng.uniform(size=(7, 5, 3))  # (N, R, L)
+        self.refs = self.arrays.mean(axis=1)  # (N, L)
+
+    def test_same_as_closest_to_ref(self):
+        for maxsize in (1, 4, 10, 50, 2**24):
+            got = util.closest_to_refs(self.arrays, self.refs,
+                                       maxsize=maxsize)
+            for n, arrays in enumerate(self.arrays):
+                exp = util.closest_to_ref(arrays, self.refs[n])
+                numpy.testing.assert_equal(got[n], exp)
+
+    def test_blocks(self):
+        # the temporary arrays must be bounded by maxsize for any N
+        sizes = []
+        log = util.log
+
+        def logsize(arr, cutoff):
+            sizes.append(arr.size)
+            return log(arr, cutoff)
+        with mock.patch.object(util, 'log', logsize):
+            util.closest_to_refs(self.arrays, self.refs, maxsize=10)
+        self.assertEqual(sizes[0], 7 * 3)  # the refs
+        self.assertLessEqual(max(sizes[1:]), 10)
+        self.assertEqual(sum(sizes[1:]), self.arrays.size)
+
+        sizes.clear()
+        with mock.patch.object(util, 'log', logsize):
+            util.closest_to_refs(self.arrays, self.refs, maxsize=30)
+        self.assertEqual(sizes[1:], [30, 30, 30, 15])  # 2 sites per block
@@ -144,6 +144,45 @@ def closest_to_ref(arrays, ref, cutoff=1E-12):
     return [idx for dist, idx in pairs]
 
 
+def closest_to_refs(arrays, refs, cutoff=1E-12, maxsize=2**24):
+    """
+    Vectorized version of :func:`closest_to_ref` for many references at
+    once: refs[n] is broadcast against arrays[n, r] exactly as the reference
+    in closest_to_ref, so that the result is the same.
+
+    :param arrays: an array of shape (N, R, L)
+    :param refs: an array of shape (N, L) or (N, L, 1)
+    :param cutoff: cutoff on the small values
+    :param maxsize: maximum number of differences computed at once
+    :returns: an array of shape (N, R) with the indices ordered by closeness
+
+    >>> c0 = numpy.array([.99, .97, .5, .1])
+    >>> c1 = numpy.array([.98, .96, .45, .09])
+    >>> mean = numpy.average([c0, c1], axis=0, weights=[0.4, 0.6])
+    >>> closest_to_refs(numpy.array([[c0, c1]]), numpy.array([mean]))
+    array([[1, 0]])
+    """
+    N, R, L = arrays.shape
+    logrefs = log(refs, cutoff)[:, None]  # shape (N, 1, L) or (N, 1, L, 1)
+    shape = (1,) * (logrefs.ndim - 3) + (L,)
+    axis = tuple(range(2, logrefs.ndim))
+    size = numpy.prod(numpy.broadcast_shapes((L,), refs.shape[1:]))
+    # split both on sites and realizations, so that each block of
+    # differences has at most maxsize elements (or a single site+rlz)
+    rstep = max(1, min(R, maxsize // size))  # realizations per block
+    nstep = max(1, maxsize // (size * rstep))  # sites per block
+    dists = numpy.zeros((N, R))
+    for n0 in range(0, N, nstep):
+        n1 = n0 + nstep
+        for r0 in range(0, R, rstep):
+            r1 = r0 + rstep
+            arr = numpy.ascontiguousarray(arrays[n0:n1, r0:r1])
+            diff = log(arr, cutoff).reshape(arr.shape[:2] + shape) - (
+                logrefs[n0:n1])
+            dists[n0:n1, r0:r1] = numpy.sqrt((diff * diff).sum(axis=axis))
+    return numpy.argsort(dists, axis=1, kind='stable')
+
+
 def compose_arrays(a1, a2, firstfield='etag'):
     """
     Compose composite arrays by generating an extended datatype containing
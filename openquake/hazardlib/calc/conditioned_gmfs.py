@@ -104,6 +104,13 @@ mu_Y_yD:
   conditioned mean of the ground motion at the target sites
 cov_Y_Y_yD:
   conditional covariance of the ground motion at the target sites
+
+When the parameter `conditioned_gmf_rank` is positive the N x N covariance
+matrices for the target sites are never built. The conditional covariance
+is approximated as U U^T + diag(d): the between-event part is exactly of
+low rank, while the within-event part is approximated with the Nystrom
+method on `conditioned_gmf_rank` target sites. The diagonal d restores the
+exact variances at each site.
 """
 
 import logging
@@ -112,6 +119,7 @@ from dataclasses import dataclass
 
 import numpy
 from openquake.baselib import parallel
+from openquake.baselib.general import gen_slices
 from openquake.hazardlib import correlation, cross_correlation
 from openquake.hazardlib.imt import from_string
 from openquake.hazardlib.calc.gmf import GmfComputer
@@ -220,7 +228,8 @@ class ConditionedGmfComputer(GmfComputer):
             self.station_sitecol, self.station_data,
             self.observed_imt_strs, self.sitecol, self.imts,
             self.spatial_correl, self.cross_correl_between, self.cross_correl_within,
-            sigma=False, h5=h5)
+            sigma=False, h5=h5,
+            rank=getattr(self.cmaker.oq, 'conditioned_gmf_rank', 0))
 
 
 @dataclass
@@ -235,7 +244,7 @@ class TempResult:
     native_data_available: bool
     corr_HD_HD: numpy.ndarray = 0
     cov_WD_WD_inv: numpy.ndarray = 0
-    phi_D_diag: numpy.ndarray = 0
+    phi_D: numpy.ndarray = 0
     T_D: numpy.ndarray = 0
     zeta_D: numpy.ndarray = 0
 
@@ -333,10 +342,11 @@ def create_result(g, m, target_imt, target_imts, observed_imts,
 
     # The raw residuals
     t.zeta_D = yD - mu_yD
-    t.phi_D_diag = numpy.diag(phi_D.flatten())
+    t.phi_D = phi_D.flatten()
 
     cov_WD_WD = compute_cov(station_sitecol, station_sitecol,
-                            t.conditioning_imts, t.conditioning_imts, t.phi_D_diag, t.phi_D_diag)
+                            t.conditioning_imts, t.conditioning_imts,
+                            t.phi_D, t.phi_D)
 
     # Add on the additional variance of the residuals
     # for the cases where the station data is uncertain
@@ -366,7 +376,7 @@ def create_result(g, m, target_imt, target_imts, observed_imts,
 
 def compute_spatial_cross_covariance_matrix(
         spatial_correl, cross_correl_within, sites1, sites2,
-        imts1, imts2, diag1, diag2):
+        imts1, imts2, std1, std2):
     # The correlation structure for IMs of differing types at differing
     # locations can be reasonably assumed as Markovian in nature, and we
     # assume here that the correlation between differing IMs at differing
@@ -383,7 +393,8 @@ def compute_spatial_cross_covariance_matrix(
         _compute_spatial_cross_correlation_matrix(
             distance_matrix, imt_1, imt_2, spatial_correl, cross_correl_within)
         for imt_2 in imts2] for imt_1 in imts1])
-    return numpy.linalg.multi_dot([diag1, rho, diag2])
+    # same as diag(std1) @ rho @ diag(std2), without the dense diagonals
+    return std1[:, None] * rho * std2
 
 
 # In scenario/case_21 one has
@@ -395,7 +406,8 @@ def compute_spatial_cross_covariance_matrix(
 # NB: this is run in parallel
 def get_mu_tau_phi(target_imt, gsim, mean_stds,
                    target_imts, observed_imts, station_data,
-                   target_sitecol, station_sitecol, compute_cov, r, monitor):
+                   target_sitecol, station_sitecol, compute_cov, rank, r,
+                   monitor):
     # Using Bayes rule, compute the posterior distribution of the
     # normalized between-event residual H|YD=yD, employing
     # Engler et al. (2022), eqns B8 and B9 (also B18 and B19),
@@ -426,15 +438,15 @@ def get_mu_tau_phi(target_imt, gsim, mean_stds,
 
     # Predicted uncertainty components at the target sites, from GSIM
     tau_Y = mean_stds[2, 0][:, None]
-    phi_Y_diag = numpy.diag(mean_stds[3, 0])
+    phi_Y = mean_stds[3, 0]
 
     # Compute the within-event covariance matrices for the
     # target sites and observation sites; the shapes are 
     # (nsites, nstations) and (nstations, nsites) respectively
     cov_WY_WD = compute_cov(target_sitecol, station_sitecol,
-                            [target_imt], r.conditioning_imts, phi_Y_diag, r.phi_D_diag)
+                            [target_imt], r.conditioning_imts, phi_Y, r.phi_D)
     cov_WD_WY = compute_cov(station_sitecol, target_sitecol,
-                            r.conditioning_imts, [target_imt], r.phi_D_diag, phi_Y_diag)
+                            r.conditioning_imts, [target_imt], r.phi_D, phi_Y)
 
     # Compute the regression coefficient matrix [cov_WY_WD × cov_WD_WD_inv]
     RC = cov_WY_WD @ r.cov_WD_WD_inv  # shape (nsites, nstations)
@@ -448,10 +460,24 @@ def get_mu_tau_phi(target_imt, gsim, mean_stds,
     # at the target sites; shape (nsites, 1)
     mu_Y_yD = mu_Y + tau_Y @ mu_HD_yD[0, None] + RC @ (r.zeta_D - mu_BD_yD)
 
+    # Compute the scaling matrix "C" for the conditioned between-event
+    # covariance matrix
+    if r.native_data_available:
+        C = tau_Y - RC @ r.T_D
+    else:
+        zeros = numpy.zeros((len(target_sitecol), len(r.conditioning_imts)))
+        C = numpy.block([tau_Y, zeros]) - RC @ r.T_D
+
+    if rank:  # low-rank plus diagonal approximation
+        U, d = get_low_rank_cov(
+            rank, target_sitecol, target_imt, phi_Y, compute_cov,
+            RC, cov_WD_WY, C, cov_HD_HD_yD)
+        return {(r.g, r.m): (mu_Y_yD, U, d[:, None], msg)}
+
     # Compute the within-event covariance matrix for the
     # target sites (apriori) (nsites, nsites)
     cov_WY_WY = compute_cov(target_sitecol, target_sitecol,
-                            [target_imt], [target_imt], phi_Y_diag, phi_Y_diag)
+                            [target_imt], [target_imt], phi_Y, phi_Y)
 
     # Both conditioned covariance matrices can contain extremely
     # small negative values due to limitations of floating point
@@ -461,29 +487,63 @@ def get_mu_tau_phi(target_imt, gsim, mean_stds,
     # for the target sites clipped to zero, shape (nsites, nsites)
     cov_WY_WY_wD = (cov_WY_WY - RC @ cov_WD_WY).clip(min=0)
 
-    # Compute the scaling matrix "C" for the conditioned between-event
-    # covariance matrix
-    if r.native_data_available:
-        C = tau_Y - RC @ r.T_D
-    else:
-        zeros = numpy.zeros((len(target_sitecol), len(r.conditioning_imts)))
-        C = numpy.block([tau_Y, zeros]) - RC @ r.T_D
-
     # Compute the conditioned between-event covariance matrix
     # for the target sites clipped to zero, shape (nsites, nsites)
     cov_BY_BY_yD = numpy.linalg.multi_dot([C, cov_HD_HD_yD, C.T]).clip(min=0)
     return {(r.g, r.m): (mu_Y_yD, cov_WY_WY_wD, cov_BY_BY_yD, msg)}
 
 
+def get_low_rank_cov(rank, target_sitecol, target_imt, phi_Y, compute_cov,
+                     RC, cov_WD_WY, C, cov_HD_HD_yD, blocksize=1000):
+    """
+    Approximate the conditioned covariance matrix for the target sites
+    (within-event plus between-event) as U @ U.T + diag(d), without
+    building any N x N matrix.
+
+    :returns: a matrix U of shape (N, K) with K <= rank + len(cov_HD_HD_yD)
+              and a vector d of N non-negative values
+    """
+    N = len(target_sitecol)
+    # the between-event part C cov_HD_HD_yD C^T has exactly low rank
+    evals, evecs = numpy.linalg.eigh(cov_HD_HD_yD)
+    U_B = C @ (evecs * numpy.sqrt(evals.clip(min=0)))
+
+    # Nystrom approximation of the within-event part, using the
+    # columns of the conditioned covariance on `rank` target sites
+    idxs = numpy.unique(numpy.linspace(0, N - 1, min(rank, N)).astype(int))
+    inducing = target_sitecol.filtered(idxs)
+    cov_I = compute_cov(target_sitecol, inducing, [target_imt], [target_imt],
+                        phi_Y, phi_Y[idxs]) - RC @ cov_WD_WY[:, idxs]
+    evals, evecs = numpy.linalg.eigh(cov_I[idxs])
+    ok = evals > evals.max() * 1E-10
+    U_W = cov_I @ (evecs[:, ok] / numpy.sqrt(evals[ok]))
+
+    # the exact diagonal of the conditioned within-event covariance,
+    # computed by blocks of sites
+    diag = numpy.zeros(N)
+    for slc in gen_slices(0, N, blocksize):
+        sites = target_sitecol.filtered(numpy.arange(slc.start, slc.stop))
+        diag[slc] = compute_cov(sites, sites, [target_imt], [target_imt],
+                                phi_Y[slc], phi_Y[slc]).diagonal()
+    diag -= (RC * cov_WD_WY.T).sum(axis=1)
+    d = (diag.clip(min=0) - (U_W ** 2).sum(axis=1)).clip(min=0)
+    return numpy.hstack([U_W, U_B]), d
+
+
 def get_me_ta_ph(cmaker, sdata, observed_imts, target_imts,
                  mean_stds_D, mean_stds_Y, target, station_filtered,
-                 compute_cov, cross_correl_between, h5):
+                 compute_cov, cross_correl_between, h5, rank=0):
     G = len(cmaker.gsims)
     M = len(target_imts)
     N = mean_stds_Y.shape[-1]
     me = numpy.zeros((G, M, N, 1))
-    ta = numpy.zeros((G, M, N, N))
-    ph = numpy.zeros((G, M, N, N))
+    if rank:  # U and d, see get_low_rank_cov
+        # at most 2 conditioning IMTs, so at most 3 between-event columns
+        ta = numpy.zeros((G, M, N, rank + 3))
+        ph = numpy.zeros((G, M, N, 1))
+    else:
+        ta = numpy.zeros((G, M, N, N))
+        ph = numpy.zeros((G, M, N, N))
     smap = parallel.Starmap(get_mu_tau_phi, h5=h5)
     for g, gsim in enumerate(cmaker.gsims):
         if gsim.DEFINED_FOR_STANDARD_DEVIATION_TYPES == {StdDev.TOTAL}:
@@ -507,10 +567,10 @@ def get_me_ta_ph(cmaker, sdata, observed_imts, target_imts,
                 compute_cov, cross_correl_between)
             smap.submit(
                 (target_imt, gsim, mean_stds_Y[:, g], target_imts, observed_imts,
-                 sdata, target, station_filtered, compute_cov, result))
+                 sdata, target, station_filtered, compute_cov, rank, result))
     for (g, m), (mu, tau, phi, msg) in smap.reduce().items():
         me[g, m] = mu
-        ta[g, m] = tau
+        ta[g, m, :, :tau.shape[1]] = tau
         ph[g, m] = phi
         logging.info(msg)
     return me, ta, ph
@@ -520,9 +580,11 @@ def get_me_ta_ph(cmaker, sdata, observed_imts, target_imts,
 def get_mean_covs(
         rupture, cmaker, station_sitecol, station_data, observed_imt_strs,
         target_sitecol, target_imts, spatial_correl, cross_correl_between,
-        cross_correl_within, sigma=True, h5=None):
+        cross_correl_within, sigma=True, h5=None, rank=0):
     """
-    :returns: a list of arrays [mea, sig, tau, phi] or [mea, tau, phi]
+    :returns: a list of arrays [mea, sig, tau, phi] or [mea, tau, phi];
+              if rank is positive, tau and phi are replaced by the arrays
+              U and d returned by :func:`get_low_rank_cov`
     """
     if hasattr(rupture, 'rupture'):
         rupture = rupture.rupture
@@ -561,8 +623,10 @@ def get_mean_covs(
     me, ta, ph = get_me_ta_ph(
         cmaker, station_data[mask].copy(), observed_imts, target_imts,
         mean_stds_D, mean_stds_Y, target, station_filtered,
-        compute_cov, cross_correl_between, h5)
-    if sigma:
+        compute_cov, cross_correl_between, h5, rank)
+    if rank:
+        return [me, ta, ph]
+    elif sigma:
         return [me, ta + ph, ta, ph]
     else:
         # save memory since sigma = tau + phi is not needed
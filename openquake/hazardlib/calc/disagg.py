@@ -24,13 +24,12 @@ extracting a specific PMF from the result of :func:`disaggregation`.
 
 import operator
 import collections
-import itertools
 from functools import lru_cache
 import numpy
 import scipy.stats
 
 from openquake.baselib.general import AccumDict, groupby, humansize
-from openquake.baselib.performance import idx_start_stop, Monitor
+from openquake.baselib.performance import idx_start_stop, Monitor, compile
 from openquake.baselib.python3compat import decode
 from openquake.hazardlib.imt import from_string
 from openquake.hazardlib.calc import filters
@@ -197,60 +196,117 @@ def _disaggregate(ctx, mea, std, cmaker, g, iml2, bin_edges, epsstar, gp,
     # cmaker: a ContextMaker instance
     # g: a gsim index
     # iml2: an array of shape (M, P) of logarithmic intensities
-    # eps_bands: an array of E elements obtained from the E+1 eps_edges
     # bin_edges: a tuple of 5 bin edges (mag, dist, lon, lat, eps)
     # epsstar: a boolean. When True, disaggregation contains eps* results
     # gp: group_probability relevant for mutex sources, otherwise 1
-    # returns a 7D-array of shape (D, Lo, La, E, M, P, Z)
-
+    # returns a 6D-array of shape (D, Lo, La, E, M, P)
+    time_span = cmaker.investigation_time
+    if not infer_occur_rates and any(len(po) for po in ctx.probs_occur):
+        # slow lane, case_65
+        with mon1:
+            poes = _disagg_poes(ctx, mea, std, cmaker, g, iml2,
+                                bin_edges[-1], epsstar, gp)
+        with mon2:
+            pnes = numpy.ones_like(poes)
+            for u, rec in enumerate(ctx):
+                pnes[u] *= get_pnes(rec.occurrence_rate, rec.probs_occur,
+                                    poes[u], time_span)
+        with mon3:
+            bindata = BinData(ctx.rrup, ctx.clon, ctx.clat, pnes)
+            return _build_disagg_matrix(bindata, bin_edges[1:])
+
+    # poissonian, fast lane: the (U, E, M, P) arrays of PoEs and PNEs are
+    # never built; for each rupture and (m, p) pair the PoE is a band PoE
+    # for the epsilon bins above lvl, a partial PoE for the bin containing
+    # lvl and zero for the bins below lvl
     with mon1:
         eps_edges = tuple(bin_edges[-1])  # last edge
         min_eps, max_eps, eps_bands, cum_bands = get_eps4(
             eps_edges, cmaker.truncation_level)
         U, E = len(ctx), len(eps_bands)
         M, P = iml2.shape
-        phi_b = cmaker.phi_b
         # U - Number of contexts (i.e. ruptures if there is a single site)
         # E - Number of epsilons
         # M - Number of IMTs
         # P - Number of PoEs
-        # G - Number of gsims
-        poes = numpy.zeros((U, E, M, P))
-        pnes = numpy.ones((U, E, M, P))
-
-        # disaggregate by epsilon
-        for (m, p), iml in numpy.ndenumerate(iml2):
-            if iml == -numpy.inf:  # zero hazard
-                continue
-            lvls = (iml - mea[g, m]) / std[g, m]
-            # Find the index in the epsilons-bins vector where lvls (which are
-            # epsilons) should be included
-            idxs = numpy.searchsorted(eps_edges, lvls)
-            # Split the epsilons into parts (one for each bin larger than lvls)
-            if epsstar:
-                ok = (lvls >= min_eps) & (lvls < max_eps)
-                # The leftmost indexes are ruptures and epsilons
-                poes[ok, idxs[ok] - 1, m, p] = gp*truncnorm_sf(phi_b, lvls[ok])
-            else:
-                poes[:, :, m, p] = gp * _disagg_eps(
-                    truncnorm_sf(phi_b, lvls), idxs, eps_bands, cum_bands)
+        # epsilons, epsilon bins and PoEs inside the bins, shape (M, P, U)
+        lvls = (iml2[:, :, None] - mea[g][:, None]) / std[g][:, None]
+        bins = numpy.searchsorted(eps_edges, lvls)
+        sf = truncnorm_sf(cmaker.phi_b, lvls.reshape(M * P, U)).reshape(
+            lvls.shape)
+        ok = numpy.zeros(lvls.shape, bool)
+        ok[iml2 != -numpy.inf] = True  # skip zero hazard
+        if epsstar:
+            ok &= (lvls >= min_eps) & (lvls < max_eps)
+            poes_in = gp * sf
+        else:
+            poes_in = gp * (sf - cum_bands[numpy.minimum(bins, E)])
 
     with mon2:
-        time_span = cmaker.investigation_time
-        if not infer_occur_rates and any(len(po) for po in ctx.probs_occur):
-            # slow lane, case_65
-            for u, rec in enumerate(ctx):
-                pnes[u] *= get_pnes(rec.occurrence_rate, rec.probs_occur,
-                                    poes[u], time_span)
-        else:
-            # poissonian, fast lane
-            for e, m, p in itertools.product(range(E), range(M), range(P)):
-                pnes[:, e, m, p] *= numpy.exp(
-                    -ctx.occurrence_rate * poes[:, e, m, p] * time_span)
+        rates = ctx.occurrence_rate
+        pnes_band = numpy.exp(-rates[:, None] * (gp * eps_bands) * time_span)
+        pnes_in = numpy.exp(-rates * poes_in * time_span)
 
     with mon3:
-        bindata = BinData(ctx.rrup, ctx.clon, ctx.clat, pnes)
-        return _build_disagg_matrix(bindata, bin_edges[1:])
+        dists_idx, lons_idx, lats_idx, shape = _bin_idxs(
+            ctx.rrup, ctx.clon, ctx.clat, bin_edges[1:])
+        mat6D = numpy.ones(shape + [M, P])
+        _update_mat6D(mat6D, dists_idx, lons_idx, lats_idx, bins, ok,
+                      pnes_band, pnes_in, epsstar)
+        return 1. - mat6D
+
+
+@compile("(float64[:, :, :, :, :, :], int64[:], int64[:], int64[:],"
+         "int64[:, :, :], boolean[:, :, :], float64[:, :], float64[:, :, :],"
+         "boolean)")
+def _update_mat6D(mat6D, dists_idx, lons_idx, lats_idx, bins, ok,
+                  pnes_band, pnes_in, epsstar):
+    # multiply the disaggregation matrix by the PNEs of each rupture
+    M, P, U = bins.shape
+    E = pnes_band.shape[1]
+    for u in range(U):
+        mat = mat6D[dists_idx[u], lons_idx[u], lats_idx[u]]  # shape E, M, P
+        for m in range(M):
+            for p in range(P):
+                if not ok[m, p, u]:
+                    continue
+                b = bins[m, p, u]
+                if epsstar:  # NB: b = 0 means the last bin, as in numpy
+                    mat[b - 1, m, p] *= pnes_in[m, p, u]
+                    continue
+                for e in range(b, E):
+                    mat[e, m, p] *= pnes_band[u, e]
+                if 1 <= b <= E:
+                    mat[b - 1, m, p] *= pnes_in[m, p, u]
+
+
+def _disagg_poes(ctx, mea, std, cmaker, g, iml2, eps_edges, epsstar, gp):
+    # returns the PoEs of shape (U, E, M, P)
+    eps_edges = tuple(eps_edges)
+    min_eps, max_eps, eps_bands, cum_bands = get_eps4(
+        eps_edges, cmaker.truncation_level)
+    U, E = len(ctx), len(eps_bands)
+    M, P = iml2.shape
+    phi_b = cmaker.phi_b
+    poes = numpy.zeros((U, E, M, P))
+
+    # disaggregate by epsilon
+    for (m, p), iml in numpy.ndenumerate(iml2):
+        if iml == -numpy.inf:  # zero hazard
+            continue
+        lvls = (iml - mea[g, m]) / std[g, m]
+        # Find the index in the epsilons-bins vector where lvls (which are
+        # epsilons) should be included
+        idxs = numpy.searchsorted(eps_edges, lvls)
+        # Split the epsilons into parts (one for each bin larger than lvls)
+        if epsstar:
+            ok = (lvls >= min_eps) & (lvls < max_eps)
+            # The leftmost indexes are ruptures and epsilons
+            poes[ok, idxs[ok] - 1, m, p] = gp*truncnorm_sf(phi_b, lvls[ok])
+        else:
+            poes[:, :, m, p] = gp * _disagg_eps(
+                truncnorm_sf(phi_b, lvls), idxs, eps_bands, cum_bands)
+    return poes
 
 
 def _disagg_eps(survival, bins, eps_bands, cum_bands):
@@ -264,14 +320,8 @@ def _disagg_eps(survival, bins, eps_bands, cum_bands):
     return res  # shape (U, E)
 
 
-# this is fast
-def _build_disagg_matrix(bdata, bins):
-    """
-    :param bdata: a dictionary of probabilities of no exceedence
-    :param bins: bin edges
-    :returns:
-        a 7D-matrix of shape (#distbins, #lonbins, #latbins, #epsbins, M, P, Z)
-    """
+def _bin_idxs(dists, lons, lats, bins):
+    # returns the bin indexes of the ruptures and the shape (D, Lo, La, E)
     dist_bins, lon_bins, lat_bins, _eps_bins = bins
     dim1, dim2, dim3, _dim4 = shape = [len(b) - 1 for b in bins]
 
@@ -281,9 +331,9 @@ def _build_disagg_matrix(bdata, bins):
     # the 'international date line' issue
     # the 'minus 1' is needed because the digitize method returns the
     # index of the upper bound of the bin
-    dists_idx = numpy.digitize(bdata.dists, dist_bins) - 1
-    lons_idx = _digitize_lons(bdata.lons, lon_bins)
-    lats_idx = numpy.digitize(bdata.lats, lat_bins) - 1
+    dists_idx = numpy.digitize(dists, dist_bins) - 1
+    lons_idx = _digitize_lons(lons, lon_bins)
+    lats_idx = numpy.digitize(lats, lat_bins) - 1
 
     # because of the way numpy.digitize works, values equal to the last bin
     # edge are associated to an index equal to len(bins) which is not a
@@ -292,6 +342,19 @@ def _build_disagg_matrix(bdata, bins):
     dists_idx[dists_idx == dim1] = dim1 - 1
     lons_idx[lons_idx == dim2] = dim2 - 1
     lats_idx[lats_idx == dim3] = dim3 - 1
+    return dists_idx, lons_idx, lats_idx, shape
+
+
+# this is fast
+def _build_disagg_matrix(bdata, bins):
+    """
+    :param bdata: a dictionary of probabilities of no exceedence
+    :param bins: bin edges
+    :returns:
+        a 6D-matrix of shape (#distbins, #lonbins, #latbins, #epsbins, M, P)
+    """
+    dists_idx, lons_idx, lats_idx, shape = _bin_idxs(
+        bdata.dists, bdata.lons, bdata.lats, bins)
     _U, _E, M, P = bdata.pnes.shape
     mat6D = numpy.ones(shape + [M, P])
     for i_dist, i_lon, i_lat, pne in zip(
@@ -350,8 +350,8 @@ class SourceFilter(object):
     """
     Filter objects have a .filter method yielding filtered sources
     and the IDs of the sites within the given maximum distance.
-    Filter the sources by using `self.sitecol.within_bbox` which is
-    based on numpy.
+    Filter the sources by using `self.sitecol.within_bbox`, which is
+    based on a spatial index cached on the site collection.
     """
     def __init__(self, sitecol, integration_distance=default):
         self.sitecol = sitecol
@@ -453,11 +453,32 @@ class SourceFilter(object):
                 return self.sitecol.sids
             return self.sitecol.within_bbox(bbox)
 
+    def get_nsites(self, rup_array):
+        """
+        Vectorized version of `len(self.close_sids(rec, trt))`; the
+        integration distance must be the one of the tectonic region type
+        of the ruptures.
+
+        :param rup_array: an array of rupture records
+        :returns: an array with the number of close sites for each record
+        """
+        assert self.sitecol is not None
+        if not self.integration_distance:  # do not filter
+            return numpy.full(len(rup_array), len(self.sitecol))
+        dlon = get_longitudinal_extent(
+            rup_array['minlon'], rup_array['maxlon']) / 2.
+        dlat = (rup_array['maxlat'] - rup_array['minlat']) / 2.
+        dist = self.integration_distance(rup_array['mag']) + numpy.sqrt(
+            dlon**2 + dlat**2) / KM_TO_DEGREES
+        dist += 10  # the same buffer used in close_sids
+        lon, lat, dep = rup_array['hypo'].T
+        xyz = spherical_to_cartesian(lon, lat, dep)
+        return self.sitecol.kdtree.query_ball_point(
+            xyz, dist, eps=.001, return_length=True)
+
     def _close_sids(self, lon, lat, dep, dist):
-        if not hasattr(self, 'kdt'):
-            self.kdt = KDTree(self.sitecol.xyz)
         xyz = spherical_to_cartesian(lon, lat, dep)
-        sids = U32(self.kdt.query_ball_point(xyz, dist, eps=.001))
+        sids = U32(self.sitecol.kdtree.query_ball_point(xyz, dist, eps=.001))
         sids.sort()  # for cross-platform consistency
         return sids
 
@@ -23,7 +23,7 @@ Module :mod:`~openquake.hazardlib.calc.gmf` exports
 import numpy
 import pandas
 
-from openquake.baselib.general import AccumDict
+from openquake.baselib.general import gen_slices
 from openquake.baselib.performance import Monitor, compile
 from openquake.hazardlib.const import StdDev
 from openquake.hazardlib.source.rupture import EBRupture, get_eid_rlz
@@ -34,6 +34,7 @@ from openquake.hazardlib.imt import from_string
 U8 = numpy.uint8
 U16 = numpy.uint16
 U32 = numpy.uint32
+U64 = numpy.uint64
 I64 = numpy.int64
 F32 = numpy.float32
 
@@ -87,18 +88,150 @@ def set_max_min(array, mean, max_iml, min_iml, mmi_index):
                 array[n, :, e] = 0
 
 
-@compile("(uint32[:],uint32[:],uint32[:],uint32[:])")
-def build_eid_sid_rlz(allrlzs, sids, eids, rlzs):
-    eid_sid_rlz = numpy.zeros((3, len(sids) * len(eids)), U32)
-    idx = 0
-    for rlz in allrlzs:
-        for eid in eids[rlzs == rlz]:
-            for sid in sids:
-                eid_sid_rlz[0, idx] = eid
-                eid_sid_rlz[1, idx] = sid
-                eid_sid_rlz[2, idx] = rlz
-                idx += 1
-    return eid_sid_rlz
+@compile("int64(float32[:,:,:],float32[:,:,:],boolean[:,:],uint32[:],"
+         "uint32[:],uint32[:],float32[:,:],float32[:,:],uint32[:,:],int64)")
+def _fill_gmfs(sec, gmv, ok, eids, sids, rlzs, out_sec, out_gmv, out_esr,
+               start):
+    # copy the nonzero rows of the arrays sec (S, E, N) and gmv (M, N, E)
+    # in the output arrays, starting from the row `start`
+    S = len(sec)
+    M, N, E = gmv.shape
+    i = start
+    for e in range(E):
+        for n in range(N):
+            if ok[n, e]:
+                for s in range(S):
+                    out_sec[s, i] = sec[s, e, n]
+                for m in range(M):
+                    out_gmv[m, i] = gmv[m, n, e]
+                out_esr[0, i] = eids[e]
+                out_esr[1, i] = sids[n]
+                out_esr[2, i] = rlzs[e]
+                i += 1
+    return i
+
+
+def sample_eps(distribution, N, E, rng, blocksize=100_000):
+    """
+    Equivalent to distribution.rvs((N, E), rng), since scipy samples the
+    truncated normal distribution by inverting the CDF, but working on
+    blocks of sites to avoid the large temporary arrays of the PPF.
+
+    >>> from scipy import stats
+    >>> dist = stats.truncnorm(-3., 3.)
+    >>> expected = dist.rvs((5, 3), numpy.random.default_rng(42))
+    >>> eps = sample_eps(dist, 5, 3, numpy.random.default_rng(42), 6)
+    >>> (eps == expected).all()
+    True
+    """
+    eps = numpy.empty((N, E))
+    step = max(blocksize // E, 1)
+    for start in range(0, N, step):
+        stop = min(start + step, N)
+        eps[start:stop] = distribution.rvs((stop - start, E), rng)
+    return eps
+
+
+def _mix64(x):
+    # splitmix64 finalizer, wrapping around on arrays of uint64
+    x = (x ^ (x >> U64(30))) * U64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> U64(27))) * U64(0x94D049BB133111EB)
+    return x ^ (x >> U64(31))
+
+
+def site_eps(distribution, seed, m, sids, eids, blocksize=100_000):
+    """
+    Sample a matrix of epsilons of shape (N, E) by hashing the rupture seed,
+    the IMT index, the site IDs and the event IDs. The epsilons of a site
+    do not depend on the other sites, so that the GMFs computed by tiles
+    do not depend on the tiling:
+
+    >>> from scipy import stats
+    >>> dist = stats.truncnorm(-3., 3.)
+    >>> eps = site_eps(dist, 42, 0, U32([1, 2, 3]), U32([10, 11]))
+    >>> eps.shape
+    (3, 2)
+    >>> (site_eps(dist, 42, 0, U32([3]), U32([10, 11])) == eps[2]).all()
+    True
+    """
+    golden = U64(0x9E3779B97F4A7C15)
+    key = _mix64(numpy.array([seed, m + 1], I64).view(U64) * golden)
+    hsites = _mix64((numpy.asarray(sids, U64) + key[0]) * golden)
+    hevents = _mix64((numpy.asarray(eids, U64) + key[1]) * golden)
+    N, E = len(hsites), len(hevents)
+    eps = numpy.empty((N, E))
+    step = max(blocksize // E, 1)
+    for start in range(0, N, step):
+        stop = min(start + step, N)
+        bits = _mix64(hsites[start:stop, None] ^ hevents) >> U64(11)
+        eps[start:stop] = distribution.ppf((bits + .5) * 2. ** -53)
+    return eps
+
+
+class GmfBuffer(object):
+    """
+    A growing arena storing the nonzero ground motion values as the
+    columns <sec_outputs>, <gmv_fields>, eid, sid, rlz. It is filled in place
+    by :meth:`GmfComputer.compute_into` and can be reused across ruptures,
+    so that no intermediate DataFrames are needed:
+
+    >>> buf = GmfBuffer(['PGA', 'SA(1.0)'], size=2)
+    >>> buf.reserve(3)
+    >>> len(buf), buf.capacity
+    (0, 4)
+    >>> list(buf.to_dict())
+    ['PGA', 'SA(1.0)', 'eid', 'sid', 'rlz']
+    """
+    def __init__(self, gmv_fields, sec_outputs=(), size=1024):
+        self.gmv_fields = list(gmv_fields)
+        self.sec_outputs = list(sec_outputs)
+        self.sec = numpy.zeros((len(self.sec_outputs), size), F32)
+        self.gmv = numpy.zeros((len(self.gmv_fields), size), F32)
+        self.eid_sid_rlz = numpy.zeros((3, size), U32)
+        self.size = 0
+
+    @property
+    def capacity(self):
+        """
+        Number of rows that can be stored without reallocating
+        """
+        return self.gmv.shape[1]
+
+    def reserve(self, n):
+        """
+        Make room for n more rows, at least doubling the capacity if needed
+        """
+        needed = self.size + n
+        if needed <= self.capacity:
+            return
+        capacity = max(needed, 2 * self.capacity)
+        for name in ('sec', 'gmv', 'eid_sid_rlz'):
+            old = getattr(self, name)
+            new = numpy.zeros((len(old), capacity), old.dtype)
+            new[:, :self.size] = old[:, :self.size]
+            setattr(self, name, new)
+
+    def __len__(self):
+        return self.size
+
+    def to_dict(self):
+        """
+        :returns: a dictionary column -> array of length .size (no copies)
+        """
+        dic = {}
+        for s, out in enumerate(self.sec_outputs):
+            dic[out] = self.sec[s, :self.size]
+        for m, gmv_field in enumerate(self.gmv_fields):
+            dic[gmv_field] = self.gmv[m, :self.size]
+        for i, col in enumerate(['eid', 'sid', 'rlz']):
+            dic[col] = self.eid_sid_rlz[i, :self.size]
+        return dic
+
+    def to_df(self):
+        """
+        :returns: a DataFrame with the stored GMVs
+        """
+        return pandas.DataFrame(self.to_dict())
 
 
 def calc_gmf_simplified(ebrupture, sitecol, cmaker):
@@ -230,6 +363,10 @@ class GmfComputer(object):
         self.N = len(self.ctx)
         if correlation_model:  # store the filtered sitecol
             self.sites = sitecol.complete.filtered(self.ctx.sids)
+        # correlated fields cannot be split in tiles of sites, nor the
+        # amplified fields, since the amplification noise is per rupture
+        self.tile_size = (0 if correlation_model or amplifier
+                          else cmaker.oq.gmf_tile_size)
         self.cross_correl = cross_correl or NoCrossCorrelation(
             cmaker.truncation_level)
         self.mea_tau_phi = []
@@ -264,119 +401,163 @@ class GmfComputer(object):
             sig_eps[f'eps_inter_{imt}'] = self.eps[:, m]
         return sig_eps
 
-    def update(self, data, array, rlzs, mean, max_iml=None):
-        """
-        Updates the data dictionary with the values coming from the array
-        of GMVs. Also indirectly updates the arrays .sig and .eps.
-        """
-        min_iml = self.cmaker.min_iml
-        mag = self.ebrupture.rupture.mag
-        if len(mean.shape) == 3:  # shape (M, N, 1) for conditioned gmfs
-            mean = mean[:, :, 0]
-        if max_iml is None:
-            max_iml = numpy.full(self.M, numpy.inf, float)
-
-        set_max_min(array, mean, max_iml, min_iml, self.mmi_index)
-        data['gmv'].append(array)
-
-        if self.sec_perils:
-            n = 0
-            for rlz in rlzs:
-                eids = self.eid[self.rlz == rlz]
-                E = len(eids)
-                for e, eid in enumerate(eids):
-                    gmfa = array[:, :, n + e].T  # shape (M, N)
-                    for sp in self.sec_perils:
-                        o = sp.compute(mag, zip(self.imts, gmfa), self.ctx)
-                        for outkey, outarr in zip(sp.outputs, o):
-                            data[outkey].append(outarr)
-                n += E
-
-    def strip_zeros(self, data):
+    def new_buffer(self, size=1024):
         """
-        :returns: a DataFrame with the nonzero GMVs
+        :returns: an empty :class:`GmfBuffer` suitable for this computer
         """
-        # building an array of shape (3, NE)
-        eid_sid_rlz = build_eid_sid_rlz(
-            self.rlzs, self.ctx.sids, self.eid, self.rlz)
-
-        for key, val in sorted(data.items()):
-            data[key] = numpy.concatenate(data[key], axis=-1, dtype=F32)
-        gmv = data.pop('gmv')  # shape (N, M, E)
-        ok = gmv.sum(axis=1).T.reshape(-1) > 0
-        for m, gmv_field in enumerate(self.gmv_fields):
-            data[gmv_field] = gmv[:, m].T.reshape(-1)
-
-        # build dataframe
-        df = pandas.DataFrame(data)
-        df['eid'] = eid_sid_rlz[0]
-        df['sid'] = eid_sid_rlz[1]
-        df['rlz'] = eid_sid_rlz[2]
-
-        # remove the rows with all zero values
-        return df[ok]
+        return GmfBuffer(self.gmv_fields,
+                         [out for sp in self.sec_perils for out in sp.outputs],
+                         size)
 
     def compute_all(self, mean_stds=None, max_iml=None,
                     mmon=Monitor(), cmon=Monitor(), umon=Monitor()):
         """
         :returns: DataFrame with fields eid, rlz, sid, gmv_X, ...
         """
-        conditioned = mean_stds is not None
+        buf = self.new_buffer(0)
+        self.compute_into(buf, mean_stds, max_iml, mmon, cmon, umon)
+        return buf.to_df()
+
+    def compute_into(self, buf, mean_stds=None, max_iml=None,
+                     mmon=Monitor(), cmon=Monitor(), umon=Monitor()):
+        """
+        Append the nonzero GMVs to the given :class:`GmfBuffer`,
+        without building intermediate DataFrames. Also sets the
+        arrays .sig and .eps. If .tile_size is positive the sites are
+        processed in tiles of that size, to bound the memory.
+
+        :param mean_stds:
+            None, an array of shape (4, G, M, N) as returned by
+            :func:`get_mean_stds_batch` or a triple (mea, tau, phi)
+            for conditioned GMFs
+        :returns: the number of rows added to the buffer
+        """
+        conditioned = mean_stds is not None and len(mean_stds) == 3
+        tiled = self.tile_size and not conditioned
         self.init_eid_rlz_sig_eps()
         rng = numpy.random.default_rng(self.seed)
-        data = AccumDict(accum=[])
+        start = len(buf)
+        ctx = self.ctx
+        if tiled:
+            slices = list(gen_slices(0, self.N, self.tile_size))
+        else:
+            slices = [slice(None)]
         for g, (gs, rlzs) in enumerate(self.cmaker.gsims.items()):
             gs.gid = self.cmaker.gid[g]
             idxs, = numpy.where(numpy.isin(self.rlz, rlzs))
             E = len(idxs)
             if E == 0:  # crucial for performance
                 continue
-            if mean_stds is None:
-                with mmon:
-                    ms = self.cmaker.get_4MN([self.ctx], gs)
-            else:  # conditioned
-                ms = (mean_stds[0][g], mean_stds[1][g], mean_stds[2][g])
-            with cmon:
-                E = len(idxs)
-                result = numpy.zeros(
-                    (len(self.imts), len(self.ctx.sids), E), F32)
-                ccdist = self.cross_correl.distribution
-                if conditioned:
-                    intra_eps = [None] * self.M
-                else:
-                    # arrays of random numbers of shape (M, N, E) and (M, E)
-                    intra_eps = [ccdist.rvs((self.N, E), rng)
-                                 for _ in range(self.M)]
-                    self.eps[idxs] = self.cross_correl.get_inter_eps(
-                        self.imts, E, rng).T
-                for m, imt in enumerate(self.imts):
-                    try:
-                        result[m] = self._compute(
-                            [arr[m] for arr in ms], m, imt, gs, intra_eps[m],
-                            idxs, rng)
-                    except Exception as exc:
-                        raise RuntimeError(
-                            '(%s, %s, %s): %s' %
-                            (gs, imt, exc.__class__.__name__, exc)
-                        ).with_traceback(exc.__traceback__)
-                if self.amplifier:
-                    self.amplifier.amplify_gmfs(
-                        self.ctx.ampcode, result, self.imts, self.seed)
-            with umon:
-                result = result.transpose(1, 0, 2)  # shape (N, M, E)
-                self.update(data, result, rlzs, ms[0], max_iml)
+            if tiled:  # the inter-event epsilons are shared by the tiles
+                self.eps[idxs] = self.cross_correl.get_inter_eps(
+                    self.imts, E, rng).T
+            try:
+                for slc in slices:
+                    if tiled:  # the methods below work on self.ctx
+                        self.ctx = ctx[slc]
+                    self._compute_tile(buf, g, gs, rlzs, idxs, mean_stds,
+                                       slc, tiled, rng, max_iml,
+                                       mmon, cmon, umon)
+            finally:
+                self.ctx = ctx
+        return len(buf) - start
+
+    def _compute_tile(self, buf, g, gs, rlzs, idxs, mean_stds, slc, tiled,
+                      rng, max_iml, mmon, cmon, umon):
+        # compute the GMFs on the sites in self.ctx and append them to buf
+        conditioned = mean_stds is not None and len(mean_stds) == 3
+        if mean_stds is None:
+            with mmon:
+                ms = self.cmaker.get_4MN([self.ctx], gs)
+        elif conditioned:
+            ms = (mean_stds[0][g], mean_stds[1][g], mean_stds[2][g])
+        else:  # already computed for a batch of ruptures
+            ms = mean_stds[:, g, :, slc]
+        with cmon:
+            E = len(idxs)
+            N = len(self.ctx)
+            result = numpy.zeros((len(self.imts), N, E), F32)
+            ccdist = self.cross_correl.distribution
+            if conditioned or tiled:
+                intra_eps = [None] * self.M
+            else:
+                # arrays of random numbers of shape (M, N, E) and (M, E)
+                intra_eps = [sample_eps(ccdist, N, E, rng)
+                             for _ in range(self.M)]
+                self.eps[idxs] = self.cross_correl.get_inter_eps(
+                    self.imts, E, rng).T
+            for m, imt in enumerate(self.imts):
+                eps, intra_eps[m] = intra_eps[m], None  # free memory
+                if tiled:  # reproducible per (rupture, site, event)
+                    eps = site_eps(ccdist, self.seed, m, self.ctx.sids,
+                                   self.eid[idxs])
+                try:
+                    result[m] = self._compute(
+                        [arr[m] for arr in ms], m, imt, gs, eps, idxs, rng)
+                except Exception as exc:
+                    raise RuntimeError(
+                        '(%s, %s, %s): %s' %
+                        (gs, imt, exc.__class__.__name__, exc)
+                    ).with_traceback(exc.__traceback__)
+            del eps
+            if self.amplifier:
+                self.amplifier.amplify_gmfs(
+                    self.ctx.ampcode, result, self.imts, self.seed)
         with umon:
-            return self.strip_zeros(data)
+            self._update(buf, result, rlzs, ms[0], max_iml)
+
+    def _update(self, buf, result, rlzs, mean, max_iml):
+        # cap and strip the GMVs of shape (M, N, E) and append them to buf
+        min_iml = self.cmaker.min_iml
+        if len(mean.shape) == 3:  # shape (M, N, 1) for conditioned gmfs
+            mean = mean[:, :, 0]
+        if max_iml is None:
+            max_iml = numpy.full(self.M, numpy.inf, float)
+        set_max_min(result.transpose(1, 0, 2), mean, max_iml, min_iml,
+                    self.mmi_index)
+
+        # the events are ordered by realization, as in the sec perils
+        idxs, = numpy.where(numpy.isin(self.rlz, rlzs))
+        rlz = self.rlz[idxs]
+        order = numpy.concatenate([numpy.where(rlz == r)[0] for r in rlzs])
+        eids, rlzs = self.eid[idxs[order]], rlz[order]
+        M, N, E = result.shape
+        sec = numpy.zeros((len(buf.sec_outputs), E, N), F32)
+        if self.sec_perils:
+            mag = self.ebrupture.rupture.mag
+            for e in range(E):
+                gmfa = result[:, :, e]  # shape (M, N)
+                s = 0
+                for sp in self.sec_perils:
+                    o = sp.compute(mag, zip(self.imts, gmfa), self.ctx)
+                    for _outkey, outarr in zip(sp.outputs, o):
+                        sec[s, e] = outarr
+                        s += 1
+
+        # remove the rows with all zero values
+        ok = result.sum(axis=0) > 0  # shape (N, E)
+        buf.reserve(ok.sum())
+        buf.size = _fill_gmfs(
+            sec, result, ok, eids, U32(self.ctx.sids), rlzs,
+            buf.sec, buf.gmv, buf.eid_sid_rlz, buf.size)
 
     def _compute(self, mean_stds, m, imt, gsim, intra_eps, idxs, rng=None):
         if len(mean_stds) == 3:  # conditioned GMFs
             # mea, tau, phi with shapes (N,1), (N,N), (N,N)
+            # or (N,1), (N,R), (N,1) in the low-rank case
             mu_Y, cov_WY_WY, cov_BY_BY = mean_stds
             E = len(idxs)
             eps = self.cmaker.oq.correlation_cutoff
             if self.cmaker.truncation_level <= 1E-9:
                 gmf = exp(mu_Y, imt.string != "MMI")
                 gmf = gmf.repeat(E, axis=1)
+            elif getattr(self.cmaker.oq, 'conditioned_gmf_rank', 0):
+                # low-rank plus diagonal covariance U @ U.T + diag(d),
+                # see conditioned_gmfs.get_low_rank_cov
+                U, d = cov_WY_WY, cov_BY_BY
+                arr = mu_Y + U @ rng.standard_normal((U.shape[1], E))
+                arr += numpy.sqrt(d + eps) * rng.standard_normal((len(d), E))
+                gmf = exp(arr, imt != "MMI")
             else:
                 # add a cutoff to remove negative eigenvalues
                 cov_Y_Y = cov_WY_WY + cov_BY_BY + numpy.eye(len(cov_WY_WY)) * eps
@@ -425,13 +606,46 @@ class GmfComputer(object):
                 if len(intra_res.shape) == 1:  # a vector
                     intra_res = intra_res[:, None]
 
-            inter_res = tau[:, None] * self.eps[idxs, m]
+            # add in place the mean and the inter-event residuals,
             # shape (N, 1) * E => (N, E)
-            gmf = exp(mean[:, None] + intra_res + inter_res, im != 'MMI')
-            self.sig[idxs, m] = tau.max()  # from shape (N, 1) => scalar
+            intra_res += mean[:, None]
+            intra_res += tau[:, None] * self.eps[idxs, m]
+            gmf = exp(intra_res, im != 'MMI')
+            # from shape (N, 1) => scalar, the maximum across the tiles
+            self.sig[idxs, m] = numpy.maximum(self.sig[idxs, m], tau.max())
         return gmf  # shapes (N, E)
 
 
+def get_mean_stds_batch(computers, mmon=Monitor()):
+    """
+    Compute the mean and standard deviations for a batch of GmfComputers
+    sharing the same ContextMaker with a single call to
+    `cmaker.get_mean_stds`, splitting by magnitude as in classical, so that
+    the GSIMs work on large arrays even if each rupture affects few sites.
+
+    :param computers: a non-empty list of GmfComputers
+    :param mmon: monitor for the mean_stds computation
+    :returns: a list of arrays of shape (4, G, M, N), one per computer, or
+              None for the computers with more sites than their tile size
+    """
+    cmaker = computers[0].cmaker
+    out = [None] * len(computers)
+    # sorting by magnitude, so that get_mean_stds makes one call per mag
+    order = [i for i in numpy.argsort([c.ctx.mag[0] for c in computers],
+                                      kind='stable')
+             if computers[i].N <= (computers[i].tile_size or numpy.inf)]
+    if not order:
+        return out
+    ctxs = [computers[i].ctx for i in order]
+    with mmon:
+        mean_stds = cmaker.get_mean_stds(ctxs)  # shape (4, G, M, N)
+    start = 0
+    for i, ctx in zip(order, ctxs):
+        out[i] = mean_stds[:, :, :, start:start + len(ctx)]
+        start += len(ctx)
+    return out
+
+
 # this is not used in the engine; it is still useful for usage in IPython
 # when demonstrating hazardlib capabilities
 def ground_motion_fields(rupture, sites, imts, gsim, truncation_level,
@@ -27,11 +27,14 @@ from openquake.baselib import hdf5
 from openquake.baselib.general import AccumDict, random_histogram
 from openquake.baselib.performance import Monitor
 from openquake.hazardlib.calc.filters import nofilter, SourceFilter
+from openquake.hazardlib.source.base import is_poissonian, sample_planar
 from openquake.hazardlib.source.rupture import (
-    BaseRupture, EBRupture, rupture_dt)
+    BaseRupture, EBRupture, ParametricProbabilisticRupture, rupture_dt)
+from openquake.hazardlib.geo.surface.planar import PlanarSurface
 from openquake.hazardlib.geo.mesh import surface_to_arrays
 
 TWO16 = 2 ** 16  # 65,536
+TWO30 = 2 ** 30  # 1,073,741,824
 TWO32 = 2 ** 32  # 4,294,967,296
 F64 = numpy.float64
 U16 = numpy.uint16
@@ -45,11 +48,14 @@ MAX_RUPTURES = 2000
 
 
 # this is really fast
-def get_rup_array(ebruptures, srcfilter=nofilter, model='???', model_geom=None):
+def get_rup_array(ebruptures, srcfilter=nofilter, model='???', model_geom=None,
+                  planars=()):
     """
     Convert a list of EBRuptures into a numpy composite array, by filtering
     out the ruptures far away from every site. If a shapely polygon is passed
-    in model_geom, ruptures outside the polygon are discarded.
+    in model_geom, ruptures outside the polygon are discarded. The pairs
+    (rup_array, geoms) returned by :func:`get_planar_rups` can be passed
+    in `planars` and are appended to the converted EBRuptures.
     """
     if not BaseRupture._code:
         BaseRupture.init()  # initialize rupture codes
@@ -122,13 +128,74 @@ def get_rup_array(ebruptures, srcfilter=nofilter, model='???', model_geom=None):
         # NB: the geometries are read by source.rupture.to_arrays
         geom = numpy.concatenate([[len(shapes) // 2], shapes, points])
         geoms.append(geom)
-    if not rups:
-        return ()
-    dic = dict(geom=numpy.array(geoms, object))
     # NB: PMFs for nonparametric ruptures are not saved since they
     # are useless for the GMF computation
-    arr = numpy.array(rups, rupture_dt)
-    return hdf5.ArrayWrapper(arr, dic)
+    arrays = [numpy.array(rups, rupture_dt)]
+    for arr, geo in planars:
+        arrays.append(arr)
+        geoms.extend(geo)
+    if not geoms:
+        return ()
+    dic = dict(geom=numpy.array(geoms, object))
+    return hdf5.ArrayWrapper(numpy.concatenate(arrays), dic)
+
+
+def get_planar_rups(src, eff_num_ses, ses_seed, srcfilter=nofilter,
+                    model='???', model_geom=None):
+    """
+    Sample the ruptures of a poissonian (multi)point or area source and
+    build directly the rupture records, without instantiating EBRuptures.
+    The filtering is the same as in :func:`get_rup_array`.
+
+    :returns: a pair (rup_array, geoms)
+    """
+    if not BaseRupture._code:
+        BaseRupture.init()  # initialize rupture codes
+    dic = sample_planar(src, eff_num_ses, src.serial(ses_seed))
+    K = len(dic['rup_id'])
+    arr = numpy.zeros(K, rupture_dt)
+    if K == 0:
+        return arr, []
+    rate = dic['rate']
+    if src.smweight < 1:  # see BaseSeismicSource.sample_ruptures
+        rate = rate * src.smweight
+    corners = dic['planar']['corners']  # shape (K, 3, 4)
+    arr['id'] = src.id * TWO30 + dic['rup_id']  # as in EBRupture
+    arr['seed'] = arr['id'] + ses_seed
+    arr['source_id'] = src.id
+    arr['trt_smr'] = src.trt_smr
+    arr['code'] = BaseRupture._code[
+        ParametricProbabilisticRupture, PlanarSurface]
+    arr['n_occ'] = dic['n_occ']
+    arr['mag'] = dic['mag']
+    arr['rake'] = dic['rake']
+    arr['occurrence_rate'] = rate
+    arr['minlon'] = corners[:, 0].min(axis=1)
+    arr['minlat'] = corners[:, 1].min(axis=1)
+    arr['maxlon'] = corners[:, 0].max(axis=1)
+    arr['maxlat'] = corners[:, 1].max(axis=1)
+    arr['hypo'] = dic['hypo']
+    arr['model'] = model
+
+    # apply magnitude filtering
+    ok = srcfilter.integration_distance(dic['mag']) != 0
+
+    # apply distance filtering
+    if srcfilter.sitecol is not None:
+        arr['nsites'][ok] = srcfilter.get_nsites(arr[ok])
+        ok &= arr['nsites'] > 0
+
+    # apply model filtering if any
+    if model_geom:
+        ok &= shapely.contains_xy(
+            model_geom, dic['hypo'][:, 0], dic['hypo'][:, 1])
+
+    # planar geometries, see the comment in get_rup_array
+    geoms = numpy.zeros((K, 15))
+    geoms[:, 0] = 1
+    geoms[:, 1:3] = [1, 4]
+    geoms[:, 3:] = F32(corners).reshape(K, 12)
+    return arr[ok], list(geoms[ok])
 
 
 def sample_cluster(group, num_ses, ses_seed):
@@ -255,22 +322,35 @@ def sample_ruptures(sources, cmaker, sitecol=None, monitor=Monitor()):
         yield AccumDict(dic)
     else:
         eb_ruptures = []
+        planars = []  # pairs (rup_array, geoms) for point-like sources
+        nplanars = 0
         eff_ruptures = 0
         source_data = AccumDict(accum=[])
         for src in sources:
             nr = src.num_ruptures
             eff_ruptures += nr
-            if len(eb_ruptures) > MAX_RUPTURES:
+            if len(eb_ruptures) + nplanars > MAX_RUPTURES:
                 # yield partial result to avoid running out of memory
                 yield AccumDict(dict(
                     rup_array=get_rup_array(
-                        eb_ruptures, srcfilter, model, model_geom),
+                        eb_ruptures, srcfilter, model, model_geom, planars),
                     source_data={}, eff_ruptures={}))
                 eb_ruptures.clear()
+                planars.clear()
+                nplanars = 0
             samples = getattr(src, 'samples', 1)
             t0 = time.time()
-            eb_ruptures.extend(
-                src.sample_ruptures(samples * num_ses, cmaker.ses_seed))
+            if (hasattr(src, 'nodal_plane_distribution') and
+                    is_poissonian(src)):
+                # fast lane building the rupture records directly
+                arr, geoms = get_planar_rups(
+                    src, samples * num_ses, cmaker.ses_seed, srcfilter,
+                    model, model_geom)
+                planars.append((arr, geoms))
+                nplanars += len(arr)
+            else:
+                eb_ruptures.extend(
+                    src.sample_ruptures(samples * num_ses, cmaker.ses_seed))
             dt = time.time() - t0
             source_data['src_id'].append(src.source_id)
             source_data['nsites'].append(src.nsites)
@@ -279,7 +359,8 @@ def sample_ruptures(sources, cmaker, sitecol=None, monitor=Monitor()):
             source_data['weight'].append(src.weight)
             source_data['taskno'].append(monitor.task_no)
         t0 = time.time()
-        rup_array = get_rup_array(eb_ruptures, srcfilter, model, model_geom)
+        rup_array = get_rup_array(
+            eb_ruptures, srcfilter, model, model_geom, planars)
         dt = time.time() - t0
         if len(rup_array):
             yield AccumDict(dict(rup_array=rup_array, source_data=source_data,
@@ -20,16 +20,19 @@ import os
 import abc
 import copy
 import time
+import hashlib
+import inspect
 import logging
 import warnings
 import itertools
 import operator
+import functools
 import collections
 import numpy
 import shapely
 from scipy.interpolate import interp1d
 
-from openquake.baselib import config
+from openquake.baselib import config, __version__
 from openquake.baselib.general import (
     AccumDict, DictArray, RecordBuilder, split_in_slices, block_splitter,
     sqrscale)
@@ -175,6 +178,37 @@ def concat(ctxs):
     return out
 
 
+def sort_by_mag(ctx):
+    """
+    Round the magnitudes to 3 digits and sort the context by magnitude,
+    with a stable sort, if not already sorted.
+
+    :returns: the original context if already sorted, otherwise a copy
+    """
+    ctx.mag = mags = numpy.round(ctx.mag, 3)
+    if len(mags) > 1 and (mags[1:] < mags[:-1]).any():
+        ctx = numpy.take(ctx, numpy.argsort(mags, kind='stable'))
+    return ctx
+
+
+def mag_start_stop(mags):
+    """
+    :param mags: an array of sorted magnitudes
+    :returns: an array of shape (K, 2) with the start, stop offsets of
+              each of the K distinct magnitudes
+
+    >>> mag_start_stop(numpy.array([5., 5., 5.5, 6., 6.]))
+    array([[0, 2],
+           [2, 3],
+           [3, 5]])
+    """
+    if len(mags) == 0:
+        return numpy.zeros((0, 2), int)
+    idx = numpy.flatnonzero(mags[1:] != mags[:-1]) + 1
+    bounds = numpy.concatenate([[0], idx, [len(mags)]])
+    return numpy.column_stack([bounds[:-1], bounds[1:]])
+
+
 def size(imtls):
     """
     :returns: size of the dictionary of arrays imtls
@@ -201,6 +235,7 @@ class Oq(object):
     af = None
     impact = False
     cross_correl = None
+    gmf_tile_size = 0
     mea_tau_phi = False
     split_sources = True
     use_rates = False
@@ -238,6 +273,125 @@ class DeltaRatesGetter(object):
             return dstore['delta_rates'][src_id]
 
 
+@functools.lru_cache()
+def source_hash(cls):
+    """
+    :returns: a hash of the source code of the modules defining the given
+              GSIM class and its base classes
+    """
+    sha = hashlib.sha1()
+    for fname in sorted({inspect.getfile(c) for c in cls.__mro__
+                         if c.__module__.startswith('openquake.')}):
+        with open(fname, 'rb') as f:
+            sha.update(f.read())
+    return sha.digest()
+
+
+class MeanStdCache(object):
+    """
+    On-disk LRU cache for the arrays of shape (4, M, N) computed by the
+    GMPEs, stored as .npy files in a directory. The key is a hash of the
+    engine version, of the source code and parameters of the GMPE, of the
+    IMTs and of the context columns (excluding the bookkeeping fields like
+    the site and rupture IDs), so that upgrading the engine or changing the
+    GMPE code invalidates the entries. The least recently used files are
+    removed when the total size exceeds `max_mb`.
+    """
+    # fields which do not enter in the computation of mean and stddevs
+    bookkeeping = frozenset(['sids', 'src_id', 'rup_id', 'occurrence_rate',
+                             'probs_occur'])
+
+    @classmethod
+    def from_config(cls):
+        """
+        :returns: a MeanStdCache if `gmpe_cache_mb` and `custom_tmp` are set
+                  in openquake.cfg, otherwise None
+        """
+        max_mb = config.performance.get('gmpe_cache_mb')
+        tmp = config.directory.custom_tmp
+        if max_mb and tmp:
+            return cls(os.path.join(tmp, 'gmpe_cache'), float(max_mb))
+
+    def __init__(self, dirname, max_mb):
+        self.dirname = dirname
+        self.max_bytes = max_mb * TWO20
+        self.nbytes = None  # total size, determined lazily
+        os.makedirs(dirname, exist_ok=True)
+
+    def get_key(self, gsim, imts, ctxs):
+        """
+        :returns: a hex digest for the given gsim, imts and contexts
+        """
+        sha = hashlib.sha1(__version__.encode('ascii'))
+        sha.update(repr(gsim).encode('utf8'))
+        sha.update(source_hash(gsim.__class__))
+        underlying = getattr(gsim, 'gmpe', None)  # in the ModifiableGMPE
+        if underlying is not None:
+            sha.update(source_hash(underlying.__class__))
+        sha.update(' '.join(str(imt) for imt in imts).encode('ascii'))
+        for ctx in ctxs:
+            for name in ctx.dtype.names:
+                if name not in self.bookkeeping:
+                    sha.update(name.encode('ascii'))
+                    sha.update(numpy.ascontiguousarray(ctx[name]).data)
+        return sha.hexdigest()
+
+    def get(self, key):
+        """
+        :returns: the cached array or None
+        """
+        fname = os.path.join(self.dirname, key + '.npy')
+        try:
+            arr = numpy.load(fname)
+            os.utime(fname)  # mark as recently used
+        except (FileNotFoundError, ValueError):  # missing or being written
+            return None
+        return arr
+
+    def put(self, key, arr):
+        """
+        Store the array, removing the least recently used files if needed
+        """
+        fname = os.path.join(self.dirname, key + '.npy')
+        tmp = '%s.%d' % (fname, os.getpid())
+        with open(tmp, 'wb') as f:
+            numpy.save(f, arr)
+        os.replace(tmp, fname)  # atomic, safe with concurrent workers
+        if self.nbytes is None:
+            self.nbytes = sum(os.path.getsize(e) for e in self._entries())
+        else:
+            self.nbytes += os.path.getsize(fname)
+        if self.nbytes > self.max_bytes:
+            self.evict()
+
+    def _entries(self):
+        return [entry.path for entry in os.scandir(self.dirname)
+                if entry.name.endswith('.npy')]
+
+    def evict(self):
+        """
+        Remove the least recently used files until the cache is
+        below 80% of its maximum size
+        """
+        entries = []
+        for path in self._entries():
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:  # removed by another process
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+        self.nbytes = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if self.nbytes <= .8 * self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self.nbytes -= size
+
+
 # same speed as performance.kround, round more
 def kround1(ctx, kfields):
     kdist = 2. * ctx.mag**2  # heuristic collapse distance from 32 to 200 km
@@ -555,6 +709,7 @@ class ContextMaker(object):
     fewsites = False
     tom = None
     cluster = None  # set in PmapMaker
+    fused = True  # use the fused PoE kernel when possible
 
     def __init__(self, trt, gsims, oq, monitor=Monitor(), extraparams=()):
         self.trt = trt
@@ -592,6 +747,7 @@ class ContextMaker(object):
         self.gid = numpy.arange(len(gsims), dtype=numpy.uint16)
         self.oq = oq
         self.monitor = monitor
+        self.mean_std_cache = MeanStdCache.from_config()
         self._init1(param)
         self._init2(param, extraparams)
         self.set_imts_conv()
@@ -696,6 +852,8 @@ class ContextMaker(object):
         self.ir_mon = monitor('iter_ruptures', measuremem=False)
         self.sec_mon = monitor('building dparam', measuremem=True)
         self.delta_mon = monitor('getting delta_rates', measuremem=False)
+        self.hit_mon = monitor('mean_std cache hits', measuremem=False)
+        self.miss_mon = monitor('mean_std cache misses', measuremem=False)
         self.task_no = getattr(monitor, 'task_no', 0)
         self.out_no = getattr(monitor, 'out_no', self.task_no)
         self.cfactor = numpy.zeros(2)
@@ -1174,9 +1332,9 @@ class ContextMaker(object):
         :param rup_indep: rupture flag (false for mutex ruptures)
         :yields: poes, mea_sig, ctxt with poes of shape (N, L, G)
         """
-        ctx.mag = numpy.round(ctx.mag, 3)
-        for mag in numpy.unique(ctx.mag):
-            ctxt = ctx[ctx.mag == mag]
+        ctx = sort_by_mag(ctx)
+        for start, stop in mag_start_stop(ctx.mag):
+            ctxt = ctx[start:stop]  # a view, not a copy
             self.cfactor += [len(ctxt), 1]
             for poes, mea, sig, slc in self._gen_poes(ctxt):
                 yield poes, mea, sig, ctxt[slc]
@@ -1214,6 +1372,9 @@ class ContextMaker(object):
         :param ctx: a context array
         :param rup_mutex: dictionary (src_id, rup_id) -> weight
         """
+        if not rup_mutex and self._fusable(pmap, ctx):
+            self._update_fused(pmap, ctx)
+            return
         for poes, mea, sig, ctxt in self.gen_poes(ctx):
             if rup_mutex:
                 pmap.update_mutex(poes, ctxt, self.tom.time_span, rup_mutex)
@@ -1223,6 +1384,38 @@ class ContextMaker(object):
             else:
                 pmap.update_indep(poes, ctxt, self.tom.time_span)
 
+    def _fusable(self, pmap, ctx):
+        # True if the PoEs can be computed by the fused kernel, i.e.
+        # regular GMPEs and poissonian ruptures updating probabilities
+        if not self.fused or self.cluster or self.oq.af or pmap.rates:
+            return False
+        if not isinstance(self.tom, PoissonTOM) or not self.tom.time_span:
+            return False  # the kernel hard-codes the Poisson formula
+        if ctx.probs_occur.shape[1]:  # nonparametric ruptures
+            return False
+        for gsim in self.gsims:
+            if (hasattr(gsim, 'weights_signs') or
+                    hasattr(gsim, 'mixture_model') or
+                    hasattr(gsim, 'weights')):
+                return False
+            imtweight = getattr(gsim, 'weight', None)
+            if imtweight and 0 in imtweight.dic.values():
+                return False
+        return True
+
+    def _update_fused(self, pmap, ctx):
+        # same as the regular update, but without the poes array
+        loglevels = self.loglevels.array
+        ctx = sort_by_mag(ctx)
+        for start, stop in mag_start_stop(ctx.mag):
+            ctxt = ctx[start:stop]
+            self.cfactor += [len(ctxt), 1]
+            with self.gmf_mon:
+                mean_stdt = self.get_mean_stds([ctxt], split_by_mag=False)
+            with self.poe_mon:
+                pmap.update_fused(mean_stdt, loglevels, self.phi_b, ctxt,
+                                  self.tom.time_span)
+
     # called by gen_poes and by the GmfComputer
     def get_mean_stds(self, ctxs, split_by_mag=True):
         """
@@ -1240,8 +1433,12 @@ class ContextMaker(object):
         else:  # vectorize the contexts
             recarrays = [self.recarray(ctxs)]
         if split_by_mag:
-            recarr = numpy.concatenate(
-                recarrays, dtype=recarrays[0].dtype).view(numpy.recarray)
+            if len(recarrays) == 1:
+                recarr = recarrays[0]
+            else:
+                recarr = numpy.concatenate(
+                    recarrays, dtype=recarrays[0].dtype).view(numpy.recarray)
+            # split on the changes of magnitude, without copying
             recarrays = split_array(recarr, U32(numpy.round(recarr.mag*100)))
         for g, gsim in enumerate(self.gsims):
             out[:, g] = self.get_4MN(recarrays, gsim)
@@ -1251,6 +1448,27 @@ class ContextMaker(object):
         """
         Called by the GmfComputer
         """
+        cache = self.mean_std_cache
+        if cache is None:
+            out = self._compute_4MN(ctxs, gsim)
+        else:
+            key = cache.get_key(gsim, self.imts, ctxs)
+            out = cache.get(key)
+            if out is None:
+                with self.miss_mon:
+                    out = self._compute_4MN(ctxs, gsim)
+                if not len(gsim.adj):  # do not cache the adjustments
+                    cache.put(key, out)
+            else:
+                self.hit_mon.counts += 1
+                gsim.adj = []
+        if self.truncation_level not in (0, 1E-9, 99.) and (out[1] == 0.).any():
+            raise ValueError('Total StdDev is zero for %s' % gsim)
+        if self.conv:  # apply horizontal component conversion
+            self.horiz_comp_to_geom_mean(out, gsim)
+        return out
+
+    def _compute_4MN(self, ctxs, gsim):
         N = sum(len(ctx) for ctx in ctxs)
         M = len(self.imts)
         out = numpy.zeros((4, M, N))
@@ -1263,12 +1481,8 @@ class ContextMaker(object):
             if adj is not None:
                 gsim.adj.append(adj)
             start = slc.stop
-        if self.truncation_level not in (0, 1E-9, 99.) and (out[1] == 0.).any():
-            raise ValueError('Total StdDev is zero for %s' % gsim)
         if gsim.adj:
             gsim.adj = numpy.concatenate(gsim.adj)
-        if self.conv:  # apply horizontal component conversion
-            self.horiz_comp_to_geom_mean(out, gsim)
         return out
 
     # not used right now
@@ -19,6 +19,93 @@ spatially-distributed ground-shaking intensities.
 """
 import abc
 import numpy
+from openquake.baselib.general import gen_slices
+from openquake.baselib.performance import compile
+from openquake.hazardlib.geo import geodetic
+
+
+@compile("float64[:,:](int64[:,:],float64[:,:],float64[:],float64[:,:])")
+def _vecchia_apply(nbrs, coeffs, sqrtd, eps):
+    # sequential conditional sampling z_i = b_i . z_nbrs + sqrt(d_i) eps_i
+    N, E = eps.shape
+    z = numpy.zeros((N, E))
+    for i in range(N):
+        for e in range(E):
+            z[i, e] = sqrtd[i] * eps[i, e]
+        for k in range(nbrs.shape[1]):
+            j = nbrs[i, k]
+            if j < 0:  # no more neighbours
+                break
+            c = coeffs[i, k]
+            for e in range(E):
+                z[i, e] += c * z[j, e]
+    return z
+
+
+class VecchiaFactor(object):
+    """
+    Nearest-neighbour (Vecchia) approximation of the lower-triangular
+    Cholesky factor of a spatial correlation matrix. Each site is
+    conditioned only on the closest previous sites within the cutoff
+    distance (up to `max_neighbours` of them), so the cost is O(N K^3)
+    in time and O(N K) in memory instead of O(N^3) and O(N^2).
+    It supports the multiplication `factor @ residuals` like a dense
+    matrix; with an infinite cutoff and K >= N - 1 the result is the
+    same as with the exact Cholesky factor.
+
+    :param sites: a SiteCollection with N sites
+    :param correlation: a function distances -> correlation coefficients
+    :param cutoff_distance: maximum distance of the neighbours in km
+    :param max_neighbours: maximum number of neighbours per site
+    """
+    def __init__(self, sites, correlation, cutoff_distance,
+                 max_neighbours=30):
+        lons, lats = sites.lons, sites.lats
+        self.N = N = len(lons)
+        K = max(min(max_neighbours, N - 1), 1)
+        self.nbrs = nbrs = numpy.full((N, K), -1)
+        # the chord distance is smaller than the geodetic distance, so
+        # no neighbours are lost by the KDTree query, apart from the
+        # effect of the depths, which is taken into account in the radius
+        radius = cutoff_distance + numpy.ptp(sites.depths)
+        balls = sites.kdtree.query_ball_point(sites.xyz, radius)
+        for i, ball in enumerate(balls):
+            idxs = numpy.array(ball, int)
+            idxs = idxs[idxs < i]  # previous sites
+            dists = geodetic.geodetic_distance(
+                lons[i], lats[i], lons[idxs], lats[idxs])
+            ok = dists <= cutoff_distance
+            idxs, dists = idxs[ok], dists[ok]
+            if len(idxs) > K:
+                idxs = idxs[numpy.argpartition(dists, K)[:K]]
+            nbrs[i, :len(idxs)] = idxs
+        self.coeffs = numpy.zeros((N, K))
+        self.sqrtd = numpy.ones(N)
+        # building the (K, K) systems for blocks of sites to save memory
+        for slc in gen_slices(0, N, max(4_000_000 // K**2, 1)):
+            self._build(slc, lons, lats, correlation)
+
+    def _build(self, slc, lons, lats, correlation):
+        # solve the K x K systems C_nn b = c_in for the sites in the slice
+        nbrs = self.nbrs[slc]
+        valid = nbrs >= 0
+        K = nbrs.shape[1]
+        lo, la = lons[nbrs], lats[nbrs]  # padding values are masked below
+        c_in = correlation(geodetic.geodetic_distance(
+            lons[slc, None], lats[slc, None], lo, la))
+        c_in[~valid] = 0
+        c_nn = correlation(geodetic.geodetic_distance(
+            lo[:, :, None], la[:, :, None], lo[:, None, :], la[:, None, :]))
+        mask = valid[:, :, None] & valid[:, None, :]
+        c_nn = numpy.where(mask, c_nn, numpy.eye(K))
+        b = numpy.linalg.solve(c_nn, c_in[:, :, None])[:, :, 0]
+        self.coeffs[slc] = b
+        self.sqrtd[slc] = numpy.sqrt(numpy.clip(
+            1. - (b * c_in).sum(axis=1), 0., 1.))
+
+    def __matmul__(self, residuals):
+        return _vecchia_apply(self.nbrs, self.coeffs, self.sqrtd,
+                              numpy.asarray(residuals, float))
 
 
 class BaseCorrelationModel(metaclass=abc.ABCMeta):
@@ -84,9 +171,17 @@ class JB2009CorrelationModel(BaseCorrelationModel):
         Boolean value to indicate whether "Case 1" or "Case 2" from page 1700
         should be applied. ``True`` value means that Vs 30 values show or are
         expected to show clustering ("Case 2"), ``False`` means otherwise.
+    :param cutoff_distance:
+        If given (in km), use a :class:`VecchiaFactor` instead of the dense
+        Cholesky factor, to scale to large numbers of sites
+    :param max_neighbours:
+        Maximum number of neighbours per site used with the cutoff distance
     """
-    def __init__(self, vs30_clustering):
+    def __init__(self, vs30_clustering, cutoff_distance=None,
+                 max_neighbours=30):
         self.vs30_clustering = vs30_clustering
+        self.cutoff_distance = cutoff_distance
+        self.max_neighbours = max_neighbours
         self.cache = {}  # imt -> correlation model
 
     def _get_correlation_matrix(self, sites, imt):
@@ -113,6 +208,10 @@ class JB2009CorrelationModel(BaseCorrelationModel):
         :param imt:
             Intensity measure type object, see :mod:`openquake.hazardlib.imt`.
         """
+        if self.cutoff_distance:
+            return VecchiaFactor(
+                sites, lambda dists: self._get_correlation_matrix(dists, imt),
+                self.cutoff_distance, self.max_neighbours)
         return numpy.linalg.cholesky(self._get_correlation_matrix(sites, imt))
 
 
@@ -160,9 +259,17 @@ class HM2018CorrelationModel(BaseCorrelationModel):
         Value to be multiplied by the uncertainty in the correlation parameter
         beta. If uncertainty_multiplier = 0 (default), the median value is
         used as a constant value.
+    :param cutoff_distance:
+        If given (in km), use a :class:`VecchiaFactor` instead of the dense
+        Cholesky factor; it works only with uncertainty_multiplier = 0
+    :param max_neighbours:
+        Maximum number of neighbours per site used with the cutoff distance
     """
-    def __init__(self, uncertainty_multiplier=0):
+    def __init__(self, uncertainty_multiplier=0, cutoff_distance=None,
+                 max_neighbours=30):
         self.uncertainty_multiplier = uncertainty_multiplier
+        self.cutoff_distance = cutoff_distance
+        self.max_neighbours = max_neighbours
         self.distance_matrix = {}
         self.cache = {}
 
@@ -189,6 +296,13 @@ class HM2018CorrelationModel(BaseCorrelationModel):
             # corresponding standard deviation element.
             residuals_norm = residuals / stddev_intra[:, None]
 
+            if self.cutoff_distance:
+                # the Cholesky factor of D C D is D times the one of C
+                corma = VecchiaFactor(
+                    sites, lambda dists: self._get_correlation_matrix(
+                        dists, imt), self.cutoff_distance, self.max_neighbours)
+                return stddev_intra[:, None] * (corma @ residuals_norm)
+
             # Lower diagonal of the Cholesky decomposition
             # Note that instead of computing the whole correlation matrix
             # corresponding to sites.complete, here we compute only the
@@ -169,6 +169,43 @@ build_corners = compile(F8[:, :, :, :, :](
 ))(build_corners)
 
 
+# numbified below
+def build_corners_flat(usd, lsd, mag, dims, sdr, hypo):
+    K = len(mag)
+    corners = numpy.zeros((6, K, 3))
+    for k in range(K):
+        _update(corners[:, k], usd, lsd, mag[k], dims[k],
+                sdr[k, 0], sdr[k, 1], sdr[k, 2],
+                hypo[k, 0], hypo[k, 1], hypo[k, 2])
+    return corners
+
+
+build_corners_flat = compile(F8[:, :, :](
+    F8,              # usd
+    F8,              # lsd
+    F8[:],           # mag
+    F8[:, :],        # dims
+    F8[:, :],        # sdr
+    F8[:, :],        # hypo
+))(build_corners_flat)
+
+
+def build_planar_flat(mag, dims, sdr, hypo, usd, lsd):
+    """
+    Build the planar surfaces of K ruptures in a single call.
+
+    :param mag: K magnitudes
+    :param dims: array of shape (K, 3) with length, width and height
+    :param sdr: array of shape (K, 3) with strike, dip and rake
+    :param hypo: array of shape (K, 3) with the hypocenters
+    :returns: a planar array of shape K
+    """
+    corners = build_corners_flat(usd, lsd, mag, dims, sdr, hypo)
+    planar_array = build_planar_array(corners[:4], corners[4], corners[5])
+    planar_array.wlr[:, 2] = 1.
+    return planar_array
+
+
 # not numbified but fast anyway
 def build_planar(planin, hdd, lon, lat, usd, lsd):
     """
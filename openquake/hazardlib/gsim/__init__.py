@@ -22,10 +22,7 @@ implementations of ground shaking intensity models. See
 :mod:`openquake.hazardlib.gsim.base`.
 """
 import inspect
-from openquake.baselib.general import import_all
-from openquake.hazardlib.gsim.base import registry
-
-import_all('openquake.hazardlib.gsim')
+from openquake.hazardlib.gsim.base import registry, build_index  # noqa
 
 
 def get_available_gsims():
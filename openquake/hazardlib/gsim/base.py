@@ -21,15 +21,22 @@ Module :mod:`openquake.hazardlib.gsim.base` defines base classes for
 different kinds of :class:`ground shaking intensity models
 <GroundShakingIntensityModel>`.
 """
+import os
 import sys
 import abc
+import json
+import getpass
+import hashlib
 import inspect
+import tempfile
+import importlib
 import warnings
 import functools
 import toml
 import numpy
 
-from openquake.baselib.general import DeprecationWarning
+from openquake.baselib import __version__, config
+from openquake.baselib.general import DeprecationWarning, import_all
 from openquake.hazardlib import const
 from openquake.hazardlib.gsim.coeffs_table import CoeffsTable
 from openquake.hazardlib.contexts import (
@@ -48,7 +55,127 @@ ADMITTED_SET_PARAMETERS = ['DEFINED_FOR_INTENSITY_MEASURE_TYPES',
 
 F32 = numpy.float32
 F64 = numpy.float64
-registry = {}  # GSIM name -> GSIM class
+
+
+def get_index_fname():
+    """
+    :returns: the path of the cached GSIM index; the name contains a hash
+              of the engine version and of the size and modification time
+              of the GSIM modules, so that changing a module gives a new name
+    """
+    gsimdir = os.path.dirname(__file__)
+    sha = hashlib.sha1(__version__.encode('ascii'))
+    for root, dirs, files in os.walk(gsimdir):
+        dirs.sort()
+        for fname in sorted(files):
+            if fname.endswith('.py'):
+                path = os.path.join(root, fname)
+                st = os.stat(path)
+                sha.update(('%s %d %d' % (
+                    os.path.relpath(path, gsimdir), st.st_size,
+                    st.st_mtime_ns)).encode('utf8'))
+    tmp = config.directory.custom_tmp or tempfile.gettempdir()
+    return os.path.join(tmp, getpass.getuser(),
+                        'gsim_index_%s.json' % sha.hexdigest())
+
+
+def build_index():
+    """
+    Import all the GSIM modules and return a dictionary GSIM name ->
+    module name, including the GSIM aliases
+    """
+    return {name: cls.__module__
+            for name, cls in sorted(registry.items())
+            if cls.__module__.startswith('openquake.hazardlib.gsim.')}
+
+
+class Registry(dict):
+    """
+    A dictionary GSIM name -> GSIM class populated lazily: the module
+    defining a GSIM (or a GSIM alias) is imported only when the GSIM is
+    requested, by looking at the GSIM index. The index is built by importing
+    all the GSIM modules the first time and then it is cached on disk, until
+    a GSIM module changes. Iterating on the registry imports all the GSIM
+    modules.
+    """
+    complete = False
+    _index = None
+
+    @property
+    def index(self):
+        """
+        :returns: a dictionary GSIM name -> module name
+        """
+        if self._index is None:
+            fname = get_index_fname()
+            try:
+                with open(fname) as f:
+                    self._index = json.load(f)
+            except (FileNotFoundError, ValueError):  # missing or truncated
+                self._index = build_index()
+                os.makedirs(os.path.dirname(fname), exist_ok=True)
+                tmpname = '%s.%d' % (fname, os.getpid())
+                with open(tmpname, 'w') as f:
+                    json.dump(self._index, f, indent=0)
+                os.replace(tmpname, fname)  # atomic
+        return self._index
+
+    def load(self, name):
+        """
+        Import the module defining the given GSIM or alias, if known
+        """
+        if not dict.__contains__(self, name) and name in self.index:
+            importlib.import_module(self.index[name])
+
+    def load_all(self):
+        """
+        Import all the modules in openquake.hazardlib.gsim
+        """
+        if not self.complete:
+            import_all('openquake.hazardlib.gsim')
+            self.complete = True
+
+    def __missing__(self, name):
+        self.load(name)
+        if dict.__contains__(self, name):
+            return dict.__getitem__(self, name)
+        raise KeyError(name)
+
+    def __contains__(self, name):
+        try:
+            self[name]
+        except KeyError:
+            return False
+        return True
+
+    def get(self, name, default=None):
+        try:
+            return self[name]
+        except KeyError:
+            return default
+
+    def __iter__(self):
+        self.load_all()
+        return dict.__iter__(self)
+
+    def __len__(self):
+        self.load_all()
+        return dict.__len__(self)
+
+    def keys(self):
+        self.load_all()
+        return dict.keys(self)
+
+    def values(self):
+        self.load_all()
+        return dict.values(self)
+
+    def items(self):
+        self.load_all()
+        return dict.items(self)
+
+
+registry = Registry()  # GSIM name -> GSIM class
 gsim_aliases = {}  # GSIM alias -> TOML representation
 
 
@@ -17,6 +17,7 @@
 # along with OpenQuake.  If not, see <http://www.gnu.org/licenses/>.
 
 import copy
+import math
 import logging
 import warnings
 import numpy
@@ -201,6 +202,14 @@ sig_i = t.void(t.float32[:, :, :],                     # pmap
                t.uint32[:],                            # sids
                t.float64)                              # itime
 
+sig_f = t.void(t.float32[:, :, :],                     # pmap
+               t.float64[:, :, :, :],                  # mean_stds
+               t.float64[:, :],                        # loglevels
+               t.float64,                              # phi_b
+               t.float64[:],                           # rates
+               t.uint32[:],                            # sids
+               t.float64)                              # itime
+
 sig_m = t.void(t.float32[:, :, :],                     # pmap
                t.float32[:, :, :],                     # poes
                t.float64[:],                           # rates
@@ -214,14 +223,43 @@ sig_m = t.void(t.float32[:, :, :],                     # pmap
 def update_pmap_i(arr, poes, rates, probs_occur, sidxs, itime):
     G = arr.shape[2]
     for poe, rate, probs, sidx in zip(poes, rates, probs_occur, sidxs):
-        no_probs = len(probs) == 0
+        poissonian = len(probs) == 0 and itime > 0.
         for g in range(G):
-            if no_probs:
+            if poissonian:
                 arr[sidx, :, g] *= numpy.exp(-rate * poe[:, g] * itime)
-            else:  # nonparametric rupture
+            else:  # nonparametric rupture or FatedTOM
                 arr[sidx, :, g] *= get_pnes(rate, probs, poe[:, g], itime)  # shape L
 
 
+SQRT05 = math.sqrt(0.5)
+
+
+# fused version of contexts._set_poes + update_pmap_i, without the
+# intermediate poes array; it must give exactly the same numbers
+@compile(sig_f)
+def update_pmap_fused(arr, mean_std, loglevels, phi_b, rates, sidxs, itime):
+    G = arr.shape[2]
+    M, L1 = loglevels.shape
+    z = phi_b * 2. - 1.
+    for n in range(len(rates)):
+        rate = rates[n]
+        sidx = sidxs[n]
+        for g in range(G):
+            for m in range(M):
+                mea = mean_std[0, g, m, n]
+                std = mean_std[1, g, m, n]
+                for lvl in range(L1):
+                    # same as stats.truncnorm_sf
+                    x = (loglevels[m, lvl] - mea) / std
+                    sf = (phi_b - 0.5 * (1.0 + math.erf(x * SQRT05))) / z
+                    if sf < 0.:
+                        sf = 0.
+                    elif sf > 1.:
+                        sf = 1.
+                    poe = F32(sf)  # the poes array is float32
+                    arr[sidx, m * L1 + lvl, g] *= math.exp(-rate * poe * itime)
+
+
 @compile(sig_i)
 def update_pmap_r(arr, poes, rates, probs_occur, sidxs, itime):
     G = arr.shape[2]
@@ -426,6 +464,15 @@ class MapArray(object):
         else:
             update_pmap_i(self.array, poes, rates, ctxt.probs_occur, sidxs, itime)
 
+    def update_fused(self, mean_std, loglevels, phi_b, ctxt, itime):
+        """
+        Update probabilities for independent poissonian ruptures, starting
+        from the mean and stddevs, without storing the PoEs
+        """
+        sidxs = self.sidx[ctxt.sids]
+        update_pmap_fused(self.array, mean_std, loglevels, phi_b,
+                          ctxt.occurrence_rate, sidxs, itime)
+
     def update_mutex(self, poes, ctxt, itime, mutex_weight):
         """
         Update probabilities for mutex ruptures
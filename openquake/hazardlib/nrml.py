@@ -72,6 +72,7 @@ this is a job for the Node class which can be subclassed and
 supplemented by a dictionary of validators.
 """
 import io
+import os
 import re
 import sys
 import operator
@@ -79,7 +80,7 @@ import collections.abc
 
 import numpy
 
-from openquake.baselib import hdf5
+from openquake.baselib import hdf5, config
 from openquake.baselib.general import CallableDict, groupby, gettemp
 from openquake.baselib.node import (
     node_to_xml, Node, striptag, ValidatingXmlParser, floatformat)
@@ -192,6 +193,33 @@ def get_geometry_model(node, fname, converter):
     return GeometryModel(converter.convert_node(node))
 
 
+def _source_model_04(node, sources, converter):
+    # build a SourceModel by grouping the sources by tectonic region type
+    groups = groupby(
+        sources, operator.attrgetter('tectonic_region_type'))
+    src_groups = sorted(sourceconverter.SourceGroup(
+        trt, srcs, min_mag=converter.minimum_magnitude)
+                        for trt, srcs in groups.items())
+    return SourceModel(src_groups, node.get('name', ''))
+
+
+def _source_model_05(node, groups):
+    # build a SourceModel from the source groups
+    itime = node.get('investigation_time')
+    if itime is not None:
+        itime = valid.positivefloat(itime)
+    stime = node.get('start_time')
+    if stime is not None:
+        stime = valid.positivefloat(stime)
+    return SourceModel(sorted(groups), node.get('name'), itime, stime)
+
+
+WRONG_NS_MSG = (
+    '%s: you have an incorrect declaration '
+    'xmlns="http://openquake.org/xmlns/nrml/0.5"; it should be '
+    'xmlns="http://openquake.org/xmlns/nrml/0.4"')
+
+
 @node_to_obj.add(('sourceModel', 'nrml/0.4'))
 def get_source_model_04(node, fname, converter=default):
     sources = []
@@ -201,38 +229,87 @@ def get_source_model_04(node, fname, converter=default):
         if src is None:
             continue
         sources.append(src)
-    groups = groupby(
-        sources, operator.attrgetter('tectonic_region_type'))
-    src_groups = sorted(sourceconverter.SourceGroup(
-        trt, srcs, min_mag=converter.minimum_magnitude)
-                        for trt, srcs in groups.items())
-    return SourceModel(src_groups, node.get('name', ''))
+    return _source_model_04(node, sources, converter)
 
 
 @node_to_obj.add(('sourceModel', 'nrml/0.5'))
 def get_source_model_05(node, fname, converter=default):
     converter.fname = fname
-    source_ids = []
     groups = []  # expect a sequence of sourceGroup nodes
     for src_group in node:
         if 'sourceGroup' not in src_group.tag:
-            raise InvalidFile(
-                '%s: you have an incorrect declaration '
-                'xmlns="http://openquake.org/xmlns/nrml/0.5"; it should be '
-                'xmlns="http://openquake.org/xmlns/nrml/0.4"' % fname)
+            raise InvalidFile(WRONG_NS_MSG % fname)
         sg = converter.convert_node(src_group)
         if sg and len(sg):
             # a source group can be empty if the source_id filtering is on
-            for src in sg:
-                source_ids.append(src.source_id)
             groups.append(sg)
-    itime = node.get('investigation_time')
-    if itime is not None:
-        itime = valid.positivefloat(itime)
-    stime = node.get('start_time')
-    if stime is not None:
-        stime = valid.positivefloat(stime)
-    return SourceModel(sorted(groups), node.get('name'), itime, stime)
+    return _source_model_05(node, groups)
+
+
+def _detach(tag):
+    # nodes to convert and discard while streaming a source model file
+    return tag.endswith('Source') or tag == 'section'
+
+
+def _stream_to_python(fname, converter):
+    pairs = []  # (source node without subnodes, source) or (sec_id, section)
+    groups = []
+    obj = None
+    if converter.discard_trts:
+        def skip(node):  # the source groups of the discarded TRTs
+            return (node.tag.endswith('sourceGroup') and
+                    node.get('tectonicRegion') in converter.discard_trts)
+    else:
+        skip = None
+    parser = ValidatingXmlParser(validators)
+    for node in parser.iterparse(fname, _detach, skip=skip):
+        tag = striptag(node.tag)
+        if tag == 'section':
+            pairs.append((node['id'], converter.convert_node(node)))
+        elif _detach(tag):
+            stub = Node(node.tag, node.attrib, lineno=node.lineno)
+            pairs.append((stub, converter.convert_node(node)))
+        elif tag == 'sourceGroup':
+            sg = converter.convert_sourceGroup(node, pairs)
+            if sg and len(sg):
+                groups.append(sg)
+            pairs = []
+        elif tag in ('sourceModel', 'geometryModel'):
+            key = get_tag_version(node)
+            if key == ('sourceModel', 'nrml/0.4'):
+                obj = _source_model_04(
+                    node, [src for _, src in pairs if src is not None],
+                    converter)
+            elif key == ('sourceModel', 'nrml/0.5'):
+                if pairs:
+                    raise InvalidFile(WRONG_NS_MSG % fname)
+                obj = _source_model_05(node, groups)
+            elif key == ('geometryModel', 'nrml/0.5'):
+                obj = GeometryModel(dict(pairs))
+            else:
+                raise InvalidFile('%s: unexpected %s' % (fname, node.tag))
+        elif tag != 'nrml':  # the root node
+            raise ValueError('%s: expected a node of kind nrml, got %s' %
+                             (fname, node.tag))
+        elif obj is None:  # nothing was detached, convert the full tree
+            node['xmlns'] = node.tag.split('}')[0][1:]
+            node['xmlns:gml'] = GML_NAMESPACE
+            [model] = node
+            obj = node_to_obj(model, fname, converter)
+    return obj
+
+
+def stream_to_python(fname, converter):
+    """
+    Convert a source model file (or a geometry model file) without keeping
+    the full node tree in memory: each source (or section) node is converted
+    as soon as it is parsed and then discarded. The result is the same as
+    `to_python(fname, converter)`, which is used for other kinds of files.
+    The source groups of the tectonic regions in `converter.discard_trts`
+    are skipped while parsing, so their sources are never converted.
+    """
+    converter.fname = fname
+    return _stream_to_python(fname, converter)
 
 
 validators = {
@@ -330,10 +407,19 @@ def read_source_models(fnames, converter):
         a :class:`openquake.hazardlib.sourceconverter.SourceConverter` instance
     :yields:
         SourceModel instances
+
+    The files larger than `stream_sources_mb` (in the [performance] section
+    of openquake.cfg) are converted with :func:`stream_to_python`, which
+    is slower than :func:`to_python` but needs less memory.
     """
+    stream_mb = config.performance.get('stream_sources_mb')
     for fname in fnames:
         if fname.endswith(('.xml', '.nrml')):
-            sm = to_python(fname, converter)
+            if stream_mb and os.path.getsize(fname) > float(
+                    stream_mb) * 1024**2:
+                sm = stream_to_python(fname, converter)
+            else:
+                sm = to_python(fname, converter)
         else:
             raise ValueError('Unrecognized extension in %s' % fname)
         sm.fname = fname
@@ -22,7 +22,7 @@ Module :mod:`openquake.hazardlib.site` defines :class:`Site`.
 
 import numpy
 import pandas
-from scipy.spatial import distance
+from scipy.spatial import distance, KDTree
 from shapely import geometry
 from openquake.baselib import hdf5
 from openquake.baselib.general import not_equal, get_duplicates, cached_property
@@ -33,6 +33,7 @@ from openquake.hazardlib.geo.geodetic import npoints_towards
 from openquake.hazardlib.geo.mesh import Mesh
 
 U32LIMIT = 2 ** 32
+BBOX_INDEX_MIN_SITES = 1000  # below this number a scan is fast enough
 ampcode_dt = (numpy.bytes_, 4)
 param = dict(
     vs30measured='reference_vs30_type',
@@ -126,6 +127,85 @@ class TileGetter:
         return sc
 
 
+def scan_bbox(lons, lats, bbox):
+    """
+    :param lons: an array of longitudes
+    :param lats: an array of latitudes
+    :param bbox: a quartet (min_lon, min_lat, max_lon, max_lat)
+    :returns: the indices of the points within the bounding box
+    """
+    min_lon, min_lat, max_lon, max_lat = bbox
+    if cross_idl(lons.min(), lons.max(), min_lon, max_lon):
+        lons = lons % 360
+        min_lon, max_lon = min_lon % 360, max_lon % 360
+    mask = (min_lon < lons) * (lons < max_lon) * \
+           (min_lat < lats) * (lats < max_lat)
+    return mask.nonzero()[0]
+
+
+class BBoxIndex(object):
+    """
+    A regular grid in (lon, lat) storing the indices of the sites in each
+    cell, used to answer bounding box queries by scanning only the sites
+    in the cells intersecting the bounding box. The cells contain around
+    `per_cell` sites on average.
+
+    :param array: a structured array with fields lon, lat
+    """
+    def __init__(self, array, per_cell=16):
+        self.array = array
+        self.lons = lons = array['lon']
+        self.lats = lats = array['lat']
+        self.min_lon, self.max_lon = lons.min(), lons.max()
+        self.min_lat, self.max_lat = lats.min(), lats.max()
+        area = max(self.max_lon - self.min_lon, .01) * max(
+            self.max_lat - self.min_lat, .01)
+        self.cellsize = max(numpy.sqrt(area * per_cell / len(array)), .01)
+        self.nx = int((self.max_lon - self.min_lon) // self.cellsize) + 1
+        self.ny = int((self.max_lat - self.min_lat) // self.cellsize) + 1
+        cells = self._ix(lons) * self.ny + self._iy(lats)
+        self.idxs = numpy.argsort(cells, kind='stable')
+        # offsets of the cells, i.e. cell c has the sites
+        # self.idxs[self.offsets[c]:self.offsets[c + 1]]
+        self.offsets = numpy.searchsorted(
+            cells[self.idxs], numpy.arange(self.nx * self.ny + 1))
+        # coordinates sorted by cell, so that the queries read contiguous data
+        self.clons = lons[self.idxs]
+        self.clats = lats[self.idxs]
+
+    def _ix(self, lons):
+        return numpy.int64((lons - self.min_lon) // self.cellsize)
+
+    def _iy(self, lats):
+        return numpy.int64((lats - self.min_lat) // self.cellsize)
+
+    def query(self, bbox):
+        """
+        :param bbox: a quartet (min_lon, min_lat, max_lon, max_lat)
+        :returns: the (sorted) indices of the sites within the bounding box
+        """
+        min_lon, min_lat, max_lon, max_lat = bbox
+        if cross_idl(self.min_lon, self.max_lon, min_lon, max_lon):
+            return scan_bbox(self.lons, self.lats, bbox)
+        if (max_lon < self.min_lon or min_lon > self.max_lon or
+                max_lat < self.min_lat or min_lat > self.max_lat):
+            return numpy.zeros(0, int)
+        x0, x1 = numpy.clip(self._ix(numpy.array([min_lon, max_lon])),
+                            0, self.nx - 1)
+        y0, y1 = numpy.clip(self._iy(numpy.array([min_lat, max_lat])),
+                            0, self.ny - 1)
+        # the cells of each column are contiguous
+        starts = self.offsets[numpy.arange(x0, x1 + 1) * self.ny + y0]
+        stops = self.offsets[numpy.arange(x0, x1 + 1) * self.ny + y1 + 1]
+        slices = [slice(start, stop) for start, stop in zip(starts, stops)]
+        lons = numpy.concatenate([self.clons[slc] for slc in slices])
+        lats = numpy.concatenate([self.clats[slc] for slc in slices])
+        ok = (min_lon < lons) & (lons < max_lon) & (
+            min_lat < lats) & (lats < max_lat)
+        idxs = numpy.concatenate([self.idxs[slc] for slc in slices])
+        return numpy.sort(idxs[ok])
+
+
 class Site(object):
     """
     Site object represents a geographical location defined by its position
@@ -727,14 +807,31 @@ class SiteCollection(object):
         :returns:
             site IDs within the bounding box
         """
-        min_lon, min_lat, max_lon, max_lat = bbox
-        lons, lats = self['lon'], self['lat']
-        if cross_idl(lons.min(), lons.max(), min_lon, max_lon):
-            lons = lons % 360
-            min_lon, max_lon = min_lon % 360, max_lon % 360
-        mask = (min_lon < lons) * (lons < max_lon) * \
-               (min_lat < lats) * (lats < max_lat)
-        return mask.nonzero()[0]
+        if len(self) < BBOX_INDEX_MIN_SITES:
+            return scan_bbox(self['lon'], self['lat'], bbox)
+        return self.bbox_index.query(bbox)
+
+    @property
+    def bbox_index(self):
+        """
+        A :class:`BBoxIndex` built the first time it is accessed and rebuilt
+        if the underlying array changes
+        """
+        index = self.__dict__.get('_bbox_index')
+        if index is None or index.array is not self.array:
+            index = self.__dict__['_bbox_index'] = BBoxIndex(self.array)
+        return index
+
+    @property
+    def kdtree(self):
+        """
+        A KDTree on the cartesian coordinates of the sites, built the first
+        time it is accessed and rebuilt if the underlying array changes
+        """
+        pair = self.__dict__.get('_kdtree')
+        if pair is None or pair[0] is not self.array:
+            pair = self.__dict__['_kdtree'] = (self.array, KDTree(self.xyz))
+        return pair[1]
 
     def extend(self, lons, lats):
         """
@@ -27,7 +27,8 @@ from openquake.hazardlib.pmf import PMF
 from openquake.hazardlib.tom import PoissonTOM
 from openquake.hazardlib.calc.filters import magstr, split_source
 from openquake.hazardlib.geo import Point
-from openquake.hazardlib.geo.surface.planar import build_planar, PlanarSurface
+from openquake.hazardlib.geo.surface.planar import (
+    build_planar_flat, PlanarSurface)
 from openquake.hazardlib.geo.surface.multi import MultiSurface
 from openquake.hazardlib.source.rupture import (
     ParametricProbabilisticRupture, NonParametricProbabilisticRupture,
@@ -109,34 +110,76 @@ def poisson_sample(src, eff_num_ses, seed):
         return
 
     # else (multi)point sources and area sources
-    usd = src.upper_seismogenic_depth
-    lsd = src.lower_seismogenic_depth
-    rup_args = []
-    rates = []
+    dic = sample_planar(src, eff_num_ses, seed)
+    hypos = [Point(*hypo) for hypo in dic['hypo']]
+    for k, rupid in enumerate(dic['rup_id']):
+        rup = ParametricProbabilisticRupture(
+            dic['mag'][k], dic['rake'][k], src.tectonic_region_type,
+            hypos[k], PlanarSurface.from_(dic['planar'][k]),
+            dic['rate'][k], tom)
+        yield rup, rupid, dic['n_occ'][k]
+
+
+def sample_planar(src, eff_num_ses, seed):
+    """
+    Sample the ruptures of a poissonian (multi)point or area source without
+    instantiating rupture objects: the number of occurrences are drawn on
+    the flat vector of rates and the planar surfaces of the occurring
+    ruptures are built in a single call. The random numbers are the same
+    as in the rupture-by-rupture approach.
+
+    :param src: a poissonian source with a nodal plane distribution
+    :param eff_num_ses: number of stochastic event sets * number of samples
+    :param seed: stochastic seed
+    :returns: a dictionary of K-dimensional arrays, K being the number
+              of ruptures occurring at least once
+    """
+    rng = numpy.random.default_rng(seed)
+    tom = src.temporal_occurrence_model
+    npd = src.nodal_plane_distribution.data
+    hdd = src.hypocenter_distribution.data
+    np_probs = numpy.array([prob for prob, np in npd])
+    hc_probs = numpy.array([prob for prob, dep in hdd])
+    N, D = len(npd), len(hdd)
+    rates, mags, lonlats = [], [], []
     for ps in split_source(src):
         if not hasattr(ps, 'location'):  # unsplit containing a single source
             [ps] = src
-        lon, lat = ps.location.x, ps.location.y
-        for mag, mag_occ_rate in ps.get_annual_occurrence_rates():
-            for np_prob, np in ps.nodal_plane_distribution.data:
-                for hc_prob, hc_depth in ps.hypocenter_distribution.data:
-                    args = (mag_occ_rate, np_prob, hc_prob,
-                            mag, np, lon, lat, hc_depth, ps)
-                    rup_args.append(args)
-                    rates.append(mag_occ_rate * np_prob * hc_prob)
-    eff_rates = numpy.array(rates) * tom.time_span * eff_num_ses
-    occurs = rng.poisson(eff_rates)
-    for num_occ, args, rupid, rate in zip(occurs, rup_args, rupids, rates):
-        if num_occ:
-            _, np_prob, hc_prob, mag, np, lon, lat, hc_depth, ps = args
-            hc = Point(lon, lat, hc_depth)
-            hdd = numpy.array([(1., hc.depth)])
-            [[[planar]]] = build_planar(
-                ps.get_planin([(1., mag)], [(1., np)]), hdd, lon, lat, usd, lsd)
-            rup = ParametricProbabilisticRupture(
-                mag, np.rake, ps.tectonic_region_type, hc,
-                PlanarSurface.from_(planar), rate, tom)
-            yield rup, rupid, num_occ
+        mag, mrate = numpy.array(
+            ps.get_annual_occurrence_rates(), float).reshape(-1, 2).T
+        rates.append((mrate[:, None, None] * np_probs[None, :, None] *
+                      hc_probs[None, None, :]).ravel())
+        mags.append(mag)
+        lonlats.append((ps.location.x, ps.location.y))
+    rates = numpy.concatenate(rates)
+    occurs = rng.poisson(rates * tom.time_span * eff_num_ses)
+    [idxs] = occurs[:src.num_ruptures].nonzero()
+    K = len(idxs)
+    if K == 0:
+        return dict(rup_id=idxs, n_occ=idxs, mag=numpy.zeros(0),
+                    rake=numpy.zeros(0), rate=numpy.zeros(0),
+                    hypo=numpy.zeros((0, 3)), planar=())
+
+    # decode the flat indices into (point, magnitude, plane, depth) indices
+    mag_start = numpy.cumsum([0] + [len(mag) for mag in mags])
+    ps_idx = numpy.searchsorted(mag_start * N * D, idxs, 'right') - 1
+    m, nd = numpy.divmod(idxs - mag_start[ps_idx] * N * D, N * D)
+    n, d = numpy.divmod(nd, D)
+    mag = numpy.concatenate(mags)[mag_start[ps_idx] + m]
+    umags, uinv = numpy.unique(mag, return_inverse=True)
+    planin = ps.get_planin([(1., umag) for umag in umags], npd)[uinv, n]
+    hypo = numpy.zeros((K, 3))
+    hypo[:, :2] = numpy.array(lonlats).reshape(-1, 2)[ps_idx]
+    hypo[:, 2] = numpy.array([dep for prob, dep in hdd])[d]
+    sdr = numpy.zeros((K, 3))
+    sdr[:, 0] = planin.strike
+    sdr[:, 1] = planin.dip
+    sdr[:, 2] = planin.rake
+    planar = build_planar_flat(
+        mag, planin.dims, sdr, hypo,
+        src.upper_seismogenic_depth, src.lower_seismogenic_depth)
+    return dict(rup_id=src.offset + idxs, n_occ=occurs[idxs], mag=mag,
+                rake=planin.rake, rate=rates[idxs], hypo=hypo, planar=planar)
 
 
 def timedep_sample(src, eff_num_ses, seed):
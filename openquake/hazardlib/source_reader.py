@@ -19,11 +19,13 @@
 import zlib
 import os.path
 import pickle
+import hashlib
 import operator
 import logging
 import numpy
 
-from openquake.baselib import parallel, general, hdf5, python3compat, config
+from openquake.baselib import (
+    parallel, general, hdf5, python3compat, config, __version__)
 from openquake.hazardlib import nrml, sourceconverter, InvalidFile, calc
 from openquake.hazardlib.source.multi_fault import save_and_split
 from openquake.hazardlib.source.point import msr_name
@@ -32,6 +34,7 @@ from openquake.hazardlib.lt import apply_uncertainties
 
 U16 = numpy.uint16
 TWO16 = 2 ** 16  # 65,536
+TWO20 = 2 ** 20  # 1,048,576
 TWO24 = 2 ** 24  # 16,777,216
 TWO30 = 2 ** 30  # 1,073,741,24
 TWO32 = 2 ** 32  # 4,294,967,296
@@ -151,6 +154,67 @@ def _sample(srcs, sample, applied):
     return (out + rand) or [srcs[0]]
 
 
+class SourceModelCache(object):
+    """
+    On-disk cache of the source models converted by
+    :func:`read_source_model`, stored as pickle files in a directory.
+    The key is a hash of the content of the XML file (and of the companion
+    .hdf5 file, if any), of the parameters of the SourceConverter and of
+    the engine version, so that changing any of them invalidates the entry.
+    """
+    @classmethod
+    def from_config(cls):
+        """
+        :returns: a SourceModelCache if `source_cache_dir` is set
+                  in openquake.cfg, otherwise None
+        """
+        dirname = config.performance.get('source_cache_dir')
+        if dirname:
+            return cls(os.path.expanduser(dirname))
+
+    def __init__(self, dirname):
+        self.dirname = dirname
+        os.makedirs(dirname, exist_ok=True)
+
+    def get_key(self, fname, converter):
+        """
+        :returns: a hex digest for the given file and converter
+        """
+        sha = hashlib.sha1(__version__.encode('ascii'))
+        params = sorted((k, v) for k, v in vars(converter).items()
+                        if k != 'fname')
+        sha.update(repr(params).encode('utf8'))
+        companion = os.path.splitext(fname)[0] + '.hdf5'
+        for path in (fname, companion):
+            if os.path.exists(path):
+                sha.update(os.path.splitext(path)[1].encode('utf8'))
+                with open(path, 'rb') as f:
+                    for chunk in iter(lambda: f.read(TWO20), b''):
+                        sha.update(chunk)
+        return sha.hexdigest()
+
+    def get(self, key):
+        """
+        :returns: the cached source model or None
+        """
+        fname = os.path.join(self.dirname, key + '.pik')
+        try:
+            with open(fname, 'rb') as f:
+                return pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return None
+
+    def put(self, key, sm):
+        """
+        Store the source model
+        """
+        fname = os.path.join(self.dirname, key + '.pik')
+        tmp = '%s.%d' % (fname, os.getpid())
+        with open(tmp, 'wb') as f:
+            pickle.dump(sm, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, fname)  # atomic, safe with concurrent workers
+
+
 def read_source_model(fname, branch, converter, applied, sample, monitor):
     """
     :param fname: path to a source model XML file
@@ -161,7 +225,19 @@ def read_source_model(fname, branch, converter, applied, sample, monitor):
     :param monitor: a Monitor instance
     :returns: a SourceModel instance
     """
-    [sm] = nrml.read_source_models([fname], converter)
+    cache = SourceModelCache.from_config()
+    sm = None
+    if cache:
+        key = cache.get_key(fname, converter)
+        sm = cache.get(key)
+    if sm is None:
+        [sm] = nrml.read_source_models([fname], converter)
+        if cache:
+            cache.put(key, sm)
+        sm.cached = 0
+    else:  # the model could have been cached from a copy of the file
+        sm.fname = fname
+        sm.cached = os.path.getsize(fname)  # bytes not parsed
     sm.branch = branch
     for sg in sm.src_groups:
         if sample and not sg.atomic:
@@ -277,6 +353,11 @@ def get_csm(oq, full_lt, dstore=None):
                               h5=dstore if dstore else None).reduce()
     parallel.Starmap.shutdown()  # save memory
     smdict = {k: smdict[k] for k in sorted(smdict)}
+    cached = [sm.cached for sm in smdict.values() if sm.cached]
+    if cached:
+        logging.info('Read %d source model file(s) from the cache, '
+                     'skipping the parsing of %s', len(cached),
+                     general.humansize(sum(cached)))
     check_duplicates(smdict, strict=oq.disagg_by_src)
 
     logging.info('Applying uncertainties')
@@ -1197,12 +1197,15 @@ class SourceConverter(RuptureConverter):
     def convert_sourceModel(self, node):
         return [self.convert_node(subnode) for subnode in node]
 
-    def convert_sourceGroup(self, node):
+    def convert_sourceGroup(self, node, src_pairs=None):
         """
         Convert the given node into a SourceGroup object.
 
         :param node:
             a node with tag sourceGroup
+        :param src_pairs:
+            if given, pairs (source node, source) already converted, used
+            in place of the subnodes of the group node
         :returns:
             a :class:`SourceGroup` instance
         """
@@ -1234,8 +1237,12 @@ class SourceConverter(RuptureConverter):
                 # hack in place of a ClusterPoissonTOM
                 assert hasattr(sg, 'occurrence_rate')
 
-        for src_node in node:
-            src = self.convert_node(src_node)
+        if src_pairs is None:
+            src_pairs = ((src_node, self.convert_node(src_node))
+                         for src_node in node)
+        nsrcs = 0
+        for src_node, src in src_pairs:
+            nsrcs += 1
             if src is None:  # filtered out by source_id
                 continue
             # transmit the group attributes to the underlying source
@@ -1255,10 +1262,10 @@ class SourceConverter(RuptureConverter):
         if sg and sg.src_interdep == 'mutex':
             # sg can be empty if source_id is specified and it is different
             # from any source in sg
-            if len(node) and len(srcs_weights) != len(node):
+            if nsrcs and len(srcs_weights) != nsrcs:
                 raise ValueError(
                     'There are %d srcs_weights but %d source(s) in %s'
-                    % (len(srcs_weights), len(node), self.fname))
+                    % (len(srcs_weights), nsrcs, self.fname))
             tot = 0
             with context(self.fname, node):
                 for src, sw in zip(sg, srcs_weights):
@@ -174,6 +174,45 @@ def std_curve(values, weights=None):
 cw_dt = numpy.dtype([('c', float), ('w', float)])
 
 
+def interp_columns(x, xp, fp):
+    """
+    Equivalent to `numpy.interp(x, xp[:, k], fp[:, k])` for each column k,
+    giving the same results bit by bit, but without a loop on the columns
+
+    :param x: a scalar
+    :param xp: an array of shape (R, K), non-decreasing on the first axis
+    :param fp: an array of shape (R, K)
+    :returns: an array of length K
+
+    >>> xp = numpy.array([[.2, .5], [.6, .5], [1., 1.]])
+    >>> fp = numpy.array([[1., 2.], [3., 4.], [5., 6.]])
+    >>> interp_columns(.5, xp, fp)
+    array([2.5, 4. ])
+    """
+    R, K = xp.shape
+    if R == 1:
+        return fp[0].copy()
+    # j is the index of the last xp <= x, as in numpy binary_search
+    j = (xp <= x).sum(axis=0) - 1
+    jj = numpy.clip(j, 0, R - 2)
+    cols = numpy.arange(K)
+    x0, x1 = xp[jj, cols], xp[jj + 1, cols]
+    y0, y1 = fp[jj, cols], fp[jj + 1, cols]
+    with numpy.errstate(all='ignore'):
+        slope = (y1 - y0) / (x1 - x0)
+        res = slope * (x - x0) + y0
+        # if we get nan in one direction, try the other
+        nan = numpy.isnan(res)
+        res[nan] = (slope * (x - x1) + y1)[nan]
+        nan = numpy.isnan(res) & (y0 == y1)
+        res[nan] = y0[nan]
+    exact = x0 == x  # avoid potential non-finite interpolation
+    res[exact] = y0[exact]
+    res[j == -1] = fp[0, j == -1]
+    res[j >= R - 1] = fp[-1, j >= R - 1]
+    return res
+
+
 # NB: for equal weights and sorted values the quantile is computed as
 # numpy.interp(q, [1/N, 2/N, ..., N/N], values)
 def quantile_curve(quantile, curves, weights=None):
@@ -203,15 +242,15 @@ def quantile_curve(quantile, curves, weights=None):
     else:
         weights = numpy.array(weights)
         assert len(weights) == R, (len(weights), R)
-    result = numpy.zeros(curves.shape[1:])
-    for idx, _ in numpy.ndenumerate(result):
-        cw = numpy.zeros(R, cw_dt)  # (curve, weight)
-        cw['c'] = curves[(slice(None), ) + idx]
-        cw['w'] = weights
-        cw.sort(order='c')
-        # get the quantile from the interpolated CDF
-        result[idx] = numpy.interp(quantile, cw['w'].cumsum(), cw['c'])
-    return result
+    # sort all the curves at once by value and then by weight, as it would
+    # happen by sorting a (curve, weight) composite array, then get the
+    # quantile from the interpolated CDF
+    cs = curves.reshape(R, -1).astype(float)
+    ws = numpy.broadcast_to(weights.astype(float)[:, None], cs.shape)
+    order = numpy.lexsort((ws, cs), axis=0)
+    cs = numpy.take_along_axis(cs, order, axis=0)
+    cumws = numpy.take_along_axis(ws, order, axis=0).cumsum(axis=0)
+    return interp_columns(quantile, cumws, cs).reshape(curves.shape[1:])
 
 
 # NB: this will be obsolete in numpy 2+
@@ -313,6 +313,36 @@ class SetUSGSTestCase(unittest.TestCase):
         plot_test_results(target_sitecol.lons, mu, sig, 0,
                           case_name)
 
+    def test_low_rank(self):
+        # with a rank not smaller than the number of target sites the
+        # low-rank decomposition U @ U.T + diag(d) is exact
+        rupture = test_data.RUP
+        cmaker = simple_cmaker([test_data.ZeroMeanGMM()], [],
+                               maximum_distance=test_data.MAX_DIST)
+        args = (rupture, cmaker, test_data.CASE10_STATION_SITECOL,
+                test_data.CASE10_STATION_DATA,
+                test_data.CASE10_OBSERVED_IMTS,
+                test_data.CASE10_TARGET_SITECOL,
+                test_data.CASE10_TARGET_IMTS,
+                test_data.DummySpatialCorrelationModel(),
+                test_data.DummyCrossCorrelationBetween(),
+                test_data.DummyCrossCorrelationWithin())
+        mea, sig, _tau, _phi = get_mean_covs(*args)
+        N = len(test_data.CASE10_TARGET_SITECOL)
+        for rank in (N, 100):
+            me, U, d = get_mean_covs(*args, rank=rank)
+            self.assertEqual(U.shape[-1], rank + 3)
+            numpy.testing.assert_array_equal(me, mea)
+            cov = U[0, 0] @ U[0, 0].T + numpy.diag(d[0, 0, :, 0])
+            # the variances are always exact
+            aac(numpy.diag(cov), numpy.diag(sig[0, 0]), atol=1e-8)
+            if rank == N:
+                aac(cov, sig[0, 0], atol=1e-6)
+            else:
+                # Nystrom approximation of the within-event covariance
+                err = numpy.linalg.norm(cov - sig[0, 0])
+                self.assertLess(err / numpy.linalg.norm(sig[0, 0]), .02)
+
 
 # Functions useful for debugging purposes. Recreates the plots on
 # https://usgs.github.io/shakemap/manual4_0/tg_verification.html
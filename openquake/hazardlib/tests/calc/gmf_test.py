@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright (C) 2025, GEM Foundation
+#
+# OpenQuake is free software: you can redistribute it and/or modify it
+# under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# OpenQuake is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with OpenQuake.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+from unittest.mock import Mock
+import numpy
+import pandas
+from openquake.baselib.general import gettemp
+from openquake.baselib.hdf5 import read_csv
+from openquake.hazardlib import valid, contexts, site, geo
+from openquake.hazardlib.site_amplification import Amplifier
+from openquake.hazardlib.source.rupture import EBRupture, build_planar
+from openquake.hazardlib.calc.gmf import GmfComputer, get_mean_stds_batch
+
+U32 = numpy.uint32
+
+ampl_func = '''#,,,,,,"vs30_ref=760"
+ampcode,PGA,SA(1.0),sigma_PGA,sigma_SA(1.0)
+A,1,1,0.3,0.3
+'''
+
+
+def make_computer(sitecol, cmaker, mag, seed, amplifier=None):
+    rup = build_planar(geo.point.Point(0, 0, 10), mag=mag, rake=0.)
+    ebr = EBRupture(rup, 0, 0, n_occ=30, id=seed)
+    ebr.seed = seed
+    return GmfComputer(ebr, sitecol, cmaker, amplifier=amplifier)
+
+
+class GmfBufferTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        lons, lats = numpy.meshgrid(numpy.linspace(-2, 2, 20),
+                                    numpy.linspace(-2, 2, 20))
+        cls.sitecol = site.SiteCollection.from_points(
+            lons.flatten(), lats.flatten(),
+            sitemodel=Mock(reference_vs30_value=760.))
+        rbg = {valid.gsim('BooreAtkinson2008'): U32([0, 2]),
+               valid.gsim('AkkarBommer2010'): U32([1])}
+        cls.cmaker = cmaker = contexts.simple_cmaker(
+            rbg, ['PGA', 'SA(1.0)'], truncation_level=3.)
+        cmaker.gid = [0, 1]
+        cmaker.min_iml = numpy.array([.02, .01])
+
+    def test_compute_into(self):
+        sitecol, cmaker = self.sitecol, self.cmaker
+        # filling a small buffer, which must grow, with two ruptures
+        dfs = []
+        buf = None
+        for mag, seed in [(6., 42), (6.5, 43)]:
+            dfs.append(make_computer(sitecol, cmaker, mag, seed).compute_all())
+            computer = make_computer(sitecol, cmaker, mag, seed)
+            if buf is None:
+                buf = computer.new_buffer(size=10)
+            nrows = computer.compute_into(buf)
+            self.assertEqual(nrows, len(dfs[-1]))
+        expected = pandas.concat(dfs)
+        self.assertGreater(len(expected), 0)
+        self.assertLess(len(expected), 2 * 30 * len(sitecol))  # stripped
+        gmfdata = buf.to_dict()
+        self.assertEqual(list(gmfdata), list(expected.columns))
+        for col, arr in gmfdata.items():
+            numpy.testing.assert_array_equal(arr, expected[col].to_numpy())
+
+    def test_mean_stds_batch(self):
+        # the GMFs must not change when computing the mean and stddevs
+        # for a batch of ruptures with different magnitudes
+        sitecol, cmaker = self.sitecol, self.cmaker
+        params = [(6., 42), (6.5, 43), (6., 44), (7., 45)]
+        computers = [make_computer(sitecol, cmaker, mag, seed)
+                     for mag, seed in params]
+        for computer, mean_stds in zip(
+                computers, get_mean_stds_batch(computers)):
+            self.assertEqual(mean_stds.shape, (4, 2, 2, len(sitecol)))
+            df = computer.compute_all(mean_stds)
+            expected = make_computer(
+                sitecol, cmaker, computer.ebrupture.rupture.mag,
+                computer.seed).compute_all()
+            for col in expected.columns:
+                numpy.testing.assert_array_equal(
+                    df[col].to_numpy(), expected[col].to_numpy())
+
+    def test_tiles(self):
+        # the GMFs must not depend on the tile size
+        rbg = {valid.gsim('BooreAtkinson2008'): U32([0, 2]),
+               valid.gsim('AkkarBommer2010'): U32([1])}
+        dfs = []
+        for tile_size in (37, 100, 1000):
+            cmaker = contexts.simple_cmaker(
+                rbg, ['PGA', 'SA(1.0)'], truncation_level=3.,
+                gmf_tile_size=tile_size)
+            cmaker.gid = [0, 1]
+            cmaker.min_iml = numpy.array([.02, .01])
+            computer = make_computer(self.sitecol, cmaker, 6.5, 43)
+            [mean_stds] = get_mean_stds_batch([computer])
+            if tile_size < len(self.sitecol):
+                self.assertIsNone(mean_stds)
+            df = computer.compute_all(mean_stds)
+            dfs.append(df.sort_values(['eid', 'sid']).reset_index(drop=True))
+            if tile_size == 37:
+                sig, eps = computer.sig, computer.eps
+            else:
+                numpy.testing.assert_array_equal(computer.sig, sig)
+                numpy.testing.assert_array_equal(computer.eps, eps)
+        self.assertGreater(len(dfs[0]), 0)
+        pandas.testing.assert_frame_equal(dfs[0], dfs[1])
+        pandas.testing.assert_frame_equal(dfs[0], dfs[2])
+
+    def test_tiles_amplified(self):
+        # the amplified GMFs are not split in tiles, since the noise of
+        # the amplification function is sampled per rupture
+        lons, lats = numpy.meshgrid(numpy.linspace(-2, 2, 20),
+                                    numpy.linspace(-2, 2, 20))
+        sitecol = site.SiteCollection.from_points(
+            lons.flatten(), lats.flatten(),
+            req_site_params=['vs30', 'ampcode'])
+        sitecol.array['vs30'] = 760.
+        sitecol.array['ampcode'] = b'A'
+        rbg = {valid.gsim('BooreAtkinson2008'): U32([0])}
+        df = read_csv(gettemp(ampl_func),
+                      {'ampcode': site.ampcode_dt, None: numpy.float64},
+                      index='ampcode')
+        dfs = []
+        for tile_size in (0, 37):
+            cmaker = contexts.ContextMaker('*', rbg, dict(
+                imtls={'PGA': [0], 'SA(1.0)': [0]}, truncation_level=3.,
+                gmf_tile_size=tile_size), extraparams=['ampcode'])
+            cmaker.gid = [0]
+            cmaker.min_iml = numpy.array([.02, .01])
+            amplifier = Amplifier(cmaker.imtls, df)
+            computer = make_computer(sitecol, cmaker, 6.5, 43, amplifier)
+            self.assertEqual(computer.tile_size, 0)
+            dfs.append(computer.compute_all())
+        self.assertGreater(len(dfs[0]), 0)
+        pandas.testing.assert_frame_equal(dfs[0], dfs[1])
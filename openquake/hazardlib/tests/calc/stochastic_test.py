@@ -16,9 +16,14 @@
 import os
 import unittest
 import numpy
-from openquake.hazardlib import nrml, contexts
-from openquake.hazardlib.calc.stochastic import sample_ruptures
+from openquake.hazardlib import nrml, contexts, site
+from openquake.hazardlib.geo import Point, Polygon, NodalPlane
+from openquake.hazardlib.pmf import PMF
+from openquake.hazardlib.calc.filters import SourceFilter, magdepdist
+from openquake.hazardlib.calc.stochastic import (
+    sample_ruptures, get_rup_array, get_planar_rups)
 from openquake.hazardlib.gsim.si_midorikawa_1999 import SiMidorikawa1999SInter
+from openquake.hazardlib.tests.source.area_test import make_area_source
 
 aae = numpy.testing.assert_almost_equal
 
@@ -46,3 +51,30 @@ class StochasticEventSetTestCase(unittest.TestCase):
         # test no filtering
         ruptures = sum(sample_ruptures(group, cmaker), {})['rup_array']
         self.assertEqual(len(ruptures), 7)
+
+    def test_planar_rups(self):
+        # the fast lane for area sources must produce the same records
+        # and geometries as the conversion of the EBRuptures
+        src = make_area_source(
+            Polygon([Point(-1, -1), Point(1, -1), Point(1, 1), Point(-1, 1)]),
+            discretization=20.,
+            nodal_plane_distribution=PMF([(.6, NodalPlane(0, 90, 0)),
+                                          (.4, NodalPlane(45, 30, 90))]))
+        src.id = 1
+        src.trt_smr = 0
+        src.offset = 0
+        src.smweight = 1
+        src.num_ruptures = src.count_ruptures()
+        sitecol = site.SiteCollection.from_points(
+            numpy.array([0., 1.5, 2.]), numpy.array([0., 0., 0.]))
+        srcfilter = SourceFilter(sitecol, magdepdist([(5, 10), (7, 50)]))
+        expected = get_rup_array(
+            list(src.sample_ruptures(10, 42)), srcfilter)
+        arr, geoms = get_planar_rups(src, 10, 42, srcfilter)
+        got = get_rup_array([], srcfilter, planars=[(arr, geoms)])
+        self.assertGreater(len(got), 0)
+        self.assertLess(len(got), src.num_ruptures)  # some are filtered
+        for name in expected.dtype.names:
+            numpy.testing.assert_array_equal(got[name], expected[name])
+        numpy.testing.assert_array_equal(
+            numpy.array(list(got.geom)), numpy.array(list(expected.geom)))
@@ -17,15 +17,19 @@
 # along with OpenQuake.  If not, see <http://www.gnu.org/licenses/>.
 
 import os
+import tempfile
 import unittest
+import unittest.mock as mock
 import numpy
 
 from openquake.baselib.general import DictArray, gettemp
 from openquake.hazardlib import site
 from openquake.hazardlib.pmf import PMF
 from openquake.hazardlib.const import TRT
-from openquake.hazardlib.tom import PoissonTOM
-from openquake.hazardlib.contexts import Effect, ContextMaker, get_distances
+from openquake.hazardlib.map_array import MapArray
+from openquake.hazardlib.tom import PoissonTOM, FatedTOM
+from openquake.hazardlib.contexts import (
+    Effect, ContextMaker, MeanStdCache, get_distances)
 from openquake.hazardlib import valid
 from openquake.hazardlib.geo.surface import SimpleFaultSurface as SFS
 from openquake.hazardlib.source.multi_fault import save_and_split
@@ -293,6 +297,96 @@ class GetCtxs02TestCase(unittest.TestCase):
         self.assertAlmostEqual(dst, self.ctx.ry0, delta=1e-3)
 
 
+class MeanStdCacheTestCase(unittest.TestCase):
+    def test(self):
+        s = site.Site(Point(0, 0), vs30=760,
+                      vs30measured=False, z1pt0=20, z2pt5=30)
+        rup = get_planar(s, WC1994(), 5., 1., 0., 90., 45,
+                         TRT.ACTIVE_SHALLOW_CRUST)
+        cm = ContextMaker(TRT.ACTIVE_SHALLOW_CRUST, [AbrahamsonEtAl2014()],
+                          dict(imtls={'PGA': [], 'SA(1.0)': []}))
+        ctx = cm.from_planar(rup, hdist=100, step=5)
+        expected = cm.get_mean_stds([ctx])
+        with tempfile.TemporaryDirectory() as tmp:
+            cm.mean_std_cache = MeanStdCache(tmp, max_mb=1)
+            aac(cm.get_mean_stds([ctx]), expected)  # miss
+            aac(cm.get_mean_stds([ctx]), expected)  # hit
+            self.assertEqual(cm.miss_mon.counts, 1)
+            self.assertEqual(cm.hit_mon.counts, 1)
+
+            # the site IDs do not enter in the key
+            ctx.sids += 1
+            aac(cm.get_mean_stds([ctx]), expected)
+            self.assertEqual(cm.hit_mon.counts, 2)
+
+            # changing a distance gives a miss
+            ctx.rrup += 1
+            cm.get_mean_stds([ctx])
+            self.assertEqual(cm.miss_mon.counts, 2)
+
+            # upgrading the engine gives a miss
+            with mock.patch('openquake.hazardlib.contexts.__version__',
+                            'new version'):
+                cm.get_mean_stds([ctx])
+            self.assertEqual(cm.miss_mon.counts, 3)
+
+            # changing the code of the GMPE gives a miss
+            with mock.patch('openquake.hazardlib.contexts.source_hash',
+                            lambda cls: b'new code'):
+                cm.get_mean_stds([ctx])
+            self.assertEqual(cm.miss_mon.counts, 4)
+
+            # LRU: when storing a third entry the other two are removed
+            # since each entry takes 4 * M * N * 8 bytes
+            cm.mean_std_cache = MeanStdCache(tmp, 1.5 * 64 * len(ctx) / 2**20)
+            ctx.rrup += 1
+            cm.get_mean_stds([ctx])
+            self.assertEqual(len(os.listdir(tmp)), 1)
+        cm.mean_std_cache = None
+
+
+class FusedPoesTestCase(unittest.TestCase):
+    def test(self):
+        # the fused kernel must give exactly the same probabilities
+        trt = TRT.ACTIVE_SHALLOW_CRUST
+        mfd = ArbitraryMFD([5.5, 6.0, 6.5, 7.0], [.01, .005, .001, .0001])
+        npd = PMF([(.5, NodalPlane(0., 45., 90.)),
+                   (.5, NodalPlane(90., 90., 0.))])
+        hdd = PMF([(.5, 5.), (.5, 10.)])
+        src = PointSource("ps", "pointsource", trt, mfd, 2., WC1994(), 1.,
+                          PoissonTOM(50.), 0., 20., Point(0., 0.), npd, hdd)
+        lons, lats = numpy.meshgrid(numpy.linspace(-.5, .5, 10),
+                                    numpy.linspace(-.5, .5, 10))
+        sites = SiteCollection.from_points(
+            lons.flatten(), lats.flatten(), req_site_params=['vs30'])
+        sites.array['vs30'] = 760.
+        gsims = [valid.gsim('BooreAtkinson2008'),
+                 valid.gsim('ChiouYoungs2008')]
+        imtls = {'PGA': numpy.logspace(-3, 0, 10),
+                 'SA(1.0)': numpy.logspace(-3, 0, 10)}
+        cmaker = ContextMaker(trt, gsims, dict(
+            imtls=imtls, truncation_level=3., investigation_time=50.))
+        ctxs = cmaker.from_srcs([src], sites)
+        pmap = MapArray(sites.sids, 20, 2)
+        fused = cmaker.get_pmap(ctxs).array
+        self.assertTrue(cmaker._fusable(pmap, ctxs[0]))
+        cmaker.fused = False
+        regular = cmaker.get_pmap(ctxs).array
+        self.assertGreater(regular.max(), 0)
+        numpy.testing.assert_array_equal(fused, regular)
+
+        # the fused kernel is not used with the FatedTOM, where the
+        # probability of no exceedance of each rupture is 1 - poe
+        cmaker.fused = True
+        fated = cmaker.get_pmap(ctxs, FatedTOM(0)).array
+        self.assertFalse(cmaker._fusable(pmap, ctxs[0]))
+        pnes = numpy.ones_like(fated)
+        for poes, _mea, _sig, ctxt in cmaker.gen_poes(ctxs[0]):
+            for poe, sid in zip(poes, ctxt.sids):
+                pnes[sid] *= 1. - poe
+        numpy.testing.assert_allclose(fated, 1. - pnes, atol=1E-6)
+
+
 class PlanarDistancesTestCase(unittest.TestCase):
     """
     Test for calculation of planar distances
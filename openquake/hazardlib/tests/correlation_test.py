@@ -14,6 +14,7 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 import unittest
+from unittest.mock import Mock
 
 import numpy
 
@@ -298,3 +299,49 @@ class HM2018ApplyCorrelationTestCase(unittest.TestCase):
              [[1.        , 0.3807, 0.5066],
               [0.3807, 1.        , 0.3075],
               [0.5066, 0.3075, 1.        ]], 2)
+
+
+def random_sitecol(N, seed=42):
+    # N sites in a square of ~110 x 110 km
+    rng = numpy.random.default_rng(seed)
+    return SiteCollection.from_points(
+        rng.uniform(0, 1, N), rng.uniform(0, 1, N),
+        sitemodel=Mock(reference_vs30_value=760.))
+
+
+class VecchiaFactorTestCase(unittest.TestCase):
+    def test_exact(self):
+        # with all the neighbours the exact Cholesky factor is recovered
+        sitecol = random_sitecol(200)
+        cormo = JB2009CorrelationModel(False)
+        lt = cormo.get_lower_triangle_correlation_matrix(sitecol, PGA())
+        cormo = JB2009CorrelationModel(False, cutoff_distance=1000,
+                                       max_neighbours=200)
+        corma = cormo.get_lower_triangle_correlation_matrix(sitecol, PGA())
+        aaae(corma @ numpy.eye(200), lt)
+
+    def test_accuracy(self):
+        # the covariance implied by the neighbour-limited factor is close
+        # to the dense correlation matrix on 2000 sites
+        sitecol = random_sitecol(2000)
+        for imt, cutoff, k, delta in [(PGA(), 30, 60, .005),
+                                      (SA(1.0), 50, 30, .05)]:
+            dense = JB2009CorrelationModel(False)._get_correlation_matrix(
+                sitecol, imt)
+            cormo = JB2009CorrelationModel(False, cutoff, k)
+            lt = cormo.get_lower_triangle_correlation_matrix(sitecol, imt)
+            self.assertEqual(lt.nbrs.shape, (2000, k))
+            corma = lt @ numpy.eye(2000)
+            self.assertLess(numpy.abs(corma @ corma.T - dense).max(), delta)
+
+    def test_apply_filtered(self):
+        sitecol = random_sitecol(100)
+        filtered = sitecol.filtered(numpy.arange(0, 100, 3))
+        eps = numpy.random.default_rng(42).normal(size=(len(filtered), 5))
+        phi = numpy.linspace(.5, .7, len(filtered))
+        for cls, imt in [(JB2009CorrelationModel, PGA()),
+                         (HM2018CorrelationModel, SA(1.0))]:
+            expected = cls(0).apply_correlation(filtered, imt, eps, phi)
+            got = cls(0, cutoff_distance=1000, max_neighbours=100
+                      ).apply_correlation(filtered, imt, eps, phi)
+            aaae(got, expected)
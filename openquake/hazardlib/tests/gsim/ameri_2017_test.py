@@ -22,7 +22,7 @@ GMPE of Ameri et al (2017)
 """
 from openquake.hazardlib.tests.gsim.utils import BaseGSIMTestCase
 import pathlib
-from openquake.hazardlib import gsim
+from openquake.hazardlib.gsim import ameri_2017
 import numpy as np
 
 
@@ -42,7 +42,7 @@ class AmeriEtAl2017RjbTestCase(BaseGSIMTestCase):
     distance is the preferred distance metric, and standard deviation
     is provided using the heteroscedastic formulation
     """
-    GSIM_CLASS = gsim.ameri_2017.AmeriEtAl2017Rjb
+    GSIM_CLASS = ameri_2017.AmeriEtAl2017Rjb
     # File containing the results for the Mean
     MEAN_FILE = "AMERI2017/A17_Rjb_Heteroscedastic_MEAN.csv"
     # File contaning the results for the Total Standard Deviation
@@ -67,7 +67,7 @@ class AmeriEtAl2017RepiTestCase(AmeriEtAl2017RjbTestCase):
     distance is the preferred distance metric, and standard deviation
     is provided using the heteroscedastic formulation
     """
-    GSIM_CLASS = gsim.ameri_2017.AmeriEtAl2017Repi
+    GSIM_CLASS = ameri_2017.AmeriEtAl2017Repi
     MEAN_FILE = "AMERI2017/A17_Repi_Heteroscedastic_MEAN.csv"
     STD_FILE = "AMERI2017/A17_Repi_Heteroscedastic_TOTAL_STDDEV.csv"
     INTER_FILE = "AMERI2017/A17_Repi_Heteroscedastic_INTER_EVENT_STDDEV.csv"
@@ -85,7 +85,7 @@ class AmeriEtAl2017RjbStressDropTestCase(BaseGSIMTestCase):
     distance is the preferred distance metric, and standard deviation
     is provided using the homoscedastic formulation
     """
-    GSIM_CLASS = gsim.ameri_2017.AmeriEtAl2017RjbStressDrop
+    GSIM_CLASS = ameri_2017.AmeriEtAl2017RjbStressDrop
 
     def test_all(self):
         self.check("AmeriEtAl2017RjbStressDrop.csv",
@@ -99,7 +99,7 @@ class AmeriEtAl2017RepiStressDropTestCase(BaseGSIMTestCase):
     distance is the preferred distance metric, and standard deviation
     is provided using the homoscedastic formulation
     """
-    GSIM_CLASS = gsim.ameri_2017.AmeriEtAl2017RepiStressDrop
+    GSIM_CLASS = ameri_2017.AmeriEtAl2017RepiStressDrop
 
     def test_all(self):
         self.check("AmeriEtAl2017RepiStressDrop.csv",
@@ -113,7 +113,7 @@ class Ameri2014TestCase(AmeriEtAl2017RjbTestCase):
     distance is the preferred distance metric, and standard deviation
     is provided using the homoskedastic formulation
     """
-    GSIM_CLASS = gsim.ameri_2017.Ameri2014Rjb
+    GSIM_CLASS = ameri_2017.Ameri2014Rjb
     # File containing the results for the Mean
     MEAN_FILE = "ameri14/Ameri_2014_mean.csv"
     # File contaning the results for the Total Standard Deviation
@@ -16,13 +16,17 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with OpenQuake. If not, see <http://www.gnu.org/licenses/>.
 
+import os
+import sys
 import unittest
+import subprocess
 import unittest.mock as mock
 import numpy
 
 from openquake.hazardlib import const, valid
 from openquake.hazardlib.gsim.base import (
-    GMPE, gsim_aliases, NotVerifiedWarning, DeprecationWarning)
+    GMPE, gsim_aliases, registry, NotVerifiedWarning, DeprecationWarning,
+    build_index, get_index_fname)
 from openquake.hazardlib.imt import PGA
 from openquake.hazardlib.contexts import (
     ContextMaker, SitesContext, RuptureContext)
@@ -176,8 +180,48 @@ class AliasesTestCase(unittest.TestCase):
     Check that all aliases are valid
     """
     def test_valid(self):
+        registry.load_all()  # populate gsim_aliases
         n = 0
         for toml in gsim_aliases.values():
             valid.gsim(toml)
             n += 1
         print('Checked %d valid aliases' % n)
+
+
+LAZY = '''import sys
+from openquake.hazardlib import valid
+valid.gsim('AbrahamsonEtAl2014NSHMPMean')
+valid.gsim('[BooreEtAl2014]\\nregion="CHN"')
+try:
+    valid.gsim('NotExistingGSIM')
+except ValueError:
+    pass
+print(sorted(m for m in sys.modules if m.startswith(
+    'openquake.hazardlib.gsim.') and 'mgmpe' not in m))'''
+
+
+class RegistryTestCase(unittest.TestCase):
+    """
+    Check the GSIM index and the lazy registry
+    """
+    def test_index(self):
+        # the cached index is in sync with the GSIM modules
+        self.assertEqual(registry.index, build_index())
+        self.assertTrue(os.path.exists(get_index_fname()))
+
+    def test_lazy(self):
+        # the lookups, including the unknown names, do not import all the
+        # GSIM modules, once the index has been cached by this process
+        registry.index
+        out = subprocess.run([sys.executable, '-c', LAZY],
+                             capture_output=True, text=True, check=True)
+        mods = eval(out.stdout)
+        self.assertIn('openquake.hazardlib.gsim.nshmp_2014', mods)
+        self.assertIn('openquake.hazardlib.gsim.boore_2014', mods)
+        self.assertLess(len(mods), 20)  # not all the GSIM modules
+
+    def test_unknown(self):
+        with self.assertRaises(ValueError) as ctx:
+            valid.gsim('NotExistingGSIM')
+        self.assertIn('Unknown GSIM: NotExistingGSIM', str(ctx.exception))
+        self.assertNotIn('NotExistingGSIM', registry)
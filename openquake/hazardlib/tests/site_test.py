@@ -22,7 +22,8 @@ import numpy
 from shapely import wkt
 
 from openquake.baselib import hdf5
-from openquake.hazardlib.site import Site, SiteCollection
+from openquake.hazardlib.site import (
+    Site, SiteCollection, BBoxIndex, scan_bbox)
 from openquake.hazardlib.geo.point import Point
 
 assert_eq = numpy.testing.assert_equal
@@ -264,6 +265,34 @@ class WithinBBoxTestCase(unittest.TestCase):
         assert_eq(self.sites.within_bbox((-182, -28, -178, -26)), [0])
 
 
+class BBoxIndexTestCase(unittest.TestCase):
+    # the index must give the same sites as the full scan
+
+    def test_random(self):
+        rng = numpy.random.default_rng(42)
+        sitecol = SiteCollection.from_points(
+            rng.uniform(-10., 10., 5000), rng.uniform(40., 50., 5000))
+        index = BBoxIndex(sitecol.array)
+        lons, lats = sitecol.lons, sitecol.lats
+        bboxes = [(lon, lat, lon + size, lat + size) for lon, lat, size in
+                  zip(rng.uniform(-12., 10., 100),
+                      rng.uniform(38., 50., 100),
+                      rng.uniform(0., 5., 100))]
+        bboxes.append((20., 40., 30., 50.))  # outside the sites
+        bboxes.append((-20., 30., 20., 60.))  # containing all sites
+        for bbox in bboxes:
+            assert_eq(index.query(bbox), scan_bbox(lons, lats, bbox))
+        assert_eq(sitecol.within_bbox(bboxes[0]),
+                  scan_bbox(lons, lats, bboxes[0]))
+
+    def test_idl(self):
+        lons = numpy.array([-180, -178, 179, 180, 180], numpy.float32)
+        lats = numpy.array([-27, -28, -26, -30, -28], numpy.float32)
+        index = BBoxIndex(SiteCollection.from_points(lons, lats).array)
+        bbox = (-182, -28, -178, -26)
+        assert_eq(index.query(bbox), scan_bbox(lons, lats, bbox))
+
+
 class SiteCollectionIterTestCase(unittest.TestCase):
 
     def test(self):
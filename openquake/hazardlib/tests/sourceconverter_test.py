@@ -17,10 +17,13 @@
 # along with OpenQuake.  If not, see <http://www.gnu.org/licenses/>.
 import os
 import io
+import pickle
+import tempfile
 import unittest.mock
 import numpy
-from openquake.baselib import hdf5
+from openquake.baselib import hdf5, config
 from openquake.hazardlib import nrml
+from openquake.hazardlib.source_reader import read_source_model
 from openquake.hazardlib.geo import Point
 from openquake.hazardlib.sourceconverter import update_source_model, \
     SourceConverter
@@ -502,3 +505,87 @@ class MultiFaultSourceModelTestCase(unittest.TestCase):
         self.assertEqual(expected[1], sec['s2'].profiles[0].points[1])
         ssm = nrml.to_python(src_xml, conv)
         self.assertIsInstance(ssm, nrml.SourceModel)
+
+
+class SourceModelCacheTestCase(unittest.TestCase):
+    def test(self):
+        fname = os.path.join(testdir, 'area-source.xml')
+        conv = SourceConverter(area_source_discretization=10.)
+        with tempfile.TemporaryDirectory() as tmp, unittest.mock.patch.dict(
+                config.performance, source_cache_dir=tmp):
+            [sm1] = read_source_model(fname, 'b1', conv, (), '', None).values()
+            [sm2] = read_source_model(fname, 'b1', conv, (), '', None).values()
+            self.assertEqual(sm1.cached, 0)  # miss
+            self.assertEqual(sm2.cached, os.path.getsize(fname))  # hit
+            self.assertEqual(len(os.listdir(tmp)), 1)
+            [src1], [src2] = sm1[0], sm2[0]
+            self.assertEqual(repr(src1), repr(src2))
+            self.assertEqual(src1.count_ruptures(), src2.count_ruptures())
+
+            # changing the converter parameters invalidates the cache
+            conv.area_source_discretization = 20.
+            [sm3] = read_source_model(fname, 'b1', conv, (), '', None).values()
+            self.assertEqual(sm3.cached, 0)
+            self.assertEqual(len(os.listdir(tmp)), 2)
+
+
+class StreamToPythonTestCase(unittest.TestCase):
+    """ Tests reading a source model without keeping the full tree """
+
+    def check(self, fname):
+        conv = SourceConverter(area_source_discretization=10.)
+        expected = nrml.to_python(fname, conv)
+        conv = SourceConverter(area_source_discretization=10.)
+        got = nrml.stream_to_python(fname, conv)
+        self.assertEqual(type(got), type(expected))
+        self.assertEqual(pickle.dumps(got), pickle.dumps(expected))
+
+    def test_nrml05(self):
+        for name in ('mixed.xml', 'multi-point-source.xml',
+                     'nonparametric-source-mutex-ruptures.xml',
+                     'source_group_collection.xml'):
+            self.check(os.path.join(testdir, name))
+
+    def test_nrml04(self):
+        self.check(os.path.join(os.path.dirname(__file__),
+                                'calc', 'data', 'ssm.xml'))
+
+    def test_sections(self):
+        self.check(os.path.join(os.path.dirname(__file__),
+                                'data', 'sections', 'sections_kite.xml'))
+
+    def test_wrong_trt(self):
+        testfile = os.path.join(testdir, 'wrong-trt.xml')
+        with self.assertRaises(ValueError) as ctx:
+            nrml.stream_to_python(testfile, SourceConverter())
+        self.assertIn('node pointSource: Found Cratonic, expected '
+                      'Active Shallow Crust, line 67', str(ctx.exception))
+
+    def test_discard_trts(self):
+        # the sources in the discarded groups are not converted
+        fname = os.path.join(testdir, 'mixed.xml')
+        trts = ['Active Shallow Crust', 'Subduction Interface']
+        expected = nrml.to_python(fname, SourceConverter(
+            area_source_discretization=10., discard_trts=trts))
+        conv = SourceConverter(area_source_discretization=10.,
+                               discard_trts=trts)
+        with unittest.mock.patch.object(
+                conv, 'convert_node', wraps=conv.convert_node) as cn:
+            got = nrml.stream_to_python(fname, conv)
+        self.assertEqual(pickle.dumps(got), pickle.dumps(expected))
+        self.assertEqual([call.args[0]['id'] for call in cn.call_args_list],
+                         [src.source_id for sg in got for src in sg])
+
+    def test_read_source_models(self):
+        # stream_to_python is used only for the files above the threshold
+        fname = os.path.join(testdir, 'mixed.xml')  # 12 KB
+        conv = SourceConverter(area_source_discretization=10.)
+        for stream_mb, nstream in [('', 0), ('1', 0), ('.01', 1)]:
+            with unittest.mock.patch.dict(
+                    config.performance, stream_sources_mb=stream_mb), \
+                unittest.mock.patch.object(
+                    nrml, 'stream_to_python',
+                    wraps=nrml.stream_to_python) as stp:
+                [sm] = nrml.read_source_models([fname], conv)
+            self.assertEqual(stp.call_count, nstream)
+            self.assertEqual(sm.fname, fname)
@@ -1,7 +1,7 @@
 import unittest
 import numpy
 from openquake.hazardlib.stats import (
-    mean_curve, quantile_curve, std_curve, weighted_quantiles)
+    mean_curve, quantile_curve, std_curve, weighted_quantiles, interp_columns)
 
 aaae = numpy.testing.assert_array_almost_equal
 
@@ -117,6 +117,30 @@ class QuantileCurveTestCase(unittest.TestCase):
 
         numpy.testing.assert_allclose(expected_curve, actual_curve)
 
+    def test_vectorized_quantile_curve(self):
+        # the vectorized quantiles must be identical to the ones computed
+        # with numpy.interp on each column, even in presence of ties
+        rng = numpy.random.default_rng(42)
+        curves = numpy.round(rng.random((20, 30, 4)), 1)
+        weights = numpy.round(rng.random(20), 2)
+        weights /= weights.sum()
+        for q in [0, .05, .15, .5, .85, weights[0], 1]:
+            actual = quantile_curve(q, curves, weights)
+            for n in range(30):
+                for li in range(4):
+                    order = numpy.lexsort((weights, curves[:, n, li]))
+                    expected = numpy.interp(q, weights[order].cumsum(),
+                                            curves[order, n, li])
+                    self.assertEqual(actual[n, li], expected)
+
+    def test_interp_columns(self):
+        xp = numpy.array([[.1, .3, .3, .5], [.2, .3, .7, .5], [.9, .3, .9, .5]])
+        fp = numpy.array([[1., 2., 3., 4.], [5., 6., 7., 8.], [9., 0., 1., 2.]])
+        for x in [0, .1, .2, .3, .4, .5, .7, .95]:
+            expected = [numpy.interp(x, xp[:, k], fp[:, k]) for k in range(4)]
+            numpy.testing.assert_array_equal(
+                interp_columns(x, xp, fp), expected)
+
     def test_weighted_quantiles(self):
         data1 = [10, 20, 30, 40, 50, 60, 70, 80, 90]
         weig1 = [.01] * 9
@@ -32,7 +32,7 @@ import numpy
 
 from openquake.baselib.general import distinct, pprod
 from openquake.baselib import config, hdf5
-from openquake.hazardlib import imt, scalerel, gsim, pmf, site, tom
+from openquake.hazardlib import imt, scalerel, pmf, site, tom
 from openquake.hazardlib.gsim.base import registry, gsim_aliases
 from openquake.hazardlib.calc.filters import (  # noqa
     IntegrationDistance, floatdict
@@ -47,8 +47,6 @@ PRECISION = pmf.PRECISION
 
 SCALEREL = scalerel._get_available_class(scalerel.BaseMSR)
 
-GSIM = gsim.get_available_gsims()
-
 MAG, DIS, LON, LAT, EPS = 0, 1, 2, 3, 4
 
 mag_pmf = partial(pprod, axis=(DIS, LON, LAT, EPS))
@@ -139,6 +137,7 @@ def to_toml(uncertainty):
     else:  # is a string
         text = uncertainty.strip()
         kvs = []
+    registry.load(text)  # import the module defining the alias, if any
     text = gsim_aliases.get(text, text)  # use the gsim alias if any
     if not text.startswith('['):  # a bare GSIM name was passed
         text = '[%s]' % text
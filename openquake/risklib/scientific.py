@@ -29,12 +29,14 @@ from functools import lru_cache
 import numpy
 import pandas
 from numpy.testing import assert_equal
-from scipy import interpolate, stats
+from scipy import interpolate, special, stats
 from openquake.baselib import hdf5, general
+from openquake.baselib.performance import compile
 
 F64 = numpy.float64
 F32 = numpy.float32
 U32 = numpy.uint32
+I64 = numpy.int64
 U64 = numpy.uint64
 U16 = numpy.uint16
 U8 = numpy.uint8
@@ -133,12 +135,12 @@ def fine_graining(points, steps):
 
 # sampling functions
 class Sampler(object):
-    def __init__(self, distname, rng, lratios=(), cols=None):
+    def __init__(self, distname, rng, lratios=(), cols=None, stream=0):
         self.distname = distname
         self.rng = rng
-        self.arange = numpy.arange(len(lratios))  # for the PM distribution
         self.lratios = lratios  # for the PM distribution
         self.cols = cols  # for the PM distribution
+        self.stream = stream  # different for different loss types
 
     def get_losses(self, df, covs):
         vals = df['val'].to_numpy()
@@ -152,28 +154,55 @@ class Sampler(object):
         means = df['mean'].to_numpy()
         covs = df['cov'].to_numpy()
         eids = df['eid'].to_numpy()
-        return self.rng.lognormal(eids, means, covs)
+        aids = df['aid'].to_numpy()
+        return self.rng.lognormal(eids, means, covs, aids, self.stream)
 
     def sampleBT(self, df):
         means = df['mean'].to_numpy()
         covs = df['cov'].to_numpy()
         eids = df['eid'].to_numpy()
-        return self.rng.beta(eids, means, covs)
+        aids = df['aid'].to_numpy()
+        return self.rng.beta(eids, means, covs, aids, self.stream)
 
     def samplePM(self, df):
         eids = df['eid'].to_numpy()
+        aids = df['aid'].to_numpy()
         allprobs = df[self.cols].to_numpy()
-        pmf = []
-        for eid, probs in zip(eids, allprobs):  # probs by asset
-            if probs.sum() == 0:  # oq-risk-tests/case_1g
-                # means are zeros for events below the threshold
-                pmf.append(0)
-            else:
-                pmf.append(stats.rv_discrete(
-                    name='pmf', values=(self.arange, probs),
-                    seed=self.rng.master_seed + eid).rvs())
+        # NB: the means are zeros for events below the threshold and
+        # the discrete method returns 0 when all the probabilities are
+        # zero, see oq-risk-tests/case_1g
+        pmf = self.rng.discrete(eids, allprobs, aids, self.stream)
         return self.lratios[pmf]
 
+
+def join_by_site(gmf_sids, asset_sids):
+    """
+    Vectorized equivalent of the inner join of two DataFrames indexed by
+    site ID, with the pairs ordered by site ID, then GMF row, then asset.
+
+    :param gmf_sids: site IDs of the GMF rows
+    :param asset_sids: site IDs of the assets
+    :returns: the GMF indices and the asset indices of the joined rows
+
+    >>> join_by_site(numpy.array([5, 3, 5, 3, 9]), numpy.array([3, 5, 3]))
+    (array([1, 1, 3, 3, 0, 2]), array([0, 2, 0, 2, 1, 1]))
+    """
+    gorder = numpy.argsort(gmf_sids, kind='stable')
+    aorder = numpy.argsort(asset_sids, kind='stable')
+    gsids = numpy.asarray(gmf_sids)[gorder]
+    asids = numpy.asarray(asset_sids)[aorder]
+    # for each GMF row the range of assets on the same site, searching
+    # only the first row of each site
+    first = numpy.flatnonzero(numpy.diff(gsids, prepend=-1))
+    nrows = numpy.diff(first, append=len(gsids))
+    lo = numpy.searchsorted(asids, gsids[first], 'left')
+    hi = numpy.searchsorted(asids, gsids[first], 'right')
+    start = numpy.repeat(lo, nrows)
+    counts = numpy.repeat(hi - lo, nrows)
+    offsets = numpy.repeat(counts.cumsum() - counts - start, counts)
+    aidx = aorder[numpy.arange(counts.sum()) - offsets]
+    return numpy.repeat(gorder, counts), aidx
+
 #
 # Input models
 #
@@ -316,8 +345,14 @@ class VulnerabilityFunction(object):
         else:
             lratios = ()
             cols = None
-        df = ratio_df.join(asset_df, how='inner')
-        sampler = Sampler(self.distribution_name, rng, lratios, cols)
+        gidx, aidx = join_by_site(ratio_df.index.to_numpy(),
+                                  asset_df.index.to_numpy())
+        dic = {c: ratio_df[c].to_numpy()[gidx] for c in ratio_df.columns}
+        for c in asset_df.columns:
+            dic[c] = asset_df[c].to_numpy()[aidx]
+        df = pandas.DataFrame(dic, ratio_df.index[gidx])
+        sampler = Sampler(self.distribution_name, rng, lratios, cols,
+                          LOSSID.get(getattr(self, 'loss_type', None), 0))
         covs = not hasattr(self, 'covs') or self.covs.any()
         losses = sampler.get_losses(df, covs)
         ok = losses > minloss
@@ -807,65 +842,110 @@ def _alpha_beta(mean, stddev):
     return c * mean ** 2, c * (mean - mean ** 2)
 
 
+# constants of the splitmix64 finalizer
+_GOLDEN = U64(0x9e3779b97f4a7c15)
+_MIX1 = U64(0xbf58476d1ce4e5b9)
+_MIX2 = U64(0x94d049bb133111eb)
+
+
+def _mix64(x):
+    # splitmix64 finalizer, a bijection on the 64 bit integers
+    x = (x ^ (x >> U64(30))) * _MIX1
+    x = (x ^ (x >> U64(27))) * _MIX2
+    return x ^ (x >> U64(31))
+
+
+def counter_uniforms(seed, eids, aids, stream=0):
+    """
+    Counter-based generator of uniform random numbers in the open interval
+    (0, 1): the number associated to a given (seed, eid, aid, stream) is
+    always the same, independently from the other numbers generated.
+
+    :param seed: a non-negative integer
+    :param eids: an array of event IDs
+    :param aids: an array of asset IDs, broadcastable with the eids
+    :param stream: a small integer to generate independent streams
+    :returns: an array of float64 with the broadcasted shape
+
+    >>> counter_uniforms(42, numpy.array([0, 1, 0]), numpy.array([0, 0, 1]))
+    array([0.18397739, 0.23756985, 0.21250816])
+    """
+    with numpy.errstate(over='ignore'):
+        h = _mix64(U64(seed) * _GOLDEN + U64(stream))
+        h = _mix64(h ^ numpy.asarray(eids).astype(U64))
+        h = _mix64(h ^ numpy.asarray(aids).astype(U64) * _GOLDEN)
+    return ((h >> U64(11)) + .5) * 2. ** -53
+
+
 class MultiEventRNG(object):
     """
     An object ``MultiEventRNG(master_seed, eids, asset_correlation=0)``
-    has a method ``.get(A, eids)`` which returns a matrix of (A, E)
-    normally distributed random numbers.
-    If the ``asset_correlation`` is 1 the numbers are the same.
+    generates random numbers for the pairs (eid, aid) with
+    vectorized methods. The numbers are counter-based, i.e. they
+    depend only on the master_seed, on the pair (eid, aid) and on the
+    stream, so they are reproducible independently from the way the
+    events and the assets are split in tasks.
+    If the ``asset_correlation`` is 1 the numbers do not depend on the aid.
 
     >>> rng = MultiEventRNG(
     ...     master_seed=42, eids=[0, 1, 2], asset_correlation=1)
     >>> eids = numpy.array([1] * 3)
+    >>> aids = numpy.array([0, 1, 2])
     >>> means = numpy.array([.5] * 3)
     >>> covs = numpy.array([.1] * 3)
-    >>> rng.lognormal(eids, means, covs)
-    array([0.38892466, 0.38892466, 0.38892466])
-    >>> rng.beta(eids, means, covs)
-    array([0.4372343 , 0.57308132, 0.56392573])
+    >>> rng.lognormal(eids, means, covs, aids)
+    array([0.46330999, 0.46330999, 0.46330999])
+    >>> rng.beta(eids, means, covs, aids)
+    array([0.49708712, 0.50102269, 0.54960837])
     >>> fractions = numpy.array([[[.8, .1, .1]]])
     >>> rng.discrete_dmg_dist([0], fractions, [10])
-    array([[[8, 2, 0]]], dtype=uint32)
+    array([[[7, 2, 1]]], dtype=uint32)
     """
     def __init__(self, master_seed, eids, asset_correlation=0):
-        self.master_seed = master_seed
+        self.master_seed = int(master_seed)
+        self.eids = pandas.unique(numpy.asarray(eids))
         self.asset_correlation = asset_correlation
-        self.rng = {}
-        for eid in eids:
-            # NB: int below is necessary for totally mysterious reasons:
-            # a calculation on cluster1 #41904 failed with a floating
-            # point seed, but I cannot reproduce the issue
-            ph = numpy.random.Philox(int(self.master_seed + eid))
-            self.rng[eid] = numpy.random.Generator(ph)
-
-    def _get_eps(self, eid, corrcache):
+
+    def uniform(self, eids, aids=0, stream=0):
+        """
+        :param eids: event IDs
+        :param aids: asset IDs (or 0)
+        :param stream: a small integer to generate independent streams
+        :returns: uniform numbers in the open interval (0, 1)
+        """
+        return counter_uniforms(self.master_seed, eids, aids, stream)
+
+    def normal(self, eids, aids=0, stream=0):
+        """
+        :returns: standard normal numbers for the given (eids, aids);
+                  the aids are ignored in case of asset correlation
+        """
         if self.asset_correlation:
-            try:
-                return corrcache[eid]
-            except KeyError:
-                corrcache[eid] = eps = self.rng[eid].normal()
-                return eps
-        return self.rng[eid].normal()
-
-    def lognormal(self, eids, means, covs):
+            aids = 0
+        return special.ndtri(self.uniform(eids, aids, stream))
+
+    def lognormal(self, eids, means, covs, aids=0, stream=0):
         """
         :param eids: event IDs
         :param means: array of floats in the range 0..1
         :param covs: array of floats with the same shape
+        :param aids: asset IDs
+        :param stream: a small integer to generate independent streams
         :returns: array of floats
         """
-        corrcache = {}
-        eps = numpy.array([self._get_eps(eid, corrcache) for eid in eids])
+        eps = self.normal(eids, aids, stream)
         sigma = numpy.sqrt(numpy.log(1 + covs ** 2))
         div = numpy.sqrt(1 + covs ** 2)
         return means * numpy.exp(eps * sigma) / div
 
     # NB: asset correlation is ignored
-    def beta(self, eids, means, covs):
+    def beta(self, eids, means, covs, aids=0, stream=0):
         """
         :param eids: event IDs
         :param means: array of floats in the range 0..1
         :param covs: array of floats with the same shape
+        :param aids: asset IDs
+        :param stream: a small integer to generate independent streams
         :returns: array of floats following the beta distribution
 
         This function works properly even when some or all of the stddevs
@@ -873,37 +953,106 @@ class MultiEventRNG(object):
         becomes extremely peaked. It also works properly when some one or
         all of the means are zero, returning zero in that case.
         """
-        # NB: you should not expect a smooth limit for the case of on cov->0
-        # since the random number generator will advance of a different number
-        # of steps with cov == 0 and cov != 0
-        res = numpy.array(means)
+        means = numpy.asarray(means, F64)
+        res = means.copy()
         ok = (means != 0) & (covs != 0)  # nonsingular values
         alpha, beta = _alpha_beta(means[ok], means[ok] * covs[ok])
-        res[ok] = [self.rng[eid].beta(alpha[i], beta[i])
-                   for i, eid in enumerate(eids[ok])]
+        eids = numpy.broadcast_to(eids, means.shape)[ok]
+        aids = numpy.broadcast_to(aids, means.shape)[ok]
+        # B = X / (X + Y) with X ~ Gamma(alpha) and Y ~ Gamma(beta)
+        x = self.gamma(eids, alpha, aids, stream << 16)
+        y = self.gamma(eids, beta, aids, stream << 16 | 1 << 15)
+        res[ok] = x / (x + y)
         return res
 
-    def discrete_dmg_dist(self, eids, fractions, numbers):
+    def gamma(self, eids, shapes, aids, stream):
+        """
+        Sample the gamma distribution with the method of Marsaglia and Tsang;
+        the rejected candidates are resampled with the next streams.
+
+        :param eids: N event IDs
+        :param shapes: N positive shape parameters
+        :param aids: N asset IDs
+        :param stream: a small integer to generate independent streams
+        :returns: N floats following the gamma distribution
         """
-        Converting fractions into discrete damage distributions using bincount
-        and random.choice.
+        boost = shapes < 1  # use Gamma(a) = Gamma(a + 1) * U^(1/a)
+        d = numpy.where(boost, shapes + 1, shapes) - 1 / 3
+        c = 1 / numpy.sqrt(9 * d)
+        res = numpy.zeros(len(shapes))
+        if boost.any():
+            u = self.uniform(eids[boost], aids[boost], stream)
+            res[boost] = u ** (1 / shapes[boost])
+        res[~boost] = 1
+        todo = numpy.arange(len(shapes))
+        k = stream + 1
+        while len(todo):
+            e, a, dd = eids[todo], aids[todo], d[todo]
+            x = special.ndtri(self.uniform(e, a, k))
+            u = self.uniform(e, a, k + 1)
+            v = (1 + c[todo] * x) ** 3
+            with numpy.errstate(invalid='ignore', divide='ignore'):
+                ok = (v > 0) & (numpy.log(u) < .5 * x * x + dd - dd * v +
+                                dd * numpy.log(v))
+            res[todo[ok]] *= dd[ok] * v[ok]
+            todo = todo[~ok]
+            k += 2
+        return res
+
+    def discrete(self, eids, probs, aids=0, stream=0):
+        """
+        :param eids: E event IDs
+        :param probs: array of shape (E, D) with non-negative probabilities
+        :param aids: asset IDs
+        :param stream: a small integer to generate independent streams
+        :returns: E indices in the range 0..D-1 (0 if all probs are zero)
+        """
+        cumprobs = numpy.cumsum(probs, axis=1)
+        u = self.uniform(eids, aids, stream) * cumprobs[:, -1]
+        idx = numpy.minimum((cumprobs <= u[:, None]).sum(axis=1),
+                            probs.shape[1] - 1)
+        idx[cumprobs[:, -1] == 0] = 0
+        return idx
+
+    def discrete_dmg_dist(self, eids, fractions, numbers, aids=None,
+                          stream=0):
+        """
+        Converting fractions into discrete damage distributions by
+        sampling a multinomial distribution as a sequence of binomials.
 
         :param eids: E event IDs
         :param fractions: array of shape (A, E, D)
         :param numbers: A asset numbers
+        :param aids: A asset IDs (default 0..A-1)
+        :param stream: a small integer to generate independent streams
         :returns: array of integers of shape (A, E, D)
         """
         A, E, D = fractions.shape
         assert len(eids) == E, (len(eids), E)
-        assert len(numbers) == A, (len(eids), A)
+        assert len(numbers) == A, (len(numbers), A)
+        if aids is None:
+            aids = numpy.arange(A)
+        eids = numpy.asarray(eids)[None, :]  # shape (1, E)
+        aids = numpy.asarray(aids)[:, None]  # shape (A, 1)
+        totfracs = fractions.sum(axis=2)
+        if (totfracs == 0).any():
+            a, e = numpy.argwhere(totfracs == 0)[0]
+            raise ValueError('The damage fractions for asset #%d, event %d '
+                             'are all zeros' % (aids[a, 0], eids[0, e]))
+        fracs = fractions / totfracs[:, :, None]
+        left = numpy.zeros((A, E)) + numpy.asarray(numbers)[:, None]
+        rest = numpy.ones((A, E))  # probability not assigned yet
         ddd = numpy.zeros(fractions.shape, U32)
-        for e, eid in enumerate(eids):
-            choice = self.rng[eid].choice
-            for a, n in enumerate(numbers):
-                frac = fractions[a, e]  # shape D
-                states = choice(D, n, p=frac/frac.sum())  # n states
-                # ex. [0, 0, 0, 1, 0, 0, 0, 1, 0, 0], 8 times 0, 2 times 1
-                ddd[a, e] = numpy.bincount(states, minlength=D)
+        for d in range(D - 1):
+            with numpy.errstate(divide='ignore', invalid='ignore'):
+                p = numpy.clip(fracs[:, :, d] / rest, 0., 1.)
+            p[rest <= 0] = 1.
+            u = self.uniform(eids, aids, stream * D + d)
+            n = numpy.minimum(stats.binom.ppf(u, left, p), left)
+            ddd[:, :, d] = n
+            left -= n
+            rest -= fracs[:, :, d]
+        ddd[:, :, D - 1] = left
         return ddd
 
     def boolean_dist(self, probs, num_sims):
@@ -914,15 +1063,13 @@ class MultiEventRNG(object):
         >>> rng = MultiEventRNG(master_seed=42, eids=[0, 1, 2])
         >>> dist = rng.boolean_dist(probs=[.1, .2, 0.], num_sims=100)
         >>> dist.sum(axis=1)  # around 10% and 20% respectively
-        array([12., 17.,  0.])
+        array([ 7., 20.,  0.])
         """
-        E = len(self.rng)
+        E = len(self.eids)
         assert len(probs) == E, (len(probs), E)
-        booldist = numpy.zeros((E, num_sims))
-        for e, eid, prob in zip(range(E), self.rng, probs):
-            if prob > 0:
-                booldist[e] = self.rng[eid].random(num_sims) < prob
-        return booldist
+        sims = numpy.arange(num_sims)
+        us = self.uniform(self.eids[:, None], sims)  # shape (E, S)
+        return (us < numpy.asarray(probs)[:, None]).astype(F64)
 
 
 #
@@ -1576,6 +1723,155 @@ def losses_by_period(losses, return_periods, num_events, eff_time=None,
     return res
 
 
+@compile(["float32[:](float32[:], int64[:])",
+          "float64[:](float64[:], int64[:])"])
+def _sort_segments(losses, offsets):
+    # sort the losses inside each segment
+    out = numpy.empty_like(losses)
+    for s in range(len(offsets) - 1):
+        start, stop = offsets[s], offsets[s + 1]
+        out[start:stop] = numpy.sort(losses[start:stop])
+    return out
+
+
+@compile(["(float32[:], int64[:], int64[:], boolean)",
+          "(float64[:], int64[:], int64[:], boolean)"])
+def _agg_by_year(losses, offsets, years, maximum):
+    # sum (or take the maximum of) the losses with the same year inside
+    # each segment, returning the aggregated losses and their counts
+    out = numpy.empty_like(losses)
+    counts = numpy.zeros(len(offsets) - 1, numpy.int64)
+    i = 0
+    for s in range(len(offsets) - 1):
+        start, stop = offsets[s], offsets[s + 1]
+        idxs = numpy.argsort(years[start:stop], kind='mergesort') + start
+        for n, k in enumerate(idxs):
+            if n == 0 or years[k] != years[idxs[n - 1]]:
+                out[i] = losses[k]
+                i += 1
+                counts[s] += 1
+            elif maximum:
+                out[i - 1] = max(out[i - 1], losses[k])
+            else:
+                out[i - 1] += losses[k]
+    return out[:i], counts
+
+
+def _interp_segments(fps, offsets, counts, ne, return_periods, eff_time,
+                     pla_factor=None):
+    # interpolate in log space the padded losses of each segment at the
+    # return periods, with the same arithmetic of numpy.interp
+    S, P = len(counts), len(return_periods)
+    curves = numpy.zeros((S, P))
+    plas = numpy.zeros((S, P)) if pla_factor else None
+    rps = numpy.tile(numpy.asarray(return_periods, float), (S, 1))
+    nes = numpy.repeat(ne, P).reshape(S, P).astype(float)
+    right = rps > eff_time
+    curves[right] = numpy.nan
+    if pla_factor:
+        plas[right] = numpy.nan
+    ok = ~right & (rps >= eff_time / nes)
+    s = numpy.repeat(numpy.arange(S), P).reshape(S, P)[ok]
+    rp, n = rps[ok], nes[ok]
+    logr = numpy.log(rp)
+    # index j of the effective period on the left of the return period
+    j = numpy.clip(numpy.floor(n - eff_time / rp), 0, n - 1)
+    j[(j < n - 1) & (numpy.log(
+        eff_time / numpy.maximum(n - j - 1, 1)) <= logr)] += 1
+    j[(j > 0) & (numpy.log(eff_time / (n - j)) > logr)] -= 1
+    last = j == n - 1
+    e0 = eff_time / (n - j)
+    e1 = eff_time / numpy.maximum(n - j - 1, 1)
+    loge0, loge1 = numpy.log(e0), numpy.log(e1)
+    # the first ne - count padded losses are zeros
+    nzeros = n - counts[s]
+    i0, i1 = j - nzeros, j + 1 - nzeros
+    start = offsets[s]
+    fp0 = numpy.where(i0 >= 0, fps[(start + numpy.maximum(i0, 0)).astype(
+        int)], 0.)
+    fp1 = numpy.where((i1 >= 0) & ~last, fps[(start + numpy.clip(
+        i1, 0, counts[s] - 1)).astype(int)], 0.)
+    values = [(curves, fp0, fp1)]
+    if pla_factor:
+        values.append((plas, fp0 * pla_factor(e0), fp1 * pla_factor(e1)))
+    for out, y0, y1 in values:
+        slope = (y1 - y0) / numpy.where(last, 1., loge1 - loge0)
+        out[ok] = numpy.where(last, y0, slope * (logr - loge0) + y0)
+    return curves, plas
+
+
+def _floats(losses):
+    # convert the losses into an array of float32 or float64
+    losses = numpy.asarray(losses)
+    if losses.dtype not in (F32, F64):
+        losses = losses.astype(F64)
+    return losses
+
+
+def losses_by_period_batch(losses, offsets, return_periods, num_events,
+                           eff_time, sorting=True, name='curve',
+                           pla_factor=None):
+    """
+    Vectorized version of :func:`losses_by_period` working on S segments
+    of losses at the same time.
+
+    :param losses: a flat array of losses, segment after segment
+    :param offsets: an array of S + 1 offsets, segment s being
+                    losses[offsets[s]:offsets[s + 1]]
+    :param return_periods: ordered return periods
+    :param num_events: the number of events for each segment (or a scalar)
+    :param eff_time: investigation_time * ses_per_logic_tree_path
+    :returns: a dictionary with arrays of shape (S, P)
+
+    >>> losses = numpy.array([3, 2, 3.5, 4, 3, 23, 11, 2, 1, 4, 5, 7, 8])
+    >>> losses_by_period_batch(losses, [0, 5, 13], [1, 2, 5, 10], [10, 10],
+    ...                        10)
+    {'curve': array([[ 0. ,  2. ,  3.5,  4. ],
+           [ 0. ,  5. , 11. , 23. ]])}
+    """
+    offsets = numpy.asarray(offsets)
+    counts = numpy.diff(offsets)
+    S = len(counts)
+    ne = numpy.broadcast_to(num_events, S)
+    if (counts == 0).any():
+        raise ValueError('There are empty segments')
+    elif (counts > ne).any():
+        s = (counts > ne).argmax()
+        raise ValueError('More losses (%d) than events (%d) ??' %
+                         (counts[s], ne[s]))
+    losses = _floats(losses)[offsets[0]:offsets[-1]]
+    offsets = offsets - offsets[0]
+    if sorting:
+        losses = _sort_segments(losses, offsets.astype(I64))
+    curves, plas = _interp_segments(
+        losses.astype(float), offsets, counts, ne, return_periods, eff_time,
+        pla_factor)
+    res = {name: curves.astype(losses.dtype)}
+    if pla_factor:
+        res['pla_' + name] = plas.astype(losses.dtype)
+    return res
+
+
+def aggregate_by_year(losses, offsets, years, agg=numpy.add):
+    """
+    Aggregate the losses inside each segment by year.
+
+    :param losses: a flat array of losses, segment after segment
+    :param offsets: an array of S + 1 offsets
+    :param years: an array of years, one per loss
+    :param agg: numpy.add for the AEP curves, numpy.maximum for the OEP ones
+    :returns: the aggregated losses and their offsets
+
+    >>> losses = numpy.array([1., 2., 3., 4., 5.])
+    >>> aggregate_by_year(losses, [0, 3, 5], [2001, 2000, 2001, 2000, 2000])
+    (array([2., 4., 9.]), array([0, 2, 3]))
+    """
+    agglosses, counts = _agg_by_year(
+        _floats(losses), numpy.asarray(offsets, I64),
+        numpy.asarray(years, I64), agg is numpy.maximum)
+    return agglosses, numpy.concatenate([[0], counts.cumsum()])
+
+
 class LossCurvesMapsBuilder(object):
     """
     Build losses curves and maps for all loss types at the same time.
@@ -1633,6 +1929,32 @@ class LossCurvesMapsBuilder(object):
                     name=col + '_oep', pla_factor=self.pla_factor))
         return dic
 
+    def build_curves(self, years, col, losses, offsets, agg_types, ne):
+        """
+        Batched version of .build_curve, computing the curves for
+        all the segments of losses at once
+
+        :returns: a dictionary of arrays of shape (S, P)
+        """
+        periods = self.return_periods
+        dic = {}
+        agg_types_list = agg_types.split(', ')
+        if 'ep' in agg_types_list:
+            dic.update(losses_by_period_batch(
+                losses, offsets, periods, ne, self.eff_time,
+                name=col, pla_factor=self.pla_factor))
+        if len(years):
+            # see specs in https://github.com/gem/oq-engine/issues/8971
+            for aggtype, agg in [('aep', numpy.add), ('oep', numpy.maximum)]:
+                if aggtype in agg_types_list:
+                    agglosses, aggoffsets = aggregate_by_year(
+                        losses, offsets, years, agg)
+                    dic.update(losses_by_period_batch(
+                        agglosses, aggoffsets, periods, ne, self.eff_time,
+                        name=col + '_' + aggtype,
+                        pla_factor=self.pla_factor))
+        return dic
+
 
 def _agg(loss_dfs, weights=None):
     # average loss DataFrames with fields (eid, aid, variance, loss)
@@ -1741,11 +2063,8 @@ class RiskComputer(dict):
                     for a in range(A):
                         dd5[p, a, :, li, :D] = fractions[a] * number[a]
                 else:
-                    # this is a performance distaster; for instance
-                    # the Messina test in oq-risk-tests becomes 12x
-                    # slower even if it has only 25_736 assets
                     dd5[p, :, :, li, :D] = rng.discrete_dmg_dist(
-                        gmf_df.eid, fractions, number)
+                        gmf_df.eid, fractions, number, adf.index, li)
 
         if crm:
             csqs = crm.get_consequences()
@@ -1857,10 +2176,10 @@ if __name__ == '__main__':
 
     rng = MultiEventRNG(42, [1])
     ones = numpy.ones(100)
-    vals = rng.beta(1, .5 * ones, .05 * ones)
+    vals = rng.beta(1, .5 * ones, .05 * ones, numpy.arange(100))
     print(vals.mean(), vals.std())
     # print(vals)
-    vals = rng.beta(1, .5 * ones, .01 * ones)
+    vals = rng.beta(1, .5 * ones, .01 * ones, numpy.arange(100))
     print(vals.mean(), vals.std())
     # print(vals)
     plt.plot(x, beta(.5, .05), label='.5[.05]')
@@ -163,8 +163,8 @@ class ProbabilisticEventBasedTestCase(unittest.TestCase):
             0.1419, 0.4218, 0.9157, 0.7922, 0.9595)
 
         expected_loss_ratios = numpy.array([[
-            0.044604, 0.175115, 0.297628, 0.181567, 0.344077, 0.091288,
-            0.165941, 0.300442, 0.164211, 0.25775]])
+            0.047358, 0.247869, 0.239302, 0.165112, 0.245203, 0.044667,
+            0.112325, 0.223684, 0.27468, 0.234979]])
 
         ratios = call(vf, gmf, EIDS, self.RNG)
         numpy.testing.assert_allclose(expected_loss_ratios,
@@ -185,8 +185,8 @@ class ProbabilisticEventBasedTestCase(unittest.TestCase):
                 0.1419, 0.4218, 0.9157, 0.05, 0.9595)
 
         numpy.testing.assert_allclose(
-            numpy.array([[0.175115, 0.297628, 0.181567, 0.344077,
-                          0.091288, 0.165941, 0.300442, 0.25775]]),
+            numpy.array([[0.247869, 0.239302, 0.165112, 0.245203,
+                          0.044667, 0.112325, 0.223684, 0.234979]]),
             call(vuln_function, gmfs, EIDS, self.RNG),
             atol=0.0, rtol=0.01)
 
@@ -205,8 +205,8 @@ class ProbabilisticEventBasedTestCase(unittest.TestCase):
                 0.1419, 0.4218, 0.9157, 1.05, 0.9595)
 
         numpy.testing.assert_allclose(
-            numpy.array([[0.236383, 0.175115, 0.297628, 0.181567, 0.344077,
-                          0.091288, 0.165941, 0.300442, 0.207284, 0.25775]]),
+            numpy.array([[0.246133, 0.247869, 0.239302, 0.165112, 0.245203,
+                          0.044667, 0.112325, 0.223684, 0.34673, 0.234979]]),
             call(vuln_function, gmfs, EIDS, self.RNG),
             atol=0.0, rtol=0.01)
 
@@ -130,7 +130,7 @@ class VulnerabilityFunctionTestCase(unittest.TestCase):
             self.COVS_GOOD)
 
     def test_loss_ratio_interp_many_values(self):
-        expected_lrs = numpy.array([[0.006926, 0.033077, 0.181509]])
+        expected_lrs = numpy.array([[0.007354, 0.046819, 0.017035]])
         test_input = [0.005, 0.006, 0.0269]
         numpy.testing.assert_allclose(
             expected_lrs, call(self.test_func, test_input, eids), atol=1E-6)
@@ -140,7 +140,7 @@ class VulnerabilityFunctionTestCase(unittest.TestCase):
         # of loss ratios (ordinates).
         # This test also ensures that input IML values are 'clipped' to the IML
         # range defined for the vulnerability function.
-        expected_lrs = numpy.array([[0.033077, 0.181509]])
+        expected_lrs = numpy.array([[0.046819, 0.017035]])
         test_input = [0.00049, 0.006, 2.7]
         numpy.testing.assert_allclose(
             expected_lrs, call(self.test_func, test_input, eids), atol=1E-6)
@@ -216,6 +216,18 @@ class VulnerabilityFunctionTestCase(unittest.TestCase):
         ])
         aac(lrem, expected_lrem, atol=1E-3)
 
+    def test_join_by_site(self):
+        # same rows, in the same order, as the pandas inner join
+        rng = numpy.random.default_rng(42)
+        gmf_sids = rng.integers(0, 20, 100)
+        asset_sids = rng.integers(5, 30, 40)
+        left = pandas.DataFrame(dict(eid=numpy.arange(100)), gmf_sids)
+        right = pandas.DataFrame(dict(aid=numpy.arange(40)), asset_sids)
+        expected = left.join(right, how='inner')
+        gidx, aidx = scientific.join_by_site(gmf_sids, asset_sids)
+        numpy.testing.assert_array_equal(gidx, expected.eid.to_numpy())
+        numpy.testing.assert_array_equal(aidx, expected.aid.to_numpy())
+
 
 class VulnerabilityLossRatioStepsTestCase(unittest.TestCase):
     IMT = 'PGA'
@@ -614,6 +626,37 @@ class LossesByEventTestCase(unittest.TestCase):
         print('retention', ret_curve)
 
 
+class LossCurvesBatchTestCase(unittest.TestCase):
+    # the batched curves must agree with the curves built one at the time
+    def test_build_curves(self):
+        rng = numpy.random.default_rng(42)
+        S = 200
+        counts = rng.integers(1, 100, S)
+        num_events = counts + rng.integers(0, 100, S)
+        offsets = numpy.concatenate([[0], counts.cumsum()])
+        losses = rng.lognormal(size=offsets[-1]).astype(numpy.float32)
+        losses[rng.random(offsets[-1]) < .1] = 0
+        years = rng.integers(1, 50, offsets[-1])
+        eff_time = 1000.
+        periods = scientific.return_periods(eff_time, 100)
+        pla_factor = scientific.pla_factor(pandas.DataFrame(dict(
+            return_period=[1, 10, 100, 1000],
+            pla_factor=[1, 1.1, 1.3, 1.5])))
+        builder = scientific.LossCurvesMapsBuilder(
+            [], periods, None, None, eff_time, 1., pla_factor)
+        curves = builder.build_curves(years, 'loss', losses, offsets,
+                                      'ep, aep, oep', num_events)
+        for s in range(S):
+            slc = slice(offsets[s], offsets[s + 1])
+            curve = builder.build_curve(years[slc], 'loss', losses[slc],
+                                        'ep, aep, oep', None, num_events[s])
+            self.assertEqual(sorted(curve), sorted(curves))
+            for name in ['loss', 'pla_loss']:  # identical
+                numpy.testing.assert_array_equal(curve[name], curves[name][s])
+            for name in curve:  # the sums by year can differ in the last bit
+                aac(curve[name], curves[name][s], rtol=1E-6)
+
+
 class PlaFactorTestCase(unittest.TestCase):
     def test_interp(self):
         rps = [1, 5, 10, 50, 100, 500, 1000]
@@ -645,6 +688,60 @@ class ComposeDDSTestCase(unittest.TestCase):
         aac(exp, comp([dd1, dd2, dd3]))
 
 
+class MultiEventRNGTestCase(unittest.TestCase):
+    def test_independent_from_split(self):
+        # the numbers depend only on (master_seed, eid, aid)
+        eids = numpy.repeat(numpy.arange(100), 50)
+        aids = numpy.tile(numpy.arange(50), 100)
+        means = numpy.full(5000, .3)
+        covs = numpy.full(5000, .2)
+        rng = scientific.MultiEventRNG(42, numpy.unique(eids))
+        full = rng.lognormal(eids, means, covs, aids)
+        perm = numpy.random.default_rng(0).permutation(5000)
+        rng1 = scientific.MultiEventRNG(42, numpy.unique(eids[perm[:100]]))
+        aac(rng1.lognormal(eids[perm[:100]], means[:100], covs[:100],
+                           aids[perm[:100]]), full[perm[:100]], rtol=0)
+        aac(rng.beta(eids[::-1], means, covs, aids[::-1]),
+            rng.beta(eids, means, covs, aids)[::-1], rtol=0)
+
+    def test_asset_correlation(self):
+        eids = numpy.zeros(3, int)
+        aids = numpy.arange(3)
+        rng = scientific.MultiEventRNG(42, [0], asset_correlation=1)
+        eps = rng.normal(eids, aids)
+        self.assertEqual(len(set(eps)), 1)
+        rng = scientific.MultiEventRNG(42, [0], asset_correlation=0)
+        eps = rng.normal(eids, aids)
+        self.assertEqual(len(set(eps)), 3)
+
+    def test_discrete_dmg_dist(self):
+        rng = scientific.MultiEventRNG(42, range(200))
+        fractions = numpy.zeros((3, 200, 4))
+        fractions[:] = [.5, .3, .2, 0]
+        ddd = rng.discrete_dmg_dist(range(200), fractions, [10, 0, 100])
+        aac(ddd.sum(axis=2), [[10] * 200, [0] * 200, [100] * 200])
+        aac(ddd[2].mean(axis=0), [50, 30, 20, 0], atol=1)
+        self.assertEqual(ddd[:, :, 3].sum(), 0)
+
+    def test_discrete_dmg_dist_zero_fractions(self):
+        # the assets cannot disappear, as it would happen with NaNs
+        rng = scientific.MultiEventRNG(42, range(3))
+        fractions = numpy.zeros((2, 3, 4))
+        fractions[:] = [.5, .3, .2, 0]
+        fractions[1, 2] = 0
+        with self.assertRaises(ValueError) as ctx:
+            rng.discrete_dmg_dist(range(3), fractions, [10, 10])
+        self.assertIn('asset #1, event 2', str(ctx.exception))
+
+    def test_discrete_zero_probs(self):
+        # rows with all zero probabilities must give the index 0
+        rng = scientific.MultiEventRNG(42, [0, 1, 2])
+        probs = numpy.array([[0, 0, 0], [.2, .3, .5], [0, 0, 1]])
+        idx = rng.discrete([0, 1, 2], probs)
+        self.assertEqual(idx[0], 0)
+        self.assertEqual(idx[2], 2)
+
+
 class RiskComputerTestCase(unittest.TestCase):
     def test1(self):
         dic = {'calculation_mode': 'event_based_risk',
@@ -793,5 +890,5 @@ class RiskComputerTestCase(unittest.TestCase):
         dd5 = rc.get_dd5(asset_df, gmf_df, rng)  # (A, E, L, D)
         dd0 = dd5[0, 0, 0, 0, 1:]
         dd1 = dd5[0, 0, 1, 0, 1:]
-        aac(dd0, [10, 8, 4, 0])
-        aac(dd1, [31, 14, 3, 0], atol=1e-8)
+        aac(dd0, [18, 10, 0, 0])
+        aac(dd1, [28, 16, 1, 0], atol=1e-8)
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright (C) 2025, GEM Foundation
+#
+# OpenQuake is free software: you can redistribute it and/or modify it
+# under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# OpenQuake is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with OpenQuake.  If not, see <http://www.gnu.org/licenses/>.
+import time
+import numpy
+from openquake.baselib import sap
+from openquake.hazardlib.site import SiteCollection, scan_bbox
+from openquake.hazardlib.geo.utils import get_bounding_box
+from openquake.hazardlib.geo import Point
+
+
+def main(nsites: int = 500_000, nsources: int = 10_000,
+         maxdist: float = 300.):
+    """
+    Compare the bounding box scan on all sites with the spatial index
+    of the SiteCollection, for point-like sources in Europe
+    """
+    rng = numpy.random.default_rng(42)
+    lons = rng.uniform(-10., 40., nsites)
+    lats = rng.uniform(35., 70., nsites)
+    sitecol = SiteCollection.from_points(lons, lats)
+    bboxes = [get_bounding_box([Point(lon, lat)], maxdist) for lon, lat in
+              zip(rng.uniform(-10., 40., nsources),
+                  rng.uniform(35., 70., nsources))]
+
+    t0 = time.time()
+    expected = [scan_bbox(sitecol.lons, sitecol.lats, bbox)
+                for bbox in bboxes]
+    print('bbox scan: %.2fs' % (time.time() - t0))
+
+    t0 = time.time()
+    sitecol.bbox_index  # build the index
+    print('building the index: %.2fs' % (time.time() - t0))
+    t0 = time.time()
+    got = [sitecol.within_bbox(bbox) for bbox in bboxes]
+    print('indexed bbox: %.2fs' % (time.time() - t0))
+    for exp, sids in zip(expected, got):
+        numpy.testing.assert_array_equal(exp, sids)
+    print('%d sites per source on average' %
+          numpy.mean([len(sids) for sids in got]))
+
+
+main.nsites = 'number of sites'
+main.nsources = 'number of sources'
+main.maxdist = 'maximum distance in km'
+
+if __name__ == '__main__':
+    sap.run(main)
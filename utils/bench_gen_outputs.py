@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright (C) 2025, GEM Foundation
+#
+# OpenQuake is free software: you can redistribute it and/or modify it
+# under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# OpenQuake is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with OpenQuake.  If not, see <http://www.gnu.org/licenses/>.
+import time
+import numpy
+import pandas
+from openquake.baselib import sap
+from openquake.risklib.scientific import VulnerabilityFunction, join_by_site
+from openquake.calculators.event_based_risk import get_rows
+
+
+def build_data(nassets, nevents, nsites, sites_per_event, ntaxonomies):
+    rng = numpy.random.default_rng(42)
+    assets = pandas.DataFrame(dict(
+        site_id=rng.integers(0, nsites, nassets),
+        taxonomy=rng.integers(0, ntaxonomies, nassets),
+        value=rng.uniform(1, 100, nassets)))
+    sids = numpy.concatenate([
+        rng.choice(nsites, sites_per_event, replace=False)
+        for _ in range(nevents)])
+    eids = numpy.repeat(numpy.arange(nevents), sites_per_event)
+    gmf_df = pandas.DataFrame(dict(
+        eid=eids, sid=sids, gmv_0=rng.uniform(0, 1, len(sids))))
+    return assets, gmf_df
+
+
+def gen_old(assets, gmf_df, vf):
+    # filtering with numpy.isin and joining with pandas
+    sids = gmf_df.sid.to_numpy()
+    for taxo, adf in assets.groupby('taxonomy'):
+        df = gmf_df[numpy.isin(sids, adf.site_id.unique())]
+        ratio_df = vf.interpolate(df, 'gmv_0')
+        asset_df = pandas.DataFrame(
+            dict(aid=adf.index, val=adf.value.to_numpy()), adf.site_id)
+        yield ratio_df.join(asset_df, how='inner')
+
+
+def gen_new(assets, gmf_df, vf):
+    # slicing the GMFs sorted by site ID and joining with join_by_site
+    gmf_df = gmf_df.iloc[numpy.argsort(gmf_df.sid.to_numpy(), kind='stable')]
+    usids, start, counts = numpy.unique(
+        gmf_df.sid.to_numpy(), return_index=True, return_counts=True)
+    for taxo, adf in assets.groupby('taxonomy'):
+        df = gmf_df.iloc[get_rows(usids, start, counts, adf.site_id.unique())]
+        ratio_df = vf.interpolate(df, 'gmv_0')
+        asset_df = pandas.DataFrame(
+            dict(aid=adf.index, val=adf.value.to_numpy()), adf.site_id)
+        gidx, aidx = join_by_site(ratio_df.index.to_numpy(),
+                                  asset_df.index.to_numpy())
+        dic = {c: ratio_df[c].to_numpy()[gidx] for c in ratio_df.columns}
+        for c in asset_df.columns:
+            dic[c] = asset_df[c].to_numpy()[aidx]
+        yield pandas.DataFrame(dic, ratio_df.index[gidx])
+
+
+def main(nassets: int = 500_000, nevents: int = 10_000, nsites: int = 50_000,
+         sites_per_event: int = 100, ntaxonomies: int = 100):
+    """
+    Time the extraction of the GMFs for each group of assets and the
+    join between loss ratios and assets performed in gen_outputs
+    """
+    assets, gmf_df = build_data(
+        nassets, nevents, nsites, sites_per_event, ntaxonomies)
+    vf = VulnerabilityFunction('vf', 'PGA', [.05, .2, .5, 1.],
+                               [.01, .1, .3, .6], [.1, .1, .1, .1])
+    vf.init()
+    print('%d assets, %d GMF rows, %d taxonomies' %
+          (len(assets), len(gmf_df), ntaxonomies))
+    results = []
+    for gen in (gen_old, gen_new):
+        t0 = time.time()
+        dfs = list(gen(assets, gmf_df, vf))
+        nrows = sum(len(df) for df in dfs)
+        print('%s: %.2fs, %d joined rows' % (gen.__name__, time.time() - t0,
+                                              nrows))
+        results.append(dfs)
+    for old, new in zip(*results):
+        pandas.testing.assert_frame_equal(old, new, check_index_type=False)
+
+
+main.nassets = 'number of assets'
+main.nevents = 'number of events'
+main.nsites = 'number of sites'
+main.sites_per_event = 'number of sites affected by each event'
+main.ntaxonomies = 'number of taxonomies'
+
+if __name__ == '__main__':
+    sap.run(main)
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright (C) 2025, GEM Foundation
+#
+# OpenQuake is free software: you can redistribute it and/or modify it
+# under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# OpenQuake is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with OpenQuake.  If not, see <http://www.gnu.org/licenses/>.
+import os
+import time
+import numpy
+from openquake.baselib import sap
+from openquake.hazardlib import valid, nrml, sourceconverter
+from openquake.hazardlib.site import SiteCollection
+from openquake.hazardlib.contexts import (
+    ContextMaker, sort_by_mag, mag_start_stop)
+
+AREA_MODEL = os.path.join(
+    os.path.dirname(__file__),
+    '../openquake/qa_tests_data/classical/case_03/source_model.xml')
+
+
+def build_ctx(nrows):
+    """
+    Build a context array with (at least) nrows rows from an area source,
+    interleaving the magnitudes like the concatenation of many sources does
+    """
+    conv = sourceconverter.SourceConverter(
+        50., 5., width_of_mfd_bin=0.1, area_source_discretization=5.)
+    [sg] = nrml.to_python(AREA_MODEL, conv)
+    lons, lats = numpy.meshgrid(numpy.linspace(-1.5, 1.5, 30),
+                                numpy.linspace(-1.5, 1.5, 30))
+    sitecol = SiteCollection.from_points(
+        lons.flatten(), lats.flatten(), req_site_params=['vs30'])
+    sitecol.array['vs30'] = 760.
+    cmaker = ContextMaker(
+        sg.trt, [valid.gsim('BooreAtkinson2008')],
+        dict(imtls={'PGA': numpy.logspace(-3, 0, 20)},
+             truncation_level=3., investigation_time=50.))
+    [ctx] = cmaker.from_srcs(sg, sitecol)
+    ctx = numpy.tile(ctx, nrows // len(ctx) + 1).view(numpy.recarray)
+    return cmaker, ctx
+
+
+def split_legacy(ctx):
+    # the original algorithm, masking on each magnitude
+    ctx.mag = numpy.round(ctx.mag, 3)
+    return [ctx[ctx.mag == mag] for mag in numpy.unique(ctx.mag)]
+
+
+def split_sorted(ctx):
+    # the current algorithm, a stable sort and then contiguous views
+    ctx = sort_by_mag(ctx)
+    return [ctx[start:stop] for start, stop in mag_start_stop(ctx.mag)]
+
+
+def main(nrows: int = 5_000_000):
+    """
+    Time the splitting by magnitude of a context array with nrows rows,
+    with the legacy algorithm and with the sorted one
+    """
+    t0 = time.time()
+    cmaker, ctx = build_ctx(nrows)
+    print('Built %d context rows, %d magnitudes in %.1fs' % (
+        len(ctx), len(numpy.unique(ctx.mag)), time.time() - t0))
+    print('Context size: %d MB' % (ctx.nbytes / 1024**2))
+    t0 = time.time()
+    legacy = split_legacy(ctx.copy())
+    print('legacy split: %.2fs' % (time.time() - t0))
+    t0 = time.time()
+    arrays = split_sorted(ctx.copy())
+    print('sorted split: %.2fs' % (time.time() - t0))
+    ctx = sort_by_mag(ctx)
+    t0 = time.time()
+    arrays = split_sorted(ctx)
+    print('sorted split, already sorted: %.2fs' % (time.time() - t0))
+    for arr1, arr2 in zip(legacy, arrays):
+        assert (arr1 == arr2).all()
+    t0 = time.time()
+    for poes, mea, sig, ctxt in cmaker.gen_poes(ctx):
+        pass
+    print('gen_poes: %.2fs' % (time.time() - t0))
+
+
+main.nrows = 'number of rows in the context array'
+
+if __name__ == '__main__':
+    sap.run(main)
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright (C) 2025, GEM Foundation
+#
+# OpenQuake is free software: you can redistribute it and/or modify it
+# under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# OpenQuake is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with OpenQuake.  If not, see <http://www.gnu.org/licenses/>.
+import time
+import tracemalloc
+from unittest.mock import Mock
+import numpy
+from openquake.baselib import sap
+from openquake.baselib.performance import Monitor
+from openquake.hazardlib import valid, contexts, site, geo
+from openquake.hazardlib.source.rupture import EBRupture, build_planar
+from openquake.hazardlib.calc.gmf import GmfComputer
+
+
+def build_computer(nsites, nevents):
+    rlzs_by_gsim = {valid.gsim('BooreAtkinson2008'):
+                    numpy.arange(1, dtype=numpy.uint32)}
+    side = int(numpy.sqrt(nsites))
+    lons, lats = numpy.meshgrid(numpy.linspace(-1, 1, side),
+                                numpy.linspace(-1, 1, side))
+    sitecol = site.SiteCollection.from_points(
+        lons.flatten(), lats.flatten(),
+        sitemodel=Mock(reference_vs30_value=760.))
+    rup = build_planar(geo.point.Point(0, 0, 10), mag=7., rake=0.)
+    cmaker = contexts.simple_cmaker(
+        rlzs_by_gsim, ['PGA', 'SA(0.3)', 'SA(1.0)'], truncation_level=3.,
+        minimum_intensity={'default': 1E-3})
+    ebr = EBRupture(rup, 0, 0, n_occ=nevents, id=1)
+    ebr.seed = 42
+    return GmfComputer(ebr, sitecol, cmaker)
+
+
+def run(func):
+    # time the function, then measure its peak memory with tracemalloc
+    t0 = time.time()
+    res = func()
+    dt = time.time() - t0
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return res, dt, peak / 1024**2
+
+
+def main(nsites: int = 10_000, nevents: int = 1000):
+    """
+    Time and peak memory of the GMF computation for a single rupture,
+    building a DataFrame (compute_all) or writing into a GmfBuffer
+    """
+    computer = build_computer(nsites, nevents)
+
+    def compute_all():
+        umon = Monitor('updating gmfs')
+        df = computer.compute_all(None, None, Monitor(), Monitor(), umon)
+        return len(df), umon.duration
+
+    (nrows, dt_upd), dt, peak = run(compute_all)
+    print('compute_all: %.2fs (%.2fs updating), peak memory %.0f MB, '
+          '%d rows' % (dt, dt_upd, peak, nrows))
+
+    def compute_into():
+        umon = Monitor('updating gmfs')
+        buf = computer.new_buffer()
+        computer.compute_into(buf, None, None, Monitor(), Monitor(), umon)
+        return len(buf), umon.duration
+
+    (nrows, dt_upd), dt, peak = run(compute_into)
+    print('compute_into: %.2fs (%.2fs updating), peak memory %.0f MB, '
+          '%d rows' % (dt, dt_upd, peak, nrows))
+
+
+main.nsites = 'number of sites'
+main.nevents = 'number of events'
+
+if __name__ == '__main__':
+    sap.run(main)
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright (C) 2025, GEM Foundation
+#
+# OpenQuake is free software: you can redistribute it and/or modify it
+# under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# OpenQuake is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with OpenQuake.  If not, see <http://www.gnu.org/licenses/>.
+import sys
+import subprocess
+import numpy
+from openquake.baselib import sap
+
+CODE = '''import sys, %s
+print(sum(m.startswith('openquake.hazardlib.gsim.') for m in sys.modules))'''
+
+
+def importtime(module):
+    """
+    :returns: (cumulative import time in seconds, number of GSIM modules)
+    """
+    out = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', CODE % module],
+        capture_output=True, text=True, check=True)
+    for line in out.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        _self, cumulative, name = line.split('|')
+        if name.strip() == module:
+            return int(cumulative) / 1E6, int(out.stdout)
+
+
+def main(module='openquake.commonlib.readinput', runs: int = 10):
+    """
+    Measure the import time of the given module with python -X importtime
+    """
+    times, ngsims = zip(*[importtime(module) for _ in range(runs)])
+    print('%s: min=%.2fs, median=%.2fs over %d runs, %d GSIM modules '
+          'imported' % (module, min(times), numpy.median(times), runs,
+                        ngsims[0]))
+
+
+main.module = 'module to import'
+main.runs = 'number of runs'
+
+if __name__ == '__main__':
+    sap.run(main)
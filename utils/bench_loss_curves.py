@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright (C) 2025, GEM Foundation
+#
+# OpenQuake is free software: you can redistribute it and/or modify it
+# under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# OpenQuake is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with OpenQuake.  If not, see <http://www.gnu.org/licenses/>.
+import time
+import numpy
+from openquake.baselib import sap
+from openquake.risklib import scientific
+
+
+def main(nsegments: int = 1_000_000, nlegacy: int = 10_000,
+         agg_types='ep, aep, oep'):
+    """
+    Time the batched loss curves builder on nsegments segments of losses
+    and compare it with the curve by curve builder on the first nlegacy
+    segments
+    """
+    rng = numpy.random.default_rng(42)
+    counts = rng.integers(1, 50, nsegments)
+    num_events = counts + rng.integers(0, 50, nsegments)
+    offsets = numpy.concatenate([[0], counts.cumsum()])
+    losses = rng.lognormal(size=offsets[-1]).astype(numpy.float32)
+    years = rng.integers(1, 100, offsets[-1])
+    eff_time = 10_000.
+    periods = scientific.return_periods(eff_time, 100)
+    builder = scientific.LossCurvesMapsBuilder(
+        [], periods, None, None, eff_time, 1.)
+    print('%d segments, %d losses, %d return periods' %
+          (nsegments, len(losses), len(periods)))
+
+    t0 = time.time()
+    for s in range(nlegacy):
+        slc = slice(offsets[s], offsets[s + 1])
+        builder.build_curve(years[slc], 'loss', losses[slc], agg_types,
+                            None, num_events[s])
+    dt = time.time() - t0
+    print('curve by curve on %d segments: %.2fs (%.0fs extrapolated)' %
+          (nlegacy, dt, dt * nsegments / nlegacy))
+
+    t0 = time.time()
+    curves = builder.build_curves(years, 'loss', losses, offsets, agg_types,
+                                  num_events)
+    print('batched on %d segments: %.2fs' % (nsegments, time.time() - t0))
+    print({name: curve.shape for name, curve in curves.items()})
+
+
+main.nsegments = 'number of segments'
+main.nlegacy = 'number of segments for the curve by curve builder'
+main.agg_types = 'aggregate loss curves types'
+
+if __name__ == '__main__':
+    sap.run(main)
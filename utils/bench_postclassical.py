@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright (C) 2025, GEM Foundation
+#
+# OpenQuake is free software: you can redistribute it and/or modify it
+# under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# OpenQuake is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with OpenQuake.  If not, see <http://www.gnu.org/licenses/>.
+import os
+import time
+import tempfile
+import functools
+import numpy
+from openquake.baselib import hdf5, sap, performance
+from openquake.baselib.general import DictArray
+from openquake.hazardlib import stats
+from openquake.hazardlib.map_array import rates_dt
+from openquake.calculators import getters
+from openquake.calculators.classical import _store, postclassical
+
+
+class FakeOq:
+    def __init__(self, L):
+        self.imtls = DictArray({'PGA': numpy.logspace(-3, 0, L)})
+        self.poes = [.1, .02]
+        self.use_rates = False
+
+
+def build_rates(fname, N, L, G, num_chunks):
+    rng = numpy.random.default_rng(42)
+    sids = numpy.arange(N, dtype=numpy.uint32)
+    with hdf5.File(fname, 'w') as h5:
+        for g in range(G):  # store one gid at the time to save memory
+            rates = numpy.zeros(N * L, rates_dt)
+            rates['sid'] = numpy.repeat(sids, L)
+            rates['lid'] = numpy.tile(numpy.arange(L), N)
+            rates['gid'] = g
+            rates['rate'] = rng.random(N * L) * 1E-3
+            _store(rates, num_chunks, h5)
+
+
+def read_legacy(mgetter):
+    # the original algorithm, masking on each site ID
+    out = {}
+    for dstore, start, stop in mgetter._slices():
+        rates_df = dstore.read_df('_rates', slc=slice(start, stop))
+        for sid in rates_df.sid.unique():
+            df = rates_df[rates_df.sid == sid]
+            try:
+                array = out[sid]
+            except KeyError:
+                array = out[sid] = numpy.zeros((mgetter.L, mgetter.G))
+            array[df.lid, df.gid] = df.rate
+    return out
+
+
+def wget(weights, imt):
+    return weights[:, 0]
+
+
+def stats_by_site(mgetter, hstats, wget):
+    # the original algorithm, computing the statistics site by site
+    for sid in mgetter.sids:
+        pc = mgetter.get_hcurve(sid)
+        if pc.sum() == 0:
+            continue
+        for stat in hstats.values():
+            getters.build_stat_curve(pc, mgetter.imtls, stat, mgetter.weights,
+                                     wget, mgetter.use_rates)
+
+
+def main(nsites: int = 100_000, levels: int = 20, gids: int = 50,
+         chunks: int = 10):
+    """
+    Time the reading of the rates and the postclassical task on a synthetic
+    _rates file with the given number of sites, levels and gids
+    """
+    trt_rlzs = [numpy.array([g], numpy.uint32) for g in range(gids)]
+    weights = numpy.ones((gids, 1)) / gids
+    oq = FakeOq(levels)
+    hstats = {'mean': stats.mean_curve,
+              'quantile-0.5': functools.partial(stats.quantile_curve, .5)}
+    with tempfile.TemporaryDirectory() as tmp:
+        fname = os.path.join(tmp, 'rates.hdf5')
+        t0 = time.time()
+        build_rates(fname, nsites, levels, gids, chunks)
+        print('Generated %d rates in %.1fs' % (nsites * levels * gids,
+                                              time.time() - t0))
+        mgetter = getters.MapGetter([fname], 0, trt_rlzs, gids, oq)
+        t0 = time.time()
+        read_legacy(mgetter)
+        print('legacy reader: %.2fs' % (time.time() - t0))
+        t0 = time.time()
+        mgetter.init()
+        print('block reader: %.2fs' % (time.time() - t0))
+        mgetter = getters.MapGetter([fname], 0, trt_rlzs, gids, oq)
+        mgetter.weights = weights
+        t0 = time.time()
+        stats_by_site(mgetter, hstats, wget)
+        print('stats site by site on chunk 0/%d: %.2fs' %
+              (chunks, time.time() - t0))
+        mon = performance.Monitor('postclassical')
+        t0 = time.time()
+        postclassical(mgetter, wget, hstats, False, 0, None, mon)
+        print('postclassical on chunk 0/%d: %.2fs' %
+              (chunks, time.time() - t0))
+
+
+main.nsites = 'number of sites'
+main.levels = 'number of intensity measure levels'
+main.gids = 'number of gsim indices'
+main.chunks = 'number of postclassical chunks'
+
+if __name__ == '__main__':
+    sap.run(main)
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright (C) 2025, GEM Foundation
+#
+# OpenQuake is free software: you can redistribute it and/or modify it
+# under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# OpenQuake is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with OpenQuake.  If not, see <http://www.gnu.org/licenses/>.
+import os
+import time
+import resource
+import multiprocessing
+from openquake.baselib import sap
+from openquake.baselib.general import humansize
+from openquake.hazardlib import nrml, sourceconverter
+
+HEADER = '''<?xml version="1.0" encoding="utf-8"?>
+<nrml xmlns="http://openquake.org/xmlns/nrml/0.5"
+      xmlns:gml="http://www.opengis.net/gml">
+<sourceModel name="synthetic">
+'''
+GROUP = '<sourceGroup name="%d" tectonicRegion="Active Shallow Crust">\n'
+SOURCE = '''<pointSource id="%d" name="point">
+  <pointGeometry>
+    <gml:Point><gml:pos>%.4f %.4f</gml:pos></gml:Point>
+    <upperSeismoDepth>0.0</upperSeismoDepth>
+    <lowerSeismoDepth>20.0</lowerSeismoDepth>
+  </pointGeometry>
+  <magScaleRel>WC1994</magScaleRel>
+  <ruptAspectRatio>1.5</ruptAspectRatio>
+  <truncGutenbergRichterMFD aValue="3.5" bValue="1.0" minMag="5.0"
+                            maxMag="7.0"/>
+  <nodalPlaneDist>
+    <nodalPlane probability="0.5" strike="0.0" dip="90.0" rake="0.0"/>
+    <nodalPlane probability="0.5" strike="90.0" dip="45.0" rake="90.0"/>
+  </nodalPlaneDist>
+  <hypoDepthDist>
+    <hypoDepth probability="0.3" depth="5.0"/>
+    <hypoDepth probability="0.7" depth="10.0"/>
+  </hypoDepthDist>
+</pointSource>
+'''
+
+
+def build_model(fname, size, sources_per_group=10_000):
+    # write a synthetic source model of (about) the given size in bytes
+    with open(fname, 'w') as f:
+        f.write(HEADER)
+        i = 0
+        while f.tell() < size:
+            f.write(GROUP % i)
+            for j in range(sources_per_group):
+                f.write(SOURCE % (i * sources_per_group + j,
+                                  j % 360 - 180, (j // 360) % 180 - 90))
+            f.write('</sourceGroup>\n')
+            i += 1
+        f.write('</sourceModel>\n</nrml>\n')
+
+
+def read(fname, streaming, queue):
+    # read the source model and send back time, peak RSS and number of sources
+    conv = sourceconverter.SourceConverter(50., 5., 10., 0.1, 10.)
+    t0 = time.time()
+    if streaming:
+        sm = nrml.stream_to_python(fname, conv)
+    else:
+        sm = nrml.to_python(fname, conv)
+    dt = time.time() - t0
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    queue.put((dt, maxrss, sum(len(sg) for sg in sm)))
+
+
+def main(fname='/tmp/synthetic_source_model.xml', size_mb: int = 1024):
+    """
+    Compare time and peak memory of nrml.to_python and nrml.stream_to_python
+    on a synthetic source model of point sources
+    """
+    if not os.path.exists(fname):
+        build_model(fname, size_mb * 1024 ** 2)
+    print('Reading %s [%s]' % (fname, humansize(os.path.getsize(fname))))
+    ctx = multiprocessing.get_context('spawn')  # measure each reader alone
+    for streaming in (False, True):
+        queue = ctx.Queue()
+        proc = ctx.Process(target=read, args=(fname, streaming, queue))
+        proc.start()
+        dt, maxrss, nsrcs = queue.get()
+        proc.join()
+        print('%s: %.1fs, peak RSS %s, %d sources' % (
+            'stream_to_python' if streaming else 'to_python', dt,
+            humansize(maxrss), nsrcs))
+
+
+main.fname = 'source model file (generated if missing)'
+main.size_mb = 'size in MB of the generated source model'
+
+if __name__ == '__main__':
+    sap.run(main)
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright (C) 2025, GEM Foundation
+#
+# OpenQuake is free software: you can redistribute it and/or modify it
+# under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# OpenQuake is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with OpenQuake.  If not, see <http://www.gnu.org/licenses/>.
+import time
+import numpy
+from openquake.baselib import sap
+from openquake.risklib.scientific import MultiEventRNG, _alpha_beta
+
+
+class PhiloxRNG(object):
+    # the original algorithm, with a Philox generator for each event
+    def __init__(self, master_seed, eids):
+        self.rng = {eid: numpy.random.Generator(
+            numpy.random.Philox(int(master_seed + eid))) for eid in eids}
+
+    def lognormal(self, eids, means, covs):
+        eps = numpy.array([self.rng[eid].normal() for eid in eids])
+        sigma = numpy.sqrt(numpy.log(1 + covs ** 2))
+        div = numpy.sqrt(1 + covs ** 2)
+        return means * numpy.exp(eps * sigma) / div
+
+    def beta(self, eids, means, covs):
+        alpha, beta = _alpha_beta(means, means * covs)
+        return numpy.array([self.rng[eid].beta(alpha[i], beta[i])
+                            for i, eid in enumerate(eids)])
+
+    def discrete_dmg_dist(self, eids, fractions, numbers):
+        A, E, D = fractions.shape
+        ddd = numpy.zeros(fractions.shape, numpy.uint32)
+        for e, eid in enumerate(eids):
+            choice = self.rng[eid].choice
+            for a, n in enumerate(numbers):
+                frac = fractions[a, e]
+                states = choice(D, n, p=frac/frac.sum())
+                ddd[a, e] = numpy.bincount(states, minlength=D)
+        return ddd
+
+
+def timeit(what, func, *args):
+    t0 = time.time()
+    func(*args)
+    dt = time.time() - t0
+    print('%s: %.2fs' % (what, dt))
+    return dt
+
+
+def main(assets: int = 1000, events: int = 1000):
+    """
+    Time the sampling of the lognormal and beta distributions and of the
+    discrete damage distributions for assets x events pairs, comparing the
+    Philox generators per event with the counter-based MultiEventRNG
+    """
+    eids = numpy.repeat(numpy.arange(events), assets)
+    aids = numpy.tile(numpy.arange(assets), events)
+    means = numpy.random.default_rng(42).uniform(.1, .5, len(eids))
+    covs = numpy.full(len(eids), .3)
+    fractions = numpy.zeros((assets, events, 5))
+    fractions[:] = [.6, .2, .1, .05, .05]
+    numbers = numpy.full(assets, 10)
+    print('Sampling %d (asset, event) pairs' % len(eids))
+    old = PhiloxRNG(42, range(events))
+    new = MultiEventRNG(42, range(events))
+    for dist in ('lognormal', 'beta'):
+        t_old = timeit('%s Philox' % dist, getattr(old, dist),
+                       eids, means, covs)
+        t_new = timeit('%s counter-based' % dist, getattr(new, dist),
+                       eids, means, covs, aids)
+        print('speedup %.1fx' % (t_old / t_new))
+    evs = numpy.arange(events)
+    t_old = timeit('discrete_dmg_dist Philox', old.discrete_dmg_dist,
+                   evs, fractions, numbers)
+    t_new = timeit('discrete_dmg_dist counter-based', new.discrete_dmg_dist,
+                   evs, fractions, numbers)
+    print('speedup %.1fx' % (t_old / t_new))
+
+
+main.assets = 'number of assets'
+main.events = 'number of events'
+
+if __name__ == '__main__':
+    sap.run(main)